@@ -6,10 +6,14 @@ from aws_cdk import (
     Duration,
     RemovalPolicy,
     aws_s3 as s3,
+    aws_cloudfront as cloudfront,
+    aws_cloudfront_origins as origins,
+    aws_secretsmanager as secretsmanager,
     aws_lambda as _lambda,
     aws_apigateway as apigw,
     aws_route53 as route53,
-    aws_s3_notifications as s3n,
+    aws_events as events,
+    aws_events_targets as events_targets,
 )
 
 
@@ -36,6 +40,9 @@ class DisplayPipelineStack(cdk.Stack):
             encryption=s3.BucketEncryption.S3_MANAGED,
             removal_policy=RemovalPolicy.RETAIN,
             auto_delete_objects=False,
+            # Consumers subscribe through EventBridge rules so several stacks can watch
+            # the same prefixes (S3 rejects overlapping direct notifications)
+            event_bridge_enabled=True,
             cors=[
                 s3.CorsRule(
                     allowed_methods=[s3.HttpMethods.PUT, s3.HttpMethods.POST],
@@ -71,6 +78,11 @@ class DisplayPipelineStack(cdk.Stack):
         hosted_zone_name = hosted_zone_name or self.node.try_get_context("hostedZoneName")
         uploads_prefix = self.node.try_get_context("uploadsPrefix") or "uploads/"
         processed_prefix = self.node.try_get_context("processedPrefix") or "processed/"
+        frames_prefix = self.node.try_get_context("framesPrefix") or "frames/"
+        frame_refs_prefix = self.node.try_get_context("frameRefsPrefix") or "frame-refs/"
+        thumbnails_prefix = self.node.try_get_context("thumbnailsPrefix") or "thumbnails/"
+        previews_prefix = self.node.try_get_context("previewsPrefix") or "previews/"
+        thumbnail_max_edge = str(self.node.try_get_context("thumbnailMaxEdge") or "320")
         epaper_width = str(self.node.try_get_context("epaperWidth") or "800")
         epaper_height = str(self.node.try_get_context("epaperHeight") or "480")
         epaper_rotate = str(self.node.try_get_context("epaperRotate") or "0")
@@ -78,14 +90,27 @@ class DisplayPipelineStack(cdk.Stack):
         epaper_brightness = str(self.node.try_get_context("epaperBrightness") or "1.0")
         state_key = self.node.try_get_context("displayStateKey") or "state/.display_state.json"
         presigned_ttl = str(self.node.try_get_context("presignedTtlSeconds") or "120")
+        prefetch_ttl = str(self.node.try_get_context("prefetchUrlTtlSeconds") or "3600")
+        max_batch_count = str(self.node.try_get_context("maxBatchCount") or "48")
+        inline_max_bytes = str(self.node.try_get_context("inlineMaxBytes") or "1048576")
+        refresh_interval = str(self.node.try_get_context("refreshIntervalSeconds") or "1800")
+        quiet_hours = self.node.try_get_context("quietHours") or ""
+        display_utc_offset = self.node.try_get_context("displayUtcOffset") or "+00:00"
         next_image_domain_name = self.node.try_get_context("nextImageDomainName") or None
         next_image_certificate_arn = self.node.try_get_context("nextImageCertificateArn") or None
         next_image_truststore_uri = self.node.try_get_context("nextImageTruststoreUri") or None
         next_image_stage_name = self.node.try_get_context("nextImageStageName") or "prod"
+        frames_cdn_public_key_pem = self.node.try_get_context("framesCdnPublicKeyPem") or None
+        frames_cdn_private_key_secret_arn = self.node.try_get_context("framesCdnPrivateKeySecretArn") or None
 
         normalized_zone = hosted_zone_name.rstrip(".").lower() if hosted_zone_name else None
         normalized_domain = next_image_domain_name.rstrip(".").lower() if next_image_domain_name else None
 
+        if bool(frames_cdn_public_key_pem) != bool(frames_cdn_private_key_secret_arn):
+            raise ValueError(
+                "framesCdnPublicKeyPem and framesCdnPrivateKeySecretArn must be set together."
+            )
+
         if manage_dns:
             if not hosted_zone_name:
                 raise ValueError("manageDns=true requires hostedZoneName to be set.")
@@ -110,8 +135,15 @@ class DisplayPipelineStack(cdk.Stack):
             environment={
                 "ASSETS_BUCKET": uploads_bucket.bucket_name,
                 "PROCESSED_PREFIX": processed_prefix,
+                "FRAMES_PREFIX": frames_prefix,
                 "STATE_KEY": state_key,
                 "URL_TTL_SECONDS": presigned_ttl,
+                "PREFETCH_URL_TTL_SECONDS": prefetch_ttl,
+                "MAX_BATCH_COUNT": max_batch_count,
+                "INLINE_MAX_BYTES": inline_max_bytes,
+                "REFRESH_INTERVAL_SECONDS": refresh_interval,
+                "QUIET_HOURS": quiet_hours,
+                "DISPLAY_UTC_OFFSET": display_utc_offset,
             },
         )
         uploads_bucket.grant_read_write(next_image_fn)
@@ -140,6 +172,13 @@ class DisplayPipelineStack(cdk.Stack):
                 "TARGET_WIDTH": epaper_width,
                 "TARGET_HEIGHT": epaper_height,
                 "PROCESSED_PREFIX": processed_prefix,
+                "FRAMES_PREFIX": frames_prefix,
+                "FRAME_REFS_PREFIX": frame_refs_prefix,
+                "THUMBNAILS_PREFIX": thumbnails_prefix,
+                "THUMBNAIL_MAX_EDGE": thumbnail_max_edge,
+                "SOURCE_BUCKET": uploads_bucket.bucket_name,
+                "UPLOAD_PREFIX": uploads_prefix,
+                "PREVIEWS_PREFIX": previews_prefix,
                 "ROTATE": epaper_rotate,
                 "SATURATION": epaper_saturation,
                 "BRIGHTNESS": epaper_brightness,
@@ -148,13 +187,65 @@ class DisplayPipelineStack(cdk.Stack):
 
         uploads_bucket.grant_read(format_fn)
         processed_bucket.grant_put(format_fn)
+        # Frames superseded by a re-render are removed by format_image once unreferenced
+        processed_bucket.grant_delete(format_fn, f"{frames_prefix}*")
+        processed_bucket.grant_delete(format_fn, f"{frame_refs_prefix}*")
+        # Memoized previews are cheap to re-render; do not keep them forever
+        processed_bucket.add_lifecycle_rule(
+            id="ExpirePreviews",
+            prefix=previews_prefix,
+            expiration=Duration.days(7),
+        )
 
-        uploads_bucket.add_event_notification(
-            s3.EventType.OBJECT_CREATED,
-            s3n.LambdaDestination(format_fn),
-            s3.NotificationKeyFilter(prefix=uploads_prefix)
+        events.Rule(
+            self,
+            "FormatImageRule",
+            event_pattern=events.EventPattern(
+                source=["aws.s3"],
+                detail_type=["Object Created"],
+                detail={
+                    "bucket": {"name": [uploads_bucket.bucket_name]},
+                    "object": {"key": [{"prefix": uploads_prefix}]},
+                },
+            ),
+            targets=[events_targets.LambdaFunction(format_fn)],
         )
 
+        # CloudFront for content-addressed frames (signed URLs only)
+        frames_distribution = None
+        if frames_cdn_public_key_pem and frames_cdn_private_key_secret_arn:
+            frames_public_key = cloudfront.PublicKey(
+                self,
+                "FramesCdnPublicKey",
+                encoded_key=frames_cdn_public_key_pem,
+            )
+            frames_key_group = cloudfront.KeyGroup(
+                self,
+                "FramesCdnKeyGroup",
+                items=[frames_public_key],
+            )
+            frames_distribution = cloudfront.Distribution(
+                self,
+                "FramesDistribution",
+                default_behavior=cloudfront.BehaviorOptions(
+                    # Adds the OAC and a bucket policy limited to this distribution
+                    origin=origins.S3BucketOrigin.with_origin_access_control(uploads_bucket),
+                    viewer_protocol_policy=cloudfront.ViewerProtocolPolicy.HTTPS_ONLY,
+                    allowed_methods=cloudfront.AllowedMethods.ALLOW_GET_HEAD,
+                    cache_policy=cloudfront.CachePolicy.CACHING_OPTIMIZED,
+                    trusted_key_groups=[frames_key_group],
+                ),
+                price_class=cloudfront.PriceClass.PRICE_CLASS_100,
+            )
+
+            frames_private_key = secretsmanager.Secret.from_secret_complete_arn(
+                self, "FramesCdnPrivateKey", frames_cdn_private_key_secret_arn
+            )
+            frames_private_key.grant_read(next_image_fn)
+            next_image_fn.add_environment("CDN_DOMAIN", frames_distribution.distribution_domain_name)
+            next_image_fn.add_environment("CDN_KEY_PAIR_ID", frames_public_key.public_key_id)
+            next_image_fn.add_environment("CDN_PRIVATE_KEY_SECRET_ARN", frames_cdn_private_key_secret_arn)
+
         # API Gateway
         next_image_api = apigw.RestApi(
             self,
@@ -162,6 +253,7 @@ class DisplayPipelineStack(cdk.Stack):
             rest_api_name="Display Pipeline Next Image API",
             endpoint_types=[apigw.EndpointType.REGIONAL],
             disable_execute_api_endpoint=True,
+            binary_media_types=["image/bmp"],
             deploy_options=apigw.StageOptions(stage_name=next_image_stage_name),
         )
 
@@ -249,6 +341,20 @@ class DisplayPipelineStack(cdk.Stack):
             value=processed_bucket.bucket_name,
             description=f"S3 bucket where converted images are stored (prefix: {processed_prefix})",
         )
+        cdk.CfnOutput(
+            self,
+            "FormatImageFunctionName",
+            value=format_fn.function_name,
+            description="Set as previewFunctionName in cdk_photo_picker to enable GET /preview.",
+        )
+
+        if frames_distribution:
+            cdk.CfnOutput(
+                self,
+                "FramesCdnDomainName",
+                value=frames_distribution.distribution_domain_name,
+                description=f"CloudFront domain serving signed {frames_prefix} frames",
+            )
 
         if next_image_domain_name and next_image_certificate_arn:
             cdk.CfnOutput(
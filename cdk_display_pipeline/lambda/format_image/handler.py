@@ -1,11 +1,16 @@
+import base64
+import hashlib
 import json
 import logging
 import os
 import traceback
+import urllib.parse
+from collections import OrderedDict
 from io import BytesIO
-from typing import Iterable
+from typing import Dict, Iterable, Optional, Tuple
 
 import boto3
+from botocore.exceptions import ClientError
 from PIL import Image, ImageEnhance, ImageFilter, ImageOps
 
 # Enable HEIC/HEIF/AVIF support if pillow-heif is available
@@ -27,6 +32,14 @@ logger = logging.getLogger(__name__)
 s3 = boto3.client("s3")
 DEST_BUCKET = os.environ.get("DEST_BUCKET")
 PROCESSED_PREFIX = os.environ.get("PROCESSED_PREFIX", "processed/")
+FRAMES_PREFIX = os.environ.get("FRAMES_PREFIX", "frames/")
+FRAME_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# One empty object per render pointing at a frame: frame-refs/<sha256>/<quoted processed key>
+FRAME_REFS_PREFIX = os.environ.get("FRAME_REFS_PREFIX", "frame-refs/")
+THUMBNAILS_PREFIX = os.environ.get("THUMBNAILS_PREFIX", "thumbnails/")
+THUMBNAIL_MAX_EDGE = int(os.environ.get("THUMBNAIL_MAX_EDGE", "320"))
+THUMBNAIL_QUALITY = int(os.environ.get("THUMBNAIL_QUALITY", "75"))
+THUMBNAIL_CACHE_CONTROL = "private, max-age=86400"
 TARGET_WIDTH = int(os.environ.get("TARGET_WIDTH", "800"))
 TARGET_HEIGHT = int(os.environ.get("TARGET_HEIGHT", "480"))
 ROTATE = int(os.environ.get("ROTATE", "0"))
@@ -37,6 +50,21 @@ BRIGHTNESS = float(os.environ.get("BRIGHTNESS", "1.0"))
 CONTRAST = float(os.environ.get("CONTRAST", "1.05"))
 SHARPEN = float(os.environ.get("SHARPEN", "0.0"))
 DITHER_MODE = os.environ.get("DITHER", "floyd").strip().lower()
+# Preview mode: render an upload with adjusted settings without touching processed/
+SOURCE_BUCKET = os.environ.get("SOURCE_BUCKET") or DEST_BUCKET
+UPLOAD_PREFIX = os.environ.get("UPLOAD_PREFIX", "uploads/")
+PREVIEWS_PREFIX = os.environ.get("PREVIEWS_PREFIX", "previews/")
+PREVIEW_CACHE_CONTROL = "private, max-age=86400"
+PREVIEW_CACHE_BYTES = int(os.environ.get("PREVIEW_CACHE_BYTES", str(32 * 1024 * 1024)))
+# Fitted panel-size sources (about 1.1 MB each at 800x480) reused while settings change
+PREVIEW_SOURCE_CACHE_ITEMS = int(os.environ.get("PREVIEW_SOURCE_CACHE_ITEMS", "4"))
+PREVIEW_LIMITS = {
+    "saturation": (0.0, 3.0),
+    "contrast": (0.0, 3.0),
+    "brightness": (0.0, 3.0),
+    "sharpen": (0.0, 2.0),
+}
+DITHER_MODES = {"floyd", "none"}
 SUPPORTED_EXT = {
     ".jpg",
     ".jpeg",
@@ -89,7 +117,18 @@ PALETTE_IMAGE = Image.new("P", (1, 1))
 PALETTE_IMAGE.putpalette(list(_build_palette()))
 
 
-def _prepare_image(image: Image.Image) -> Image.Image:
+def _render_defaults() -> Dict:
+    return {
+        "saturation": SATURATION,
+        "contrast": CONTRAST,
+        "brightness": BRIGHTNESS,
+        "sharpen": SHARPEN,
+        "dither": "none" if DITHER_MODE in {"none", "off", "0"} else "floyd",
+    }
+
+
+def _fit_image(image: Image.Image) -> Image.Image:
+    """Orientation, crop and auto-contrast: the steps that do not depend on render settings."""
     image = ImageOps.exif_transpose(image)
     image = image.convert("RGB")
     if ROTATE:
@@ -102,39 +141,243 @@ def _prepare_image(image: Image.Image) -> Image.Image:
     )
     if AUTO_CONTRAST:
         fitted = ImageOps.autocontrast(fitted, cutoff=AUTO_CONTRAST_CUTOFF)
-    if BRIGHTNESS != 1.0:
-        fitted = ImageEnhance.Brightness(fitted).enhance(BRIGHTNESS)
-    if CONTRAST != 1.0:
-        fitted = ImageEnhance.Contrast(fitted).enhance(CONTRAST)
-    if SATURATION != 1.0:
-        fitted = ImageEnhance.Color(fitted).enhance(SATURATION)
-    if SHARPEN > 0:
-        radius = max(0.6, min(2.5, 1.0 + (SHARPEN * 0.8)))
-        percent = int(150 + 100 * SHARPEN)
+    return fitted
+
+
+def _enhance(fitted: Image.Image, settings: Dict) -> Image.Image:
+    if settings["brightness"] != 1.0:
+        fitted = ImageEnhance.Brightness(fitted).enhance(settings["brightness"])
+    if settings["contrast"] != 1.0:
+        fitted = ImageEnhance.Contrast(fitted).enhance(settings["contrast"])
+    if settings["saturation"] != 1.0:
+        fitted = ImageEnhance.Color(fitted).enhance(settings["saturation"])
+    if settings["sharpen"] > 0:
+        radius = max(0.6, min(2.5, 1.0 + (settings["sharpen"] * 0.8)))
+        percent = int(150 + 100 * settings["sharpen"])
         fitted = fitted.filter(ImageFilter.UnsharpMask(radius=radius, percent=percent, threshold=3))
     return fitted
 
 
-def _resolve_dither_mode() -> int:
-    if DITHER_MODE in {"none", "off", "0"}:
+def _prepare_image(image: Image.Image, settings: Optional[Dict] = None) -> Image.Image:
+    return _enhance(_fit_image(image), settings or _render_defaults())
+
+
+def _encode_thumbnail(image: Image.Image) -> Tuple[bytes, str, str]:
+    """Return ``(bytes, extension, content_type)`` for a small preview of ``image``."""
+    thumb = image.convert("RGB")
+    thumb.thumbnail((THUMBNAIL_MAX_EDGE, THUMBNAIL_MAX_EDGE), RESAMPLE)
+    buffer = BytesIO()
+    try:
+        thumb.save(buffer, format="WEBP", quality=THUMBNAIL_QUALITY, method=4)
+        return buffer.getvalue(), ".webp", "image/webp"
+    except (KeyError, OSError):
+        # Pillow built without libwebp
+        buffer = BytesIO()
+        thumb.save(buffer, format="JPEG", quality=THUMBNAIL_QUALITY, optimize=True)
+        return buffer.getvalue(), ".jpg", "image/jpeg"
+
+
+def _put_thumbnail(image: Image.Image, stem: str) -> str:
+    body, ext, content_type = _encode_thumbnail(image)
+    thumb_key = f"{THUMBNAILS_PREFIX}{stem}{ext}"
+    logger.info("Uploading thumbnail to %s/%s (%d bytes)", DEST_BUCKET, thumb_key, len(body))
+    s3.put_object(
+        Bucket=DEST_BUCKET,
+        Key=thumb_key,
+        Body=body,
+        ContentType=content_type,
+        CacheControl=THUMBNAIL_CACHE_CONTROL,
+    )
+    return thumb_key
+
+
+def _current_frame_key(processed_key: str) -> Optional[str]:
+    """Frame the existing render of ``processed_key`` points at, if any."""
+    try:
+        head = s3.head_object(Bucket=DEST_BUCKET, Key=processed_key)
+    except ClientError:
+        return None
+    frame_key = (head.get("Metadata") or {}).get("frame-key") or ""
+    return frame_key if frame_key.startswith(FRAMES_PREFIX) else None
+
+
+def _frame_refs(frame_key: str) -> str:
+    digest = os.path.splitext(frame_key[len(FRAMES_PREFIX):])[0]
+    return f"{FRAME_REFS_PREFIX}{digest}/"
+
+
+def _frame_ref(frame_key: str, processed_key: str) -> str:
+    return _frame_refs(frame_key) + urllib.parse.quote(processed_key, safe="")
+
+
+def _release_frame(frame_key: str, processed_key: str) -> None:
+    """Drop ``processed_key``'s reference and delete the frame once no other render uses it."""
+    s3.delete_object(Bucket=DEST_BUCKET, Key=_frame_ref(frame_key, processed_key))
+    listed = s3.list_objects_v2(Bucket=DEST_BUCKET, Prefix=_frame_refs(frame_key), MaxKeys=1)
+    if listed.get("KeyCount"):
+        logger.info("Keeping frame %s/%s; other renders still use it", DEST_BUCKET, frame_key)
+        return
+    logger.info("Deleting superseded frame %s/%s", DEST_BUCKET, frame_key)
+    s3.delete_object(Bucket=DEST_BUCKET, Key=frame_key)
+
+
+def _resolve_dither_mode(mode: str = DITHER_MODE) -> int:
+    if mode in {"none", "off", "0"}:
         return Image.Dither.NONE
     return Image.Dither.FLOYDSTEINBERG
 
 
-def _quantize(image: Image.Image) -> Image.Image:
+def _quantize(image: Image.Image, dither: str = DITHER_MODE) -> Image.Image:
     return image.quantize(
         palette=PALETTE_IMAGE,
-        dither=_resolve_dither_mode(),
+        dither=_resolve_dither_mode(dither),
         method=QUANTIZE_MAXCOVERAGE,
     )
 
 
+# Memoized previews, kept while the container is warm
+_fitted_sources: "OrderedDict[str, Image.Image]" = OrderedDict()
+_preview_cache: "OrderedDict[str, bytes]" = OrderedDict()
+_preview_cache_bytes = 0
+
+
+def _preview_settings(overrides: Optional[Dict]) -> Dict:
+    """Deployment settings with validated overrides applied; raises ValueError."""
+    settings = _render_defaults()
+    for name, value in (overrides or {}).items():
+        if value is None or value == "":
+            continue
+        if name == "dither":
+            value = str(value).strip().lower()
+            if value not in DITHER_MODES:
+                raise ValueError(f"dither must be one of {sorted(DITHER_MODES)}")
+            settings[name] = value
+            continue
+        if name not in PREVIEW_LIMITS:
+            raise ValueError(f"unknown preview parameter: {name}")
+        low, high = PREVIEW_LIMITS[name]
+        try:
+            number = float(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"{name} must be a number") from None
+        if not low <= number <= high:
+            raise ValueError(f"{name} must be between {low} and {high}")
+        # Slider noise below two decimals would only fragment the memo
+        settings[name] = round(number, 2)
+    return settings
+
+
+def _remember_preview(memo: str, body: bytes) -> None:
+    global _preview_cache_bytes
+    if memo in _preview_cache:
+        _preview_cache.move_to_end(memo)
+        return
+    _preview_cache[memo] = body
+    _preview_cache_bytes += len(body)
+    while _preview_cache_bytes > PREVIEW_CACHE_BYTES and len(_preview_cache) > 1:
+        _, evicted = _preview_cache.popitem(last=False)
+        _preview_cache_bytes -= len(evicted)
+
+
+def _fitted_source(key: str, etag: str) -> Image.Image:
+    cache_key = f"{etag}:{key}"
+    fitted = _fitted_sources.get(cache_key)
+    if fitted is not None:
+        _fitted_sources.move_to_end(cache_key)
+        return fitted
+    obj = s3.get_object(Bucket=SOURCE_BUCKET, Key=key, IfMatch=f'"{etag}"')
+    with Image.open(BytesIO(obj["Body"].read())) as img:
+        fitted = _fit_image(img)
+    _fitted_sources[cache_key] = fitted
+    while len(_fitted_sources) > max(1, PREVIEW_SOURCE_CACHE_ITEMS):
+        _fitted_sources.popitem(last=False)
+    return fitted
+
+
+def _render_preview(key: str, overrides: Optional[Dict] = None) -> Dict:
+    """Render ``key`` as the panel would show it, memoized by source ETag and settings.
+
+    Lookups go container memory, then ``PREVIEWS_PREFIX`` in S3, then a fresh
+    render; only the enhance and quantize steps rerun when just the settings change.
+    """
+    if not key.startswith(UPLOAD_PREFIX) or not _is_supported(key):
+        raise ValueError("invalid key")
+    settings = _preview_settings(overrides)
+    etag = s3.head_object(Bucket=SOURCE_BUCKET, Key=key)["ETag"].strip('"')
+    memo = hashlib.sha256(
+        json.dumps(
+            {
+                "key": key,
+                "etag": etag,
+                "size": [TARGET_WIDTH, TARGET_HEIGHT],
+                "rotate": ROTATE,
+                "autoContrast": [AUTO_CONTRAST, AUTO_CONTRAST_CUTOFF],
+                "settings": settings,
+            },
+            sort_keys=True,
+        ).encode("utf-8")
+    ).hexdigest()
+    preview_key = f"{PREVIEWS_PREFIX}{memo}.png"
+
+    cached = "memory"
+    body = _preview_cache.get(memo)
+    if body is None:
+        cached = "s3"
+        try:
+            body = s3.get_object(Bucket=DEST_BUCKET, Key=preview_key)["Body"].read()
+        except ClientError as exc:
+            if exc.response.get("Error", {}).get("Code") not in {"NoSuchKey", "404"}:
+                raise
+    if body is None:
+        cached = None
+        quantized = _quantize(_enhance(_fitted_source(key, etag), settings), settings["dither"])
+        buffer = BytesIO()
+        # Palette PNG: lossless for the seven panel colors and far smaller than the BMP.
+        # Level 6 is ~17x faster than optimize/level 9 for ~8% more bytes.
+        quantized.save(buffer, format="PNG", compress_level=6)
+        body = buffer.getvalue()
+        s3.put_object(
+            Bucket=DEST_BUCKET,
+            Key=preview_key,
+            Body=body,
+            ContentType="image/png",
+            CacheControl=PREVIEW_CACHE_CONTROL,
+        )
+    _remember_preview(memo, body)
+    logger.info("Preview %s for %s (%d bytes, cached=%s)", preview_key, key, len(body), cached)
+    return {
+        "status": "ok",
+        "key": key,
+        "previewKey": preview_key,
+        "etag": memo,
+        "cached": cached,
+        "settings": settings,
+        "contentType": "image/png",
+        "body": base64.b64encode(body).decode("ascii"),
+    }
+
+
 def handler(event, _context):
     logger.info("Received event: %s", json.dumps(event))
     if not DEST_BUCKET:
         logger.error("DEST_BUCKET environment variable is not set")
         return {"status": "error", "reason": "missing DEST_BUCKET"}
 
+    if event.get("action") == "preview":
+        try:
+            return _render_preview(event.get("key") or "", event.get("overrides"))
+        except ValueError as exc:
+            return {"status": "error", "reason": str(exc)}
+        except ClientError as exc:
+            if exc.response.get("Error", {}).get("Code") in {"NoSuchKey", "404", "PreconditionFailed", "412"}:
+                return {"status": "error", "reason": "not found"}
+            raise
+
+    if event.get("source") == "aws.s3":
+        # EventBridge delivers one object per event; reuse the notification record shape
+        detail = event.get("detail") or {}
+        event = {"Records": [{"s3": {"bucket": detail.get("bucket") or {}, "object": detail.get("object") or {}}}]}
+
     for record in event.get("Records", []):
         try:
             src_bucket = record["s3"]["bucket"]["name"]
@@ -142,7 +385,7 @@ def handler(event, _context):
             if not _is_supported(key):
                 logger.info("Skipping unsupported file: %s", key)
                 continue
-            if key.startswith(PROCESSED_PREFIX):
+            if key.startswith((PROCESSED_PREFIX, THUMBNAILS_PREFIX, PREVIEWS_PREFIX)):
                 logger.info("Skipping already processed object: %s", key)
                 continue
 
@@ -150,23 +393,54 @@ def handler(event, _context):
             obj = s3.get_object(Bucket=src_bucket, Key=key)
             original_bytes = obj["Body"].read()
 
+            stem = os.path.splitext(os.path.basename(key))[0]
             with Image.open(BytesIO(original_bytes)) as img:
                 prepared = _prepare_image(img)
+                # Previews for the management UI so it never downloads originals or BMPs
+                thumbnail_key = _put_thumbnail(ImageOps.exif_transpose(img), stem)
             quantized = _quantize(prepared)
 
             buffer = BytesIO()
             quantized.save(buffer, format="BMP")
-            buffer.seek(0)
+            frame_bytes = buffer.getvalue()
+
+            # Content-addressed copy first, so the alias never points at a missing frame.
+            frame_sha256 = hashlib.sha256(frame_bytes).hexdigest()
+            frame_key = f"{FRAMES_PREFIX}{frame_sha256}.bmp"
+            logger.info("Uploading frame to %s/%s", DEST_BUCKET, frame_key)
+            s3.put_object(
+                Bucket=DEST_BUCKET,
+                Key=frame_key,
+                Body=frame_bytes,
+                ContentType="image/bmp",
+                CacheControl=FRAME_CACHE_CONTROL,
+            )
+
+            processed_thumbnail_key = _put_thumbnail(quantized, f"{stem}.epaper")
 
-            dest_base = os.path.splitext(os.path.basename(key))[0] + ".bmp"
+            dest_base = stem + ".bmp"
             dest_key = f"{PROCESSED_PREFIX}{dest_base}"
+            superseded_frame = _current_frame_key(dest_key)
+            # Identical renders share the frame, so each alias records that it uses it
+            s3.put_object(Bucket=DEST_BUCKET, Key=_frame_ref(frame_key, dest_key), Body=b"")
             logger.info("Uploading processed image to %s/%s", DEST_BUCKET, dest_key)
             s3.put_object(
                 Bucket=DEST_BUCKET,
                 Key=dest_key,
-                Body=buffer,
+                Body=frame_bytes,
                 ContentType="image/bmp",
+                # Lets the uploads index join this render back to its source without scanning
+                Metadata={
+                    "frame-key": frame_key,
+                    "frame-sha256": frame_sha256,
+                    "source-key": urllib.parse.quote(key),
+                    "thumbnail-key": urllib.parse.quote(thumbnail_key),
+                    "processed-thumbnail-key": urllib.parse.quote(processed_thumbnail_key),
+                },
             )
+            if superseded_frame and superseded_frame != frame_key:
+                # A re-render replaced the frame; other uploads may still render to it
+                _release_frame(superseded_frame, dest_key)
         except Exception:  # pylint: disable=broad-except
             logger.error("Failed to process record: %s", json.dumps(record))
             logger.error(traceback.format_exc())
@@ -0,0 +1,73 @@
+"""CloudFront signed URLs and cookies without third-party crypto packages.
+
+CloudFront expects an RSA (PKCS#1 v1.5) SHA-1 signature over the policy.
+botocore's ``CloudFrontSigner`` builds the policies and URL query strings;
+``rsa_pkcs1`` supplies the signature, so the Lambdas need no native
+dependencies. Cookies are issued per media prefix, each set with its own
+``Path`` and a policy limited to that prefix, so the URLs themselves stay
+unsigned and cacheable.
+
+Identical copies live in ``cdk_photo_picker/lambda/common/python`` and
+``cdk_display_pipeline/lambda/get_next_image``; change both together.
+"""
+
+import base64
+import datetime
+from typing import Dict, List, Tuple
+
+from botocore.signers import CloudFrontSigner
+
+import rsa_pkcs1
+
+load_private_key = rsa_pkcs1.load_private_key
+
+
+def _signer(key_pair_id: str, private_key: Tuple[int, int, int]) -> CloudFrontSigner:
+    return CloudFrontSigner(key_pair_id, lambda message: rsa_pkcs1.sign(message, private_key, "sha1"))
+
+
+def _expiry(expires_at: int) -> datetime.datetime:
+    return datetime.datetime.fromtimestamp(expires_at, tz=datetime.timezone.utc)
+
+
+def _cloudfront_b64(data: bytes) -> str:
+    # CloudFront's URL-safe variant: + -> -, = -> _, / -> ~
+    return base64.b64encode(data).decode("ascii").translate(str.maketrans("+=/", "-_~"))
+
+
+def generate_signed_url(url: str, key_pair_id: str, private_key: Tuple[int, int, int], expires_at: int) -> str:
+    return _signer(key_pair_id, private_key).generate_presigned_url(url, date_less_than=_expiry(expires_at))
+
+
+def signed_cookie_values(
+    resource: str,
+    key_pair_id: str,
+    private_key: Tuple[int, int, int],
+    expires_at: int,
+) -> Dict[str, str]:
+    """Return the three CloudFront cookie values granting ``resource`` (may end in ``*``) until ``expires_at``."""
+    signer = _signer(key_pair_id, private_key)
+    policy = signer.build_policy(resource, _expiry(expires_at)).encode("utf-8")
+    return {
+        "CloudFront-Policy": _cloudfront_b64(policy),
+        "CloudFront-Signature": _cloudfront_b64(signer.rsa_signer(policy)),
+        "CloudFront-Key-Pair-Id": key_pair_id,
+    }
+
+
+def set_cookie_headers(
+    base_url: str,
+    prefixes: List[str],
+    key_pair_id: str,
+    private_key: Tuple[int, int, int],
+    expires_at: int,
+    max_age: int,
+) -> List[str]:
+    """Build ``Set-Cookie`` values: one cookie set per prefix, scoped by ``Path``."""
+    headers: List[str] = []
+    for prefix in prefixes:
+        path = "/" + prefix.strip("/") + "/"
+        values = signed_cookie_values(f"{base_url.rstrip('/')}{path}*", key_pair_id, private_key, expires_at)
+        for name, value in values.items():
+            headers.append(f"{name}={value}; Path={path}; Max-Age={max_age}; Secure; HttpOnly; SameSite=Strict")
+    return headers
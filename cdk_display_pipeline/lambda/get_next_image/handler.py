@@ -1,31 +1,65 @@
+import base64
+import gzip
 import json
 import logging
 import os
 import time
-from typing import Dict, List
+from typing import Dict, List, Optional, Tuple
 
 import boto3
 from botocore.exceptions import ClientError
 
+import cloudfront_signer
+
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
 ASSETS_BUCKET = os.environ["ASSETS_BUCKET"]
 PROCESSED_PREFIX = os.environ.get("PROCESSED_PREFIX", "processed/")
+FRAMES_PREFIX = os.environ.get("FRAMES_PREFIX", "frames/")
 STATE_KEY = os.environ.get("STATE_KEY", "state/.display_state.json")
 
 MAX_KEYS = int(os.environ.get("MAX_KEYS", "500"))
 URL_TTL_SECONDS = int(os.environ.get("URL_TTL_SECONDS", "120"))
+PREFETCH_URL_TTL_SECONDS = int(os.environ.get("PREFETCH_URL_TTL_SECONDS", "3600"))
+MAX_BATCH_COUNT = int(os.environ.get("MAX_BATCH_COUNT", "48"))
+INLINE_MAX_BYTES = int(os.environ.get("INLINE_MAX_BYTES", "1048576"))
+INLINE_MEDIA_TYPE = "image/bmp"
+CDN_DOMAIN = os.environ.get("CDN_DOMAIN", "")
+CDN_KEY_PAIR_ID = os.environ.get("CDN_KEY_PAIR_ID", "")
+CDN_PRIVATE_KEY_SECRET_ARN = os.environ.get("CDN_PRIVATE_KEY_SECRET_ARN", "")
+REFRESH_INTERVAL_SECONDS = int(os.environ.get("REFRESH_INTERVAL_SECONDS", "1800"))
+QUIET_HOURS = os.environ.get("QUIET_HOURS", "").strip()
+DISPLAY_UTC_OFFSET = os.environ.get("DISPLAY_UTC_OFFSET", "+00:00").strip()
+# Quiet periods are sent to devices as absolute ranges covering this many days
+QUIET_WINDOW_DAYS = int(os.environ.get("QUIET_WINDOW_DAYS", "7"))
 s3 = boto3.client("s3")
+_cdn_private_key = None
 
 
 def handler(event, _context):
     logger.info("Received event: %s", json.dumps({k: event.get(k) for k in ("httpMethod", "path")}))
 
     if "httpMethod" in event:
+        params = event.get("queryStringParameters") or {}
+        try:
+            count = _parse_count(params.get("count"))
+        except ValueError:
+            return _response(400, {"error": "invalid-count"})
         try:
-            payload = _process_next_image()
-            return _response(200, payload)
+            payload = _process_next_image(count)
+            common_headers = {
+                "etag": _quote_etag(str(payload["etag"])),
+                "x-next-refresh-after": str(payload["next_refresh_after"]),
+            }
+            if count is None and _etag_matches(event, str(payload["etag"])):
+                logger.info("Device already shows %s; returning 304", payload["object_key"])
+                return {"statusCode": 304, "headers": common_headers, "body": ""}
+            if count is None and _wants_inline(event):
+                inline = _inline_response(payload, common_headers)
+                if inline:
+                    return inline
+            return _response(200, payload, headers=common_headers)
         except Exception as exc:  # pragma: no cover
             logger.exception("Failed to process HTTP request")
             return _response(500, {"error": str(exc)})
@@ -34,7 +68,16 @@ def handler(event, _context):
     return _response(400, {"error": "unsupported-event"})
 
 
-def _process_next_image() -> Dict[str, object]:
+def _parse_count(raw) -> Optional[int]:
+    if raw is None or raw == "":
+        return None
+    count = int(raw)
+    if count < 1:
+        raise ValueError("count must be positive")
+    return min(count, MAX_BATCH_COUNT)
+
+
+def _process_next_image(count: Optional[int] = None) -> Dict[str, object]:
     state = _load_state()
     keys = _list_processed_keys()
     state_changed = _align_state_with_keys(state, keys)
@@ -42,43 +85,194 @@ def _process_next_image() -> Dict[str, object]:
     if not state:
         raise LookupError("No images available")
 
-    chosen = _select_next_key(state)
-    if not chosen:
-        raise LookupError("No image candidate")
+    wanted = count or 1
+    url_ttl = URL_TTL_SECONDS if count is None else max(URL_TTL_SECONDS, PREFETCH_URL_TTL_SECONDS)
+    now_ts = int(time.time())
+    selections: List[Dict[str, object]] = []
 
-    try:
-        s3.head_object(Bucket=ASSETS_BUCKET, Key=chosen)
-    except ClientError as exc:  # pragma: no cover
-        logger.warning("Stale entry %s detected (%s); pruning and retrying", chosen, exc)
-        state.pop(chosen, None)
-        _save_state(state)
-        return _process_next_image()
+    for chosen in _select_next_keys(state):
+        if len(selections) >= wanted:
+            break
+        try:
+            head = s3.head_object(Bucket=ASSETS_BUCKET, Key=chosen)
+        except ClientError as exc:  # pragma: no cover
+            logger.warning("Stale entry %s detected (%s); pruning", chosen, exc)
+            state.pop(chosen, None)
+            state_changed = True
+            continue
 
-    now_ts = int(time.time())
-    state[chosen] = now_ts
-    state_changed = True
+        # Reserve consecutive display slots so the next call continues after this batch.
+        displayed_at = now_ts + len(selections)
+        state[chosen] = displayed_at
+        state_changed = True
+
+        # Frames written by format_image carry a pointer to their content-addressed copy.
+        metadata = head.get("Metadata") or {}
+        frame_key = metadata.get("frame-key") or chosen
+        selections.append(
+            {
+                "bmp_url": _frame_url(frame_key, url_ttl),
+                "object_key": chosen,
+                "frame_key": frame_key,
+                "etag": metadata.get("frame-sha256") or head.get("ETag", "").strip('"'),
+                "displayed_at": displayed_at,
+                "expires_in": url_ttl,
+            }
+        )
 
     if state_changed:
         _save_state(state)
 
-    presigned_url = s3.generate_presigned_url(
+    if not selections:
+        raise LookupError("No image candidate")
+
+    payload: Dict[str, object] = dict(selections[0])
+    payload.update(_schedule_hints(now_ts))
+    if count is not None:
+        payload["images"] = selections
+        payload["count"] = len(selections)
+    return payload
+
+
+def _parse_clock(value: str) -> int:
+    hours, minutes = value.strip().split(":")
+    return (int(hours) % 24) * 3600 + int(minutes) * 60
+
+
+def _utc_offset_seconds() -> int:
+    sign = -1 if DISPLAY_UTC_OFFSET.startswith("-") else 1
+    return sign * _parse_clock(DISPLAY_UTC_OFFSET.lstrip("+-"))
+
+
+def _quiet_hours() -> Optional[Tuple[str, str]]:
+    if "-" not in QUIET_HOURS:
+        return None
+    start, end = (part.strip() for part in QUIET_HOURS.split("-", 1))
+    return start, end
+
+
+def _quiet_windows(now_ts: int) -> List[List[int]]:
+    """Upcoming quiet periods as ``[start, end)`` UNIX times, so devices never parse clocks or offsets."""
+    quiet = _quiet_hours()
+    if not quiet:
+        return []
+    start, end = (_parse_clock(value) for value in quiet)
+    length = (end - start) % 86400
+    if not length:
+        return []
+    local_midnight = now_ts - (now_ts + _utc_offset_seconds()) % 86400
+    windows = []
+    # Start a day early: an overnight window that began yesterday may still be open
+    for day in range(-1, QUIET_WINDOW_DAYS):
+        window_start = local_midnight + day * 86400 + start
+        if window_start + length > now_ts:
+            windows.append([window_start, window_start + length])
+    return windows
+
+
+def _skip_quiet_windows(ts: int, windows: List[List[int]]) -> int:
+    for start, end in windows:
+        if start <= ts < end:
+            return end
+    return ts
+
+
+def _schedule_hints(now_ts: int) -> Dict[str, object]:
+    """Tell devices when the next refresh is worth doing."""
+    quiet = _quiet_hours()
+    windows = _quiet_windows(now_ts)
+    return {
+        "next_refresh_after": _skip_quiet_windows(now_ts + REFRESH_INTERVAL_SECONDS, windows),
+        "refresh_interval": REFRESH_INTERVAL_SECONDS,
+        "quiet_hours": (
+            {"start": quiet[0], "end": quiet[1], "utc_offset": DISPLAY_UTC_OFFSET} if quiet else None
+        ),
+        "quiet_windows": windows,
+    }
+
+
+def _frame_url(frame_key: str, ttl: int) -> str:
+    if CDN_DOMAIN and frame_key.startswith(FRAMES_PREFIX):
+        return cloudfront_signer.generate_signed_url(
+            f"https://{CDN_DOMAIN}/{frame_key}",
+            CDN_KEY_PAIR_ID,
+            _cdn_signing_key(),
+            int(time.time()) + ttl,
+        )
+    return s3.generate_presigned_url(
         "get_object",
-        Params={"Bucket": ASSETS_BUCKET, "Key": chosen},
-        ExpiresIn=URL_TTL_SECONDS,
+        Params={"Bucket": ASSETS_BUCKET, "Key": frame_key},
+        ExpiresIn=ttl,
     )
 
+
+def _cdn_signing_key():
+    global _cdn_private_key
+    if _cdn_private_key is None:
+        secret = boto3.client("secretsmanager").get_secret_value(SecretId=CDN_PRIVATE_KEY_SECRET_ARN)
+        _cdn_private_key = cloudfront_signer.load_private_key(secret["SecretString"])
+    return _cdn_private_key
+
+
+def _request_header(event, name: str) -> str:
+    headers = {k.lower(): v for k, v in (event.get("headers") or {}).items()}
+    return headers.get(name.lower()) or ""
+
+
+def _quote_etag(etag: str) -> str:
+    return f'"{etag}"'
+
+
+def _etag_matches(event, etag: str) -> bool:
+    if not etag:
+        return False
+    candidates = _request_header(event, "If-None-Match")
+    for candidate in candidates.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == "*" or candidate.strip('"') == etag:
+            return True
+    return False
+
+
+def _wants_inline(event) -> bool:
+    params = event.get("queryStringParameters") or {}
+    if str(params.get("inline", "")).lower() in ("1", "true", "yes"):
+        return True
+    accept = _request_header(event, "Accept")
+    return accept.split(",")[0].split(";")[0].strip().lower() == INLINE_MEDIA_TYPE
+
+
+def _inline_response(payload: Dict[str, object], headers: Dict[str, str]) -> Optional[Dict]:
+    obj = s3.get_object(Bucket=ASSETS_BUCKET, Key=payload["frame_key"])
+    compressed = gzip.compress(obj["Body"].read(), compresslevel=9, mtime=0)
+    if len(compressed) > INLINE_MAX_BYTES:
+        logger.info(
+            "Frame %s is %d bytes compressed; falling back to presigned URL",
+            payload["object_key"],
+            len(compressed),
+        )
+        return None
     return {
-        "bmp_url": presigned_url,
-        "object_key": chosen,
-        "displayed_at": now_ts,
-        "expires_in": URL_TTL_SECONDS,
+        "statusCode": 200,
+        "headers": {
+            "content-type": INLINE_MEDIA_TYPE,
+            "content-encoding": "gzip",
+            "x-object-key": str(payload["object_key"]),
+            "x-frame-key": str(payload["frame_key"]),
+            "x-displayed-at": str(payload["displayed_at"]),
+            **headers,
+        },
+        "body": base64.b64encode(compressed).decode("ascii"),
+        "isBase64Encoded": True,
     }
 
 
-def _response(status: int, body: Dict) -> Dict:
+def _response(status: int, body: Dict, headers: Optional[Dict[str, str]] = None) -> Dict:
     return {
         "statusCode": status,
-        "headers": {"content-type": "application/json"},
+        "headers": {"content-type": "application/json", **(headers or {})},
         "body": json.dumps(body),
     }
 
@@ -128,26 +322,23 @@ def _list_processed_keys() -> List[str]:
 
 def _align_state_with_keys(state: Dict[str, int], keys: List[str]) -> bool:
     changed = False
+    known = set(keys)
     for key in keys:
         if key not in state:
             state[key] = 0
             changed = True
     for key in list(state.keys()):
-        if key not in keys:
+        if key not in known:
             state.pop(key, None)
             changed = True
     return changed
 
 
-def _select_next_key(state: Dict[str, int]) -> str:
-    if not state:
-        return ""
-
+def _select_next_keys(state: Dict[str, int]) -> List[str]:
     def sort_key(item):
         key, ts = item
         if ts <= 0:
             return (0, 0, key)
         return (1, ts, key)
 
-    sorted_items = sorted(state.items(), key=sort_key)
-    return sorted_items[0][0]
+    return [key for key, _ts in sorted(state.items(), key=sort_key)]
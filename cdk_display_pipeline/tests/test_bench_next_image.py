@@ -0,0 +1,37 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT / "tools") not in sys.path:
+    sys.path.insert(0, str(ROOT / "tools"))
+
+pytest.importorskip("boto3")
+
+import bench_next_image
+
+
+def test_benchmark_counts_s3_calls_per_request() -> None:
+    result = bench_next_image.run_benchmark(library_size=1500, requests=3, devices=2)
+
+    assert result["requests"] == 6
+    assert result["statuses"] == {200: 6}
+    calls = result["s3_calls_per_request"]
+    assert calls["ListObjectsV2"] == 2.0
+    assert calls["GetObject"] == 1.0
+    assert calls["HeadObject"] == 1.0
+    assert calls["PutObject"] == 1.0
+    assert result["bytes_from_s3_per_request"] > 0
+    assert result["p99_ms"] >= result["p50_ms"]
+    # Renders carry frame-key metadata, so every response points at frames/
+    assert result["frame_alias_ratio"] == 1.0
+
+
+def test_benchmark_leaves_process_environment_untouched() -> None:
+    before = dict(os.environ)
+
+    bench_next_image.run_benchmark(library_size=10, requests=1)
+
+    assert dict(os.environ) == before
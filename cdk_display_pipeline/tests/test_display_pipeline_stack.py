@@ -26,6 +26,7 @@ def test_stack_synthesizes_and_has_key_resources() -> None:
     template.resource_count_is("AWS::S3::Bucket", 1)
     template.resource_count_is("AWS::Lambda::Function", 3)
     template.resource_count_is("AWS::ApiGateway::RestApi", 1)
+    template.resource_count_is("AWS::CloudFront::Distribution", 0)
 
     # Spot check Lambda environment configuration
     functions = template.find_resources("AWS::Lambda::Function")
@@ -38,6 +39,108 @@ def test_stack_synthesizes_and_has_key_resources() -> None:
     assert isinstance(artifact.template, dict)
 
 
+def test_next_image_api_returns_binary_frames() -> None:
+    _, template = synthesize_stack()
+
+    template.has_resource_properties(
+        "AWS::ApiGateway::RestApi",
+        {"BinaryMediaTypes": ["image/bmp"]},
+    )
+
+
+def test_uploads_reach_format_image_through_eventbridge() -> None:
+    _, template = synthesize_stack()
+
+    notifications = template.find_resources("Custom::S3BucketNotifications")
+    config = next(iter(notifications.values()))["Properties"]["NotificationConfiguration"]
+    # Direct notifications would collide with other stacks watching the same prefix
+    assert config == {"EventBridgeConfiguration": {}}
+
+    rules = template.find_resources("AWS::Events::Rule")
+    assert len(rules) == 1
+    pattern = next(iter(rules.values()))["Properties"]["EventPattern"]
+    assert pattern["detail-type"] == ["Object Created"]
+    assert pattern["detail"]["object"]["key"] == [{"prefix": "uploads/"}]
+
+
+def test_format_image_writes_thumbnails_under_configured_prefix() -> None:
+    _, template = synthesize_stack({"thumbnailsPrefix": "thumbs/", "thumbnailMaxEdge": 256})
+
+    functions = template.find_resources("AWS::Lambda::Function")
+    envs = [
+        props["Properties"].get("Environment", {}).get("Variables", {})
+        for props in functions.values()
+    ]
+    format_env = next(env for env in envs if "DEST_BUCKET" in env)
+    assert format_env["THUMBNAILS_PREFIX"] == "thumbs/"
+    assert format_env["THUMBNAIL_MAX_EDGE"] == "256"
+
+
+def test_format_image_previews_expire_under_configured_prefix() -> None:
+    _, template = synthesize_stack({"previewsPrefix": "drafts/"})
+
+    functions = template.find_resources("AWS::Lambda::Function")
+    format_env = next(
+        env
+        for env in (props["Properties"].get("Environment", {}).get("Variables", {}) for props in functions.values())
+        if "DEST_BUCKET" in env
+    )
+    assert format_env["PREVIEWS_PREFIX"] == "drafts/"
+    assert format_env["UPLOAD_PREFIX"] == "uploads/"
+    template.has_resource_properties(
+        "AWS::S3::Bucket",
+        {
+            "LifecycleConfiguration": {
+                "Rules": [{"Id": "ExpirePreviews", "Prefix": "drafts/", "ExpirationInDays": 7, "Status": "Enabled"}]
+            }
+        },
+    )
+    assert "FormatImageFunctionName" in template.to_json().get("Outputs", {})
+
+
+def test_format_image_may_delete_superseded_frames_only() -> None:
+    _, template = synthesize_stack({"framesPrefix": "cas/"})
+
+    statements = [
+        statement
+        for policy in template.find_resources("AWS::IAM::Policy").values()
+        for statement in policy["Properties"]["PolicyDocument"]["Statement"]
+        if statement["Action"] == "s3:DeleteObject*"
+    ]
+    resources = [statement["Resource"] for statement in statements]
+    assert any("/cas/*" in str(resource) for resource in resources)
+
+
+def test_frames_cdn_created_when_signing_keys_provided() -> None:
+    _, template = synthesize_stack(
+        {
+            "framesCdnPublicKeyPem": "-----BEGIN PUBLIC KEY-----\nMIIBIjANBgkq\n-----END PUBLIC KEY-----",
+            "framesCdnPrivateKeySecretArn": (
+                "arn:aws:secretsmanager:ap-northeast-1:123456789012:secret:frames-cdn-key-AbCdEf"
+            ),
+        }
+    )
+
+    template.resource_count_is("AWS::CloudFront::Distribution", 1)
+    template.resource_count_is("AWS::CloudFront::KeyGroup", 1)
+    template.resource_count_is("AWS::CloudFront::OriginAccessControl", 1)
+
+    functions = template.find_resources("AWS::Lambda::Function")
+    envs = [
+        props["Properties"].get("Environment", {}).get("Variables", {})
+        for props in functions.values()
+    ]
+    next_image_env = next(env for env in envs if "STATE_KEY" in env)
+    assert "CDN_DOMAIN" in next_image_env
+    assert "CDN_KEY_PAIR_ID" in next_image_env
+
+
+def test_frames_cdn_requires_both_keys() -> None:
+    app = cdk.App(context={"framesCdnPublicKeyPem": "-----BEGIN PUBLIC KEY-----"})
+    with pytest.raises(ValueError, match="framesCdnPrivateKeySecretArn"):
+        DisplayPipelineStack(app, "FramesCdnValidationStack")
+
+
 def test_manage_dns_requires_hosted_zone() -> None:
     app = cdk.App(
         context={
@@ -0,0 +1,81 @@
+import importlib.util
+import io
+import os
+from pathlib import Path
+from unittest import mock
+
+import pytest
+
+pytest.importorskip("boto3")
+Image = pytest.importorskip("PIL.Image")
+
+from botocore.exceptions import ClientError
+
+HANDLER_PATH = Path(__file__).resolve().parents[1] / "lambda" / "format_image" / "handler.py"
+BUCKET = "test-assets"
+
+
+class FakeS3:
+    """Just enough of S3 for format_image's render path."""
+
+    def __init__(self) -> None:
+        self.objects = {}
+
+    def get_object(self, Bucket: str, Key: str, **_kwargs):
+        return {"Body": io.BytesIO(self.objects[Key][0])}
+
+    def put_object(self, Bucket: str, Key: str, Body=b"", Metadata=None, **_kwargs):
+        self.objects[Key] = (Body, dict(Metadata or {}))
+        return {}
+
+    def head_object(self, Bucket: str, Key: str, **_kwargs):
+        if Key not in self.objects:
+            raise ClientError({"Error": {"Code": "404"}}, "HeadObject")
+        return {"Metadata": dict(self.objects[Key][1])}
+
+    def delete_object(self, Bucket: str, Key: str):
+        self.objects.pop(Key, None)
+        return {}
+
+    def list_objects_v2(self, Bucket: str, Prefix: str, MaxKeys: int = 1000):
+        keys = sorted(k for k in self.objects if k.startswith(Prefix))[:MaxKeys]
+        return {"KeyCount": len(keys), "Contents": [{"Key": k} for k in keys]}
+
+
+@pytest.fixture
+def fake() -> FakeS3:
+    return FakeS3()
+
+
+@pytest.fixture
+def format_image(fake: FakeS3):
+    spec = importlib.util.spec_from_file_location("format_image_under_test", HANDLER_PATH)
+    module = importlib.util.module_from_spec(spec)
+    assert spec.loader is not None
+    with mock.patch.dict(os.environ, {"AWS_DEFAULT_REGION": "us-east-1", "DEST_BUCKET": BUCKET}):
+        spec.loader.exec_module(module)
+    module.s3 = fake
+    return module
+
+
+def _render(format_image, fake: FakeS3, key: str, color: str) -> str:
+    buffer = io.BytesIO()
+    Image.new("RGB", (80, 48), color).save(buffer, format="JPEG")
+    fake.objects[key] = (buffer.getvalue(), {})
+    format_image.handler({"Records": [{"s3": {"bucket": {"name": BUCKET}, "object": {"key": key}}}]}, None)
+    stem = os.path.splitext(os.path.basename(key))[0]
+    return fake.objects[f"processed/{stem}.bmp"][1]["frame-key"]
+
+
+def test_rerender_keeps_a_frame_another_upload_still_uses(format_image, fake: FakeS3) -> None:
+    shared = _render(format_image, fake, "uploads/a.jpg", "white")
+    assert _render(format_image, fake, "uploads/b.jpg", "white") == shared
+
+    # a moves to a new frame; b still renders to the shared one
+    assert _render(format_image, fake, "uploads/a.jpg", "black") != shared
+    assert shared in fake.objects
+
+    _render(format_image, fake, "uploads/b.jpg", "black")
+    assert shared not in fake.objects
+    digest = shared[len("frames/"):-len(".bmp")]
+    assert not [k for k in fake.objects if k.startswith(f"frame-refs/{digest}/")]
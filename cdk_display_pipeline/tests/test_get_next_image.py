@@ -0,0 +1,170 @@
+import base64
+import gzip
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT / "tools") not in sys.path:
+    sys.path.insert(0, str(ROOT / "tools"))
+
+pytest.importorskip("boto3")
+
+from bench_next_image import InMemoryS3, load_handler, seed_library
+
+
+@pytest.fixture
+def fake() -> InMemoryS3:
+    fake = InMemoryS3()
+    seed_library(fake, 5, frame_bytes=4096)
+    return fake
+
+
+@pytest.fixture
+def next_image(fake: InMemoryS3):
+    return load_handler(fake, max_keys=100)
+
+
+def _get(module, params=None, headers=None) -> dict:
+    return module.handler(
+        {"httpMethod": "GET", "path": "/next-image", "queryStringParameters": params, "headers": headers or {}},
+        None,
+    )
+
+
+@pytest.mark.parametrize("raw, expected", [(None, None), ("", None), ("1", 1), ("3", 3), ("48", 48), ("1000", 48)])
+def test_parse_count_caps_at_the_batch_limit(next_image, raw, expected) -> None:
+    assert next_image._parse_count(raw) == expected
+
+
+@pytest.mark.parametrize("raw", ["0", "-2", "abc", "1.5"])
+def test_invalid_count_is_rejected(next_image, fake: InMemoryS3, raw) -> None:
+    resp = _get(next_image, {"count": raw})
+
+    assert resp["statusCode"] == 400
+    assert json.loads(resp["body"]) == {"error": "invalid-count"}
+    assert not fake.calls
+
+
+def test_batch_reserves_consecutive_distinct_frames(next_image) -> None:
+    first = json.loads(_get(next_image, {"count": "3"})["body"])
+    second = json.loads(_get(next_image, {"count": "3"})["body"])
+
+    assert first["count"] == 3
+    keys = [image["object_key"] for image in first["images"]]
+    assert len(set(keys)) == 3
+    assert [image["displayed_at"] for image in first["images"]] == [first["displayed_at"] + n for n in range(3)]
+    assert all(image["expires_in"] >= next_image.PREFETCH_URL_TTL_SECONDS for image in first["images"])
+    # The next batch continues with frames the first one did not reserve
+    assert not set(keys) & {image["object_key"] for image in second["images"][:2]}
+
+
+@pytest.mark.parametrize("request_kwargs", [
+    {"headers": {"Accept": "image/bmp"}},
+    {"params": {"inline": "1"}},
+])
+def test_inline_response_carries_the_gzipped_frame(next_image, fake: InMemoryS3, request_kwargs) -> None:
+    resp = _get(next_image, **request_kwargs)
+
+    assert resp["statusCode"] == 200
+    assert resp["isBase64Encoded"] is True
+    headers = resp["headers"]
+    assert (headers["content-type"], headers["content-encoding"]) == ("image/bmp", "gzip")
+    frame = fake.get_object(Bucket="", Key=headers["x-frame-key"])["Body"].read()
+    assert gzip.decompress(base64.b64decode(resp["body"])) == frame
+    assert headers["x-object-key"].startswith("processed/")
+
+
+def test_inline_falls_back_to_a_url_above_the_size_limit(next_image, monkeypatch) -> None:
+    monkeypatch.setattr(next_image, "INLINE_MAX_BYTES", 10)
+
+    resp = _get(next_image, headers={"Accept": "image/bmp"})
+
+    assert resp["headers"]["content-type"] == "application/json"
+    assert json.loads(resp["body"])["bmp_url"]
+
+
+def test_batches_and_json_accept_are_never_inline(next_image) -> None:
+    assert "isBase64Encoded" not in _get(next_image, {"count": "2", "inline": "1"})
+    assert "isBase64Encoded" not in _get(next_image, headers={"Accept": "application/json, image/bmp"})
+
+
+@pytest.mark.parametrize("header, matches", [
+    ('"abc"', True),
+    ("abc", True),
+    ('W/"abc"', True),
+    ("*", True),
+    ('"old", W/"abc"', True),
+    ('"old", "older"', False),
+    ("", False),
+])
+def test_etag_matches_if_none_match_forms(next_image, header, matches) -> None:
+    assert next_image._etag_matches({"headers": {"if-none-match": header}}, "abc") is matches
+
+
+def test_unchanged_frame_revalidates_to_304() -> None:
+    fake = InMemoryS3()
+    # With one frame the next frame is always the one the device already shows
+    seed_library(fake, 1)
+    next_image = load_handler(fake, max_keys=100)
+    etag = _get(next_image)["headers"]["etag"]
+
+    resp = _get(next_image, headers={"If-None-Match": etag})
+    assert (resp["statusCode"], resp["body"]) == (304, "")
+    assert resp["headers"]["etag"] == etag
+    assert _get(next_image, headers={"If-None-Match": '"other"'})["statusCode"] == 200
+    # Batches always carry their URLs
+    assert _get(next_image, {"count": "1"}, headers={"If-None-Match": etag})["statusCode"] == 200
+
+
+# 2026-01-01T00:00:00Z, 09:00 at +09:00
+NOW = 1767225600
+JST_22 = 1767272400  # 2026-01-01 22:00 +09:00
+
+
+def test_overnight_quiet_window_in_a_non_utc_zone(next_image, monkeypatch) -> None:
+    monkeypatch.setattr(next_image, "QUIET_HOURS", "22:00-06:00")
+    monkeypatch.setattr(next_image, "DISPLAY_UTC_OFFSET", "+09:00")
+
+    windows = next_image._quiet_windows(NOW)
+
+    # Last night's window closed at 06:00 local, so the first one is tonight's
+    assert windows[0] == [JST_22, JST_22 + 8 * 3600]
+    assert len(windows) == next_image.QUIET_WINDOW_DAYS
+    assert all(end - start == 8 * 3600 for start, end in windows)
+
+
+@pytest.mark.parametrize("offset, seconds", [("+00:00", 0), ("+05:30", 19800), ("-08:00", -28800)])
+def test_quiet_windows_start_at_local_clock_time(next_image, monkeypatch, offset, seconds) -> None:
+    monkeypatch.setattr(next_image, "QUIET_HOURS", "23:30-07:00")
+    monkeypatch.setattr(next_image, "DISPLAY_UTC_OFFSET", offset)
+
+    for start, _end in next_image._quiet_windows(NOW):
+        assert (start + seconds) % 86400 == 23 * 3600 + 30 * 60
+
+
+def test_schedule_hints_skip_to_the_end_of_an_open_window(next_image, monkeypatch) -> None:
+    monkeypatch.setattr(next_image, "QUIET_HOURS", "22:00-06:00")
+    monkeypatch.setattr(next_image, "DISPLAY_UTC_OFFSET", "+09:00")
+
+    # 23:00 local: the window that opened an hour ago is still open
+    hints = next_image._schedule_hints(JST_22 + 3600)
+
+    assert hints["quiet_windows"][0] == [JST_22, JST_22 + 8 * 3600]
+    assert hints["next_refresh_after"] == JST_22 + 8 * 3600
+    assert hints["quiet_hours"] == {"start": "22:00", "end": "06:00", "utc_offset": "+09:00"}
+
+
+def test_schedule_hints_without_quiet_hours(next_image, monkeypatch) -> None:
+    monkeypatch.setattr(next_image, "QUIET_HOURS", "")
+
+    hints = next_image._schedule_hints(NOW)
+
+    assert hints == {
+        "next_refresh_after": NOW + next_image.REFRESH_INTERVAL_SECONDS,
+        "refresh_interval": next_image.REFRESH_INTERVAL_SECONDS,
+        "quiet_hours": None,
+        "quiet_windows": [],
+    }
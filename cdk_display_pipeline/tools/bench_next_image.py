@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""Offline load test for the get_next_image Lambda.
+
+The handler is imported in-process and its module-level ``s3`` client is
+replaced with an in-memory fake that counts every S3 API call and the
+bytes each call would move. Nothing touches the network, so results are
+reproducible on a laptop or in CI.
+
+Usage:
+  python tools/bench_next_image.py --sizes 1000,10000,100000 --requests 50 --devices 4
+"""
+
+from __future__ import annotations
+
+import argparse
+import bisect
+import hashlib
+import importlib.util
+import io
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+from unittest import mock
+
+from botocore.exceptions import ClientError
+
+PACKAGE_ROOT = Path(__file__).resolve().parents[1]
+HANDLER_PATH = PACKAGE_ROOT / "lambda" / "get_next_image" / "handler.py"
+BUCKET = "bench-assets"
+PROCESSED_PREFIX = "processed/"
+FRAMES_PREFIX = "frames/"
+STATE_KEY = "state/.display_state.json"
+# Approximate XML bytes per <Contents> entry in a ListObjectsV2 response (excluding the key)
+LIST_ENTRY_OVERHEAD_BYTES = 250
+
+
+class _NoSuchKey(Exception):
+    pass
+
+
+class InMemoryS3:
+    """Thread-safe subset of the boto3 S3 client used by get_next_image."""
+
+    class exceptions:  # noqa: N801 - mirrors boto3's client.exceptions
+        NoSuchKey = _NoSuchKey
+
+    def __init__(self, latency_ms: float = 0.0) -> None:
+        self._objects: Dict[str, bytes] = {}
+        self._metadata: Dict[str, Dict[str, str]] = {}
+        self._sorted_keys: List[str] = []
+        self._lock = threading.Lock()
+        self._latency = latency_ms / 1000.0
+        self.calls: Counter = Counter()
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def seed(self, key: str, body: bytes, metadata: Optional[Dict[str, str]] = None) -> None:
+        with self._lock:
+            self._store(key, body, metadata)
+
+    def _store(self, key: str, body: bytes, metadata: Optional[Dict[str, str]] = None) -> None:
+        if key not in self._objects:
+            bisect.insort(self._sorted_keys, key)
+        self._objects[key] = body
+        self._metadata[key] = dict(metadata or {})
+
+    def reset_counters(self) -> None:
+        with self._lock:
+            self.calls.clear()
+            self.bytes_in = 0
+            self.bytes_out = 0
+
+    def _record(self, operation: str, bytes_out: int = 0, bytes_in: int = 0) -> None:
+        if self._latency:
+            time.sleep(self._latency)
+        with self._lock:
+            self.calls[operation] += 1
+            self.bytes_out += bytes_out
+            self.bytes_in += bytes_in
+
+    def get_object(self, Bucket: str, Key: str, **_kwargs):
+        with self._lock:
+            body = self._objects.get(Key)
+        if body is None:
+            self._record("GetObject")
+            raise _NoSuchKey(Key)
+        self._record("GetObject", bytes_out=len(body))
+        return {"Body": io.BytesIO(body), "ContentLength": len(body)}
+
+    def put_object(self, Bucket: str, Key: str, Body, Metadata: Optional[Dict[str, str]] = None, **_kwargs):
+        data = Body if isinstance(Body, bytes) else Body.read()
+        with self._lock:
+            self._store(Key, data, Metadata)
+        self._record("PutObject", bytes_in=len(data))
+        return {}
+
+    def head_object(self, Bucket: str, Key: str, **_kwargs):
+        with self._lock:
+            body = self._objects.get(Key)
+            metadata = dict(self._metadata.get(Key) or {})
+        self._record("HeadObject")
+        if body is None:
+            raise ClientError({"Error": {"Code": "404", "Message": "Not Found"}}, "HeadObject")
+        return {"ContentLength": len(body), "ETag": f'"{hashlib.md5(body).hexdigest()}"', "Metadata": metadata}
+
+    def generate_presigned_url(self, ClientMethod: str, Params: dict, ExpiresIn: int) -> str:
+        # Presigning is local CPU work in boto3 as well; count it without latency
+        with self._lock:
+            self.calls["Presign"] += 1
+        return f"https://{Params['Bucket']}.s3.local/{Params['Key']}?X-Amz-Expires={ExpiresIn}"
+
+    def get_paginator(self, operation: str):
+        if operation != "list_objects_v2":
+            raise NotImplementedError(operation)
+        return _ListPaginator(self)
+
+    def _list_page(self, prefix: str, start_after: Optional[str], page_size: int) -> dict:
+        with self._lock:
+            if start_after is None:
+                start = bisect.bisect_left(self._sorted_keys, prefix)
+            else:
+                start = bisect.bisect_right(self._sorted_keys, start_after)
+            window = self._sorted_keys[start : start + page_size + 1]
+            keys = [k for k in window if k.startswith(prefix)]
+            page = keys[:page_size]
+            sizes = [len(self._objects[k]) for k in page]
+        now = datetime.now(timezone.utc)
+        contents = [{"Key": k, "Size": size, "LastModified": now} for k, size in zip(page, sizes)]
+        self._record(
+            "ListObjectsV2",
+            bytes_out=sum(len(k) + LIST_ENTRY_OVERHEAD_BYTES for k in page),
+        )
+        return {"Contents": contents, "IsTruncated": len(keys) > page_size}
+
+
+class _ListPaginator:
+    def __init__(self, client: InMemoryS3) -> None:
+        self._client = client
+
+    def paginate(self, Bucket: str, Prefix: str = "", PaginationConfig: Optional[dict] = None, **_kwargs):
+        page_size = int((PaginationConfig or {}).get("PageSize", 1000))
+        start_after = None
+        while True:
+            page = self._client._list_page(Prefix, start_after, page_size)
+            yield page
+            if not page["IsTruncated"]:
+                return
+            start_after = page["Contents"][-1]["Key"]
+
+
+def seed_library(fake: InMemoryS3, library_size: int, frame_bytes: int = 0) -> None:
+    """Renders as format_image writes them: a processed alias pointing at its frames/ copy."""
+    body = b"\0" * frame_bytes
+    for index in range(library_size):
+        # Distinct per frame without hashing ``body`` library_size times
+        sha256 = hashlib.sha256(f"frame-{index}".encode("ascii")).hexdigest()
+        frame_key = f"{FRAMES_PREFIX}{sha256}.bmp"
+        fake.seed(frame_key, body)
+        fake.seed(
+            f"{PROCESSED_PREFIX}frame-{index:07d}.bmp",
+            body,
+            {"frame-key": frame_key, "frame-sha256": sha256, "source-key": f"uploads/frame-{index:07d}.jpg"},
+        )
+
+
+def load_handler(fake: InMemoryS3, max_keys: int):
+    """Import a fresh copy of the handler module wired to ``fake``.
+
+    The handler reads its configuration at import time, so the environment is
+    only patched for the import and nothing leaks into the calling process.
+    """
+    env = {
+        "AWS_DEFAULT_REGION": os.environ.get("AWS_DEFAULT_REGION", "us-east-1"),
+        "ASSETS_BUCKET": BUCKET,
+        "PROCESSED_PREFIX": PROCESSED_PREFIX,
+        "FRAMES_PREFIX": FRAMES_PREFIX,
+        "STATE_KEY": STATE_KEY,
+        "MAX_KEYS": str(max_keys),
+    }
+    handler_dir = str(HANDLER_PATH.parent)
+    if handler_dir not in sys.path:
+        sys.path.insert(0, handler_dir)
+    spec = importlib.util.spec_from_file_location(f"get_next_image_bench_{id(fake)}", HANDLER_PATH)
+    module = importlib.util.module_from_spec(spec)
+    assert spec.loader is not None
+    with mock.patch.dict(os.environ, env):
+        spec.loader.exec_module(module)
+    module.s3 = fake
+    module.logger.setLevel("WARNING")
+    return module
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def run_benchmark(
+    library_size: int,
+    requests: int = 50,
+    devices: int = 1,
+    frame_bytes: int = 0,
+    latency_ms: float = 0.0,
+) -> dict:
+    fake = InMemoryS3(latency_ms=latency_ms)
+    seed_library(fake, library_size, frame_bytes)
+    module = load_handler(fake, max_keys=library_size)
+
+    # The first call creates the state file; keep it out of the steady-state numbers
+    module.handler({"httpMethod": "GET", "path": "/next-image"}, None)
+    fake.reset_counters()
+
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    aliased = 0
+    lock = threading.Lock()
+
+    def device(_device_id: int) -> None:
+        nonlocal aliased
+        for _ in range(requests):
+            started = time.perf_counter()
+            response = module.handler({"httpMethod": "GET", "path": "/next-image"}, None)
+            elapsed = (time.perf_counter() - started) * 1000.0
+            payload = json.loads(response["body"]) if response["statusCode"] == 200 else {}
+            with lock:
+                latencies.append(elapsed)
+                statuses[response["statusCode"]] += 1
+                # Served through the content-addressed alias rather than processed/
+                aliased += payload.get("frame_key", "").startswith(FRAMES_PREFIX)
+
+    wall_started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=devices) as pool:
+        list(pool.map(device, range(devices)))
+    wall_seconds = time.perf_counter() - wall_started
+
+    total = len(latencies)
+    return {
+        "library_size": library_size,
+        "devices": devices,
+        "requests": total,
+        "statuses": dict(statuses),
+        "frame_alias_ratio": round(aliased / total, 2) if total else 0.0,
+        "p50_ms": round(_percentile(latencies, 50), 3),
+        "p99_ms": round(_percentile(latencies, 99), 3),
+        "mean_ms": round(statistics.fmean(latencies), 3) if latencies else 0.0,
+        "throughput_rps": round(total / wall_seconds, 2) if wall_seconds else 0.0,
+        "s3_calls_per_request": {op: round(count / total, 2) for op, count in sorted(fake.calls.items())},
+        "bytes_from_s3_per_request": round(fake.bytes_out / total) if total else 0,
+        "bytes_to_s3_per_request": round(fake.bytes_in / total) if total else 0,
+    }
+
+
+def _format_row(result: dict) -> str:
+    calls = ", ".join(f"{op}={count}" for op, count in result["s3_calls_per_request"].items())
+    return (
+        f"{result['library_size']:>8} {result['devices']:>7} {result['requests']:>8} "
+        f"{result['p50_ms']:>9.2f} {result['p99_ms']:>9.2f} "
+        f"{result['bytes_from_s3_per_request']:>11} {result['bytes_to_s3_per_request']:>11}  {calls}"
+    )
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,10000,100000", help="comma separated library sizes")
+    parser.add_argument("--requests", type=int, default=50, help="requests per device")
+    parser.add_argument("--devices", type=int, default=1, help="concurrent devices (threads)")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="simulated latency per S3 call")
+    parser.add_argument("--json", action="store_true", help="print results as JSON lines")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+    if not args.json:
+        print(f"{'keys':>8} {'devices':>7} {'requests':>8} {'p50 ms':>9} {'p99 ms':>9} {'from S3 B':>11} {'to S3 B':>11}  S3 calls/request")
+    for size in sizes:
+        result = run_benchmark(size, args.requests, args.devices, latency_ms=args.latency_ms)
+        print(json.dumps(result) if args.json else _format_row(result), flush=True)
+
+
+if __name__ == "__main__":
+    main()
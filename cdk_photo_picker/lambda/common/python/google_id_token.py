@@ -0,0 +1,144 @@
+"""Verify Google ID tokens locally against Google's published signing keys.
+
+Shipped as a Lambda layer shared by the presign and manage_uploads functions.
+Keys are cached for the lifetime of the execution environment and refreshed
+when Google's Cache-Control max-age lapses or a token names an unknown ``kid``.
+Tokens that already passed verification are remembered until they expire.
+"""
+
+import base64
+import hashlib
+import json
+import re
+import threading
+import time
+import urllib.error
+import urllib.request
+from typing import Dict, Optional, Tuple
+
+import rsa_pkcs1
+
+JWKS_URL = "https://www.googleapis.com/oauth2/v3/certs"
+GOOGLE_ISSUERS = ("accounts.google.com", "https://accounts.google.com")
+FETCH_TIMEOUT_SECONDS = 5
+DEFAULT_KEYS_MAX_AGE = 3600
+# Minimum spacing between refetches triggered by an unknown kid
+UNKNOWN_KID_REFRESH_SECONDS = 60
+MAX_VERIFIED_TOKENS = 256
+
+_MAX_AGE = re.compile(r"max-age=(\d+)")
+
+_lock = threading.Lock()
+_keys: Dict[str, Tuple[int, int]] = {}
+_keys_expire_at = 0.0
+_keys_fetched_at = 0.0
+_verified: Dict[str, Tuple[int, dict]] = {}
+
+
+def _b64url_decode(value: str) -> bytes:
+    return base64.urlsafe_b64decode(value + "=" * (-len(value) % 4))
+
+
+def _fetch_jwks() -> Tuple[dict, int]:
+    """Return the JWKS document and how long it may be cached."""
+    with urllib.request.urlopen(JWKS_URL, timeout=FETCH_TIMEOUT_SECONDS) as resp:
+        cache_control = resp.headers.get("Cache-Control") or ""
+        document = json.loads(resp.read().decode("utf-8"))
+    match = _MAX_AGE.search(cache_control)
+    return document, int(match.group(1)) if match else DEFAULT_KEYS_MAX_AGE
+
+
+def _refresh_keys(now: float) -> None:
+    global _keys, _keys_expire_at, _keys_fetched_at
+    document, max_age = _fetch_jwks()
+    keys: Dict[str, Tuple[int, int]] = {}
+    for jwk in document.get("keys", []):
+        if jwk.get("kty") != "RSA" or not jwk.get("kid"):
+            continue
+        modulus = int.from_bytes(_b64url_decode(jwk["n"]), "big")
+        exponent = int.from_bytes(_b64url_decode(jwk["e"]), "big")
+        keys[jwk["kid"]] = (modulus, exponent)
+    _keys = keys
+    _keys_fetched_at = now
+    _keys_expire_at = now + max_age
+
+
+def _signing_key(kid: str) -> Optional[Tuple[int, int]]:
+    now = time.time()
+    with _lock:
+        if now >= _keys_expire_at:
+            _refresh_keys(now)
+        elif kid not in _keys and now - _keys_fetched_at >= UNKNOWN_KID_REFRESH_SECONDS:
+            # Google rotates keys; a new kid can appear before max-age runs out
+            _refresh_keys(now)
+        return _keys.get(kid)
+
+
+def _rs256_valid(signing_input: bytes, signature: bytes, key: Tuple[int, int]) -> bool:
+    return rsa_pkcs1.verify(signing_input, signature, key, "sha256")
+
+
+def _check_claims(claims: dict, audience: Optional[str], now: int) -> Optional[str]:
+    exp = int(claims.get("exp", 0)) if claims.get("exp") else 0
+    if audience and claims.get("aud") != audience:
+        return "invalid audience"
+    if claims.get("iss") not in GOOGLE_ISSUERS:
+        return "invalid issuer"
+    if exp and now > exp:
+        return "token expired"
+    return None
+
+
+def _remember(cache_key: str, exp: int, claims: dict, now: int) -> None:
+    with _lock:
+        if len(_verified) >= MAX_VERIFIED_TOKENS:
+            for key, (expires_at, _claims) in list(_verified.items()):
+                if expires_at < now:
+                    del _verified[key]
+            if len(_verified) >= MAX_VERIFIED_TOKENS:
+                _verified.pop(next(iter(_verified)))
+        _verified[cache_key] = (exp, claims)
+
+
+def verify(id_token: str, audience: Optional[str] = None) -> Tuple[bool, dict]:
+    """Return ``(True, claims)`` for a valid token or ``(False, {"error": ...})``."""
+    if not id_token:
+        return False, {"error": "missing id token"}
+
+    now = int(time.time())
+    cache_key = hashlib.sha256(f"{audience or ''}\0{id_token}".encode("utf-8")).hexdigest()
+    cached = _verified.get(cache_key)
+    if cached and now <= cached[0]:
+        return True, dict(cached[1])
+
+    try:
+        header_b64, payload_b64, signature_b64 = id_token.split(".")
+        header = json.loads(_b64url_decode(header_b64))
+        claims = json.loads(_b64url_decode(payload_b64))
+        signature = _b64url_decode(signature_b64)
+    except (ValueError, TypeError):
+        return False, {"error": "malformed id token"}
+    if not isinstance(header, dict) or not isinstance(claims, dict):
+        return False, {"error": "malformed id token"}
+    if header.get("alg") != "RS256":
+        return False, {"error": "unsupported algorithm"}
+
+    try:
+        key = _signing_key(str(header.get("kid") or ""))
+    except urllib.error.HTTPError as exc:
+        return False, {"error": f"jwks http {exc.code}"}
+    except Exception as exc:
+        return False, {"error": str(exc)}
+    if key is None:
+        return False, {"error": "unknown key id"}
+    if not _rs256_valid(f"{header_b64}.{payload_b64}".encode("ascii"), signature, key):
+        return False, {"error": "invalid signature"}
+
+    error = _check_claims(claims, audience, now)
+    if error:
+        return False, {"error": error}
+
+    exp = int(claims.get("exp", 0)) if claims.get("exp") else 0
+    if exp:
+        _remember(cache_key, exp, claims, now)
+    return True, dict(claims)
@@ -0,0 +1,95 @@
+"""RSASSA-PKCS1-v1_5 (RFC 8017) on plain integers, without native packages.
+
+The single RSA implementation behind CloudFront signing (``cloudfront_signer``)
+and Google ID token checks (``google_id_token``). Identical copies live in
+``cdk_photo_picker/lambda/common/python`` and
+``cdk_display_pipeline/lambda/get_next_image``; change both together.
+
+Python's big-integer ``pow`` does not run in constant time. ``sign`` blinds the
+message with a fresh random factor, so the time taken no longer depends on what
+is being signed; timing still reflects the private exponent itself, the same on
+every call, so keep these keys to CloudFront key groups where they can be
+rotated.
+"""
+
+import base64
+import hashlib
+import re
+import secrets
+from typing import Tuple
+
+# DER-encoded DigestInfo prefixes (RFC 8017, section 9.2)
+_DIGEST_INFO = {
+    "sha1": bytes.fromhex("3021300906052b0e03021a05000414"),
+    "sha256": bytes.fromhex("3031300d060960864801650304020105000420"),
+}
+_PEM_BODY = re.compile(r"-----BEGIN [A-Z ]+-----(.*?)-----END [A-Z ]+-----", re.S)
+
+
+def _read_tlv(data: bytes, pos: int) -> Tuple[int, bytes, int]:
+    tag = data[pos]
+    length = data[pos + 1]
+    pos += 2
+    if length & 0x80:
+        size = length & 0x7F
+        length = int.from_bytes(data[pos : pos + size], "big")
+        pos += size
+    return tag, data[pos : pos + length], pos + length
+
+
+def _parse_private_key(der: bytes) -> Tuple[int, int, int]:
+    """Return (modulus, public exponent, private exponent) from PKCS#1 or PKCS#8 DER."""
+    tag, body, _ = _read_tlv(der, 0)
+    if tag != 0x30:
+        raise ValueError("private key is not a DER sequence")
+    _tag, _version, pos = _read_tlv(body, 0)
+    tag, value, pos = _read_tlv(body, pos)
+    if tag == 0x30:
+        # PKCS#8: AlgorithmIdentifier followed by an OCTET STRING holding PKCS#1
+        tag, value, _ = _read_tlv(body, pos)
+        if tag != 0x04:
+            raise ValueError("unsupported PKCS#8 private key")
+        return _parse_private_key(value)
+    modulus = int.from_bytes(value, "big")
+    _tag, value, pos = _read_tlv(body, pos)
+    public_exponent = int.from_bytes(value, "big")
+    _tag, value, _ = _read_tlv(body, pos)
+    return modulus, public_exponent, int.from_bytes(value, "big")
+
+
+def load_private_key(pem: str) -> Tuple[int, int, int]:
+    match = _PEM_BODY.search(pem)
+    if not match:
+        raise ValueError("private key must be PEM encoded")
+    return _parse_private_key(base64.b64decode("".join(match.group(1).split())))
+
+
+def _encode(message: bytes, hash_name: str, size: int) -> bytes:
+    digest_info = _DIGEST_INFO[hash_name] + hashlib.new(hash_name, message).digest()
+    return b"\x00\x01" + b"\xff" * (size - len(digest_info) - 3) + b"\x00" + digest_info
+
+
+def sign(message: bytes, private_key: Tuple[int, int, int], hash_name: str = "sha256") -> bytes:
+    modulus, public_exponent, private_exponent = private_key
+    size = (modulus.bit_length() + 7) // 8
+    value = int.from_bytes(_encode(message, hash_name, size), "big")
+    while True:
+        blind = secrets.randbelow(modulus - 2) + 2
+        try:
+            unblind = pow(blind, -1, modulus)
+        except ValueError:
+            continue
+        break
+    blinded = value * pow(blind, public_exponent, modulus) % modulus
+    return (pow(blinded, private_exponent, modulus) * unblind % modulus).to_bytes(size, "big")
+
+
+def verify(message: bytes, signature: bytes, public_key: Tuple[int, int], hash_name: str = "sha256") -> bool:
+    modulus, exponent = public_key
+    size = (modulus.bit_length() + 7) // 8
+    if len(signature) != size:
+        return False
+    value = int.from_bytes(signature, "big")
+    if value >= modulus:
+        return False
+    return pow(value, exponent, modulus).to_bytes(size, "big") == _encode(message, hash_name, size)
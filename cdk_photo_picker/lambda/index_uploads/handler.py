@@ -0,0 +1,340 @@
+"""Keep the time-sorted uploads index in DynamoDB in step with the bucket.
+
+Invoked by EventBridge "Object Created"/"Object Deleted" events (or direct S3
+notifications) for the uploads and processed prefixes. New uploads that carry ``sha256`` metadata are also entered
+into the ``hashes/`` dedupe index once their content checks out. Invoke it
+manually with ``{"action": "backfill"}`` once after deploying to index objects
+that already exist.
+"""
+
+import base64
+import hashlib
+import json
+import logging
+import os
+import urllib.parse
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import boto3
+from botocore.exceptions import ClientError
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+s3 = boto3.client("s3")
+dynamodb = boto3.client("dynamodb")
+BUCKET = os.environ.get("UPLOAD_BUCKET")
+INDEX_TABLE = os.environ.get("INDEX_TABLE")
+UPLOAD_PREFIX = os.environ.get("UPLOAD_PREFIX", "uploads/")
+PROCESSED_PREFIX = os.environ.get("PROCESSED_PREFIX", "processed/")
+HASH_INDEX_PREFIX = os.environ.get("HASH_INDEX_PREFIX", "hashes/")
+HASH_CHUNK_BYTES = 8 * 1024 * 1024
+# Every indexed upload shares this GSI partition so one Query returns them in time order
+LISTING = "uploads"
+COUNT_KEY = "#count"
+PROCESSED_ATTRIBUTES = (
+    "processedKey",
+    "processedSize",
+    "processedLastModified",
+    "thumbnailKey",
+    "processedThumbnailKey",
+)
+
+
+def _sort_key(last_modified: str, key: str) -> str:
+    return f"{last_modified}#{key}"
+
+
+def _iso(value) -> str:
+    """Normalize S3 timestamps so sort keys from events and listings compare correctly."""
+    if isinstance(value, str) and value:
+        value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if not isinstance(value, datetime):
+        value = datetime.now(timezone.utc)
+    return value.astimezone(timezone.utc).isoformat(timespec="milliseconds")
+
+
+def _adjust_count(delta: int) -> None:
+    """Change the upload total and bump the version that listing ETags derive from."""
+    dynamodb.update_item(
+        TableName=INDEX_TABLE,
+        Key={"key": {"S": COUNT_KEY}},
+        UpdateExpression="ADD #total :delta, version :one",
+        ExpressionAttributeNames={"#total": "total"},
+        ExpressionAttributeValues={":delta": {"N": str(delta)}, ":one": {"N": "1"}},
+    )
+
+
+def _index_upload(key: str, size: int, etag: str, last_modified: str) -> None:
+    update = {
+        "TableName": INDEX_TABLE,
+        "Key": {"key": {"S": key}},
+        "UpdateExpression": "SET listing = :listing, sortKey = :sort, #size = :size, etag = :etag, lastModified = :lm",
+        "ExpressionAttributeNames": {"#size": "size"},
+        "ExpressionAttributeValues": {
+            ":listing": {"S": LISTING},
+            ":sort": {"S": _sort_key(last_modified, key)},
+            ":size": {"N": str(int(size or 0))},
+            ":etag": {"S": (etag or "").strip('"')},
+            ":lm": {"S": last_modified},
+        },
+    }
+    try:
+        dynamodb.update_item(ConditionExpression="attribute_not_exists(listing)", **update)
+    except ClientError as exc:
+        if exc.response.get("Error", {}).get("Code") != "ConditionalCheckFailedException":
+            raise
+        # Overwritten object: refresh the row without counting it twice
+        dynamodb.update_item(**update)
+        _adjust_count(0)
+        return
+    _join_processed(key)
+    _adjust_count(1)
+
+
+def _join_processed(key: str) -> None:
+    """Apply a render whose event arrived before the upload's own row existed."""
+    base_name = os.path.basename(key)
+    processed_key = f"{PROCESSED_PREFIX}{os.path.splitext(base_name)[0] or base_name}.bmp"
+    # Consistent read: _index_processed writes this row before it tries the upload row
+    alias = dynamodb.get_item(
+        TableName=INDEX_TABLE,
+        Key={"key": {"S": processed_key}},
+        ConsistentRead=True,
+    ).get("Item") or {}
+    if alias.get("source", {}).get("S") != key or "size" not in alias:
+        return
+    source = {"source": key}
+    for attr in ("size", "lastModified", "thumbnailKey", "processedThumbnailKey"):
+        source[attr] = next(iter(alias.get(attr, {"S": ""}).values()))
+    _set_processed(processed_key, source)
+
+
+def _stored_sha256(key: str, head: Dict) -> str:
+    """SHA-256 of the stored object, from S3's own checksum when it covers the whole object."""
+    checksum = head.get("ChecksumSHA256") or ""
+    if checksum and head.get("ChecksumType", "FULL_OBJECT") == "FULL_OBJECT" and "-" not in checksum:
+        return base64.b64decode(checksum).hex()
+    # Multipart uploads only carry a checksum of part checksums, so hash the body
+    digest = hashlib.sha256()
+    body = s3.get_object(Bucket=BUCKET, Key=key)["Body"]
+    for chunk in iter(lambda: body.read(HASH_CHUNK_BYTES), b""):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _holds_content(key: str, sha256: str) -> bool:
+    try:
+        head = s3.head_object(Bucket=BUCKET, Key=key)
+    except ClientError:
+        return False
+    return (head.get("Metadata") or {}).get("sha256") == sha256
+
+
+def _record_hash(key: str) -> None:
+    """Point hashes/<sha256> at a new upload once S3 holds content matching its claimed hash.
+
+    A resized upload is named by its original's ``sha256`` but stores different
+    bytes, recorded as ``upload-sha256``; those are what the body must match.
+    """
+    head = s3.head_object(Bucket=BUCKET, Key=key, ChecksumMode="ENABLED")
+    metadata = head.get("Metadata") or {}
+    claimed = metadata.get("sha256")
+    if not claimed:
+        return
+    if _stored_sha256(key, head) != (metadata.get("upload-sha256") or claimed):
+        logger.warning("Content of %s does not match its sha256 metadata; not indexing the hash", key)
+        return
+    marker = f"{HASH_INDEX_PREFIX}{claimed}"
+    try:
+        current = json.loads(s3.get_object(Bucket=BUCKET, Key=marker)["Body"].read()).get("key")
+    except (ClientError, ValueError):
+        current = None
+    if current and current != key and _holds_content(current, claimed):
+        # An earlier copy keeps the marker so deleting either upload stays consistent
+        return
+    s3.put_object(
+        Bucket=BUCKET,
+        Key=marker,
+        Body=json.dumps({"key": key}).encode("utf-8"),
+        ContentType="application/json",
+    )
+
+
+def _remove_upload(key: str) -> None:
+    old = dynamodb.delete_item(
+        TableName=INDEX_TABLE,
+        Key={"key": {"S": key}},
+        ReturnValues="ALL_OLD",
+    ).get("Attributes")
+    if old and "listing" in old:
+        _adjust_count(-1)
+
+
+def _processed_source(processed_key: str, fallback_source: Optional[str] = None) -> Optional[Dict[str, str]]:
+    """Read the join keys format_image stores on each processed frame."""
+    try:
+        head = s3.head_object(Bucket=BUCKET, Key=processed_key)
+    except ClientError:
+        return None
+    metadata = head.get("Metadata") or {}
+    source_key = urllib.parse.unquote(metadata.get("source-key") or "") or fallback_source
+    if not source_key:
+        return None
+    return {
+        "source": source_key,
+        "size": str(head.get("ContentLength", 0)),
+        "lastModified": _iso(head.get("LastModified")),
+        "thumbnailKey": urllib.parse.unquote(metadata.get("thumbnail-key") or ""),
+        "processedThumbnailKey": urllib.parse.unquote(metadata.get("processed-thumbnail-key") or ""),
+    }
+
+
+def _index_processed(processed_key: str, fallback_source: Optional[str] = None) -> None:
+    source = _processed_source(processed_key, fallback_source)
+    if not source:
+        logger.warning("Cannot find the upload rendered as %s", processed_key)
+        return
+    # The frame is gone by the time its removal arrives, so remember whose it was; the
+    # render fields let _join_processed catch up an upload whose event is still to come
+    alias = {"key": {"S": processed_key}, "source": {"S": source["source"]}, "size": {"N": source["size"]}}
+    for attr in ("lastModified", "thumbnailKey", "processedThumbnailKey"):
+        if source[attr]:
+            alias[attr] = {"S": source[attr]}
+    dynamodb.put_item(TableName=INDEX_TABLE, Item=alias)
+    if not _set_processed(processed_key, source):
+        logger.info("Source %s of %s is not indexed yet", source["source"], processed_key)
+        return
+    _adjust_count(0)
+
+
+def _set_processed(processed_key: str, source: Dict[str, str]) -> bool:
+    """Copy a render's attributes onto its upload row; False if that row does not exist."""
+    names = {"#size": "processedSize"}
+    values = {
+        ":key": {"S": processed_key},
+        ":size": {"N": source["size"]},
+        ":lm": {"S": source["lastModified"]},
+    }
+    assignments = ["processedKey = :key", "#size = :size", "processedLastModified = :lm"]
+    for attr in ("thumbnailKey", "processedThumbnailKey"):
+        if source[attr]:
+            assignments.append(f"{attr} = :{attr}")
+            values[f":{attr}"] = {"S": source[attr]}
+    try:
+        dynamodb.update_item(
+            TableName=INDEX_TABLE,
+            Key={"key": {"S": source["source"]}},
+            UpdateExpression="SET " + ", ".join(assignments),
+            ConditionExpression="attribute_exists(listing)",
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values,
+        )
+    except ClientError as exc:
+        if exc.response.get("Error", {}).get("Code") != "ConditionalCheckFailedException":
+            raise
+        return False
+    return True
+
+
+def _remove_processed(processed_key: str) -> None:
+    old = dynamodb.delete_item(
+        TableName=INDEX_TABLE,
+        Key={"key": {"S": processed_key}},
+        ReturnValues="ALL_OLD",
+    ).get("Attributes") or {}
+    source = old.get("source", {}).get("S")
+    if not source:
+        return
+    try:
+        dynamodb.update_item(
+            TableName=INDEX_TABLE,
+            Key={"key": {"S": source}},
+            UpdateExpression="REMOVE " + ", ".join(PROCESSED_ATTRIBUTES),
+            # A newer render may already have replaced this one
+            ConditionExpression="attribute_exists(listing) AND processedKey = :key",
+            ExpressionAttributeValues={":key": {"S": processed_key}},
+        )
+    except ClientError as exc:
+        if exc.response.get("Error", {}).get("Code") != "ConditionalCheckFailedException":
+            raise
+        return
+    _adjust_count(0)
+
+
+def _backfill() -> Dict[str, int]:
+    paginator = s3.get_paginator("list_objects_v2")
+    # Frames rendered before format_image recorded source-key are matched by file name
+    by_stem: Dict[str, str] = {}
+    uploads = 0
+    for page in paginator.paginate(Bucket=BUCKET, Prefix=UPLOAD_PREFIX):
+        for obj in page.get("Contents", []):
+            if obj["Key"].endswith("/"):
+                continue
+            _index_upload(obj["Key"], obj.get("Size", 0), obj.get("ETag", ""), _iso(obj.get("LastModified")))
+            base_name = os.path.basename(obj["Key"])
+            by_stem[os.path.splitext(base_name)[0] or base_name] = obj["Key"]
+            uploads += 1
+    processed = 0
+    for page in paginator.paginate(Bucket=BUCKET, Prefix=PROCESSED_PREFIX):
+        for obj in page.get("Contents", []):
+            if obj["Key"].endswith("/"):
+                continue
+            stem = os.path.splitext(os.path.basename(obj["Key"]))[0]
+            _index_processed(obj["Key"], by_stem.get(stem))
+            processed += 1
+    return {"uploads": uploads, "processed": processed}
+
+
+def _object_events(event) -> List[Dict]:
+    """Flatten an EventBridge event or an S3 notification batch into one shape."""
+    if event.get("source") == "aws.s3":
+        obj = (event.get("detail") or {}).get("object") or {}
+        return [{
+            "key": obj.get("key", ""),
+            "created": event.get("detail-type") == "Object Created",
+            "size": obj.get("size", 0),
+            "etag": obj.get("etag", ""),
+            "time": event.get("time"),
+        }]
+    return [
+        {
+            "key": record["s3"]["object"]["key"],
+            "created": record.get("eventName", "").startswith("ObjectCreated"),
+            "size": record["s3"]["object"].get("size", 0),
+            "etag": record["s3"]["object"].get("eTag", ""),
+            "time": record.get("eventTime"),
+        }
+        for record in event.get("Records", [])
+    ]
+
+
+def handler(event, _context):
+    if not BUCKET or not INDEX_TABLE:
+        logger.error("UPLOAD_BUCKET and INDEX_TABLE must be set")
+        return {"status": "error", "reason": "missing configuration"}
+
+    if event.get("action") == "backfill":
+        counts = _backfill()
+        logger.info("Backfilled index: %s", json.dumps(counts))
+        return {"status": "ok", **counts}
+
+    for record in _object_events(event):
+        try:
+            key = urllib.parse.unquote_plus(record["key"])
+            if key.startswith(UPLOAD_PREFIX):
+                if record["created"]:
+                    _index_upload(key, record["size"], record["etag"], _iso(record["time"]))
+                    _record_hash(key)
+                else:
+                    _remove_upload(key)
+            elif key.startswith(PROCESSED_PREFIX):
+                if record["created"]:
+                    _index_processed(key)
+                else:
+                    _remove_processed(key)
+        except Exception:  # pylint: disable=broad-except
+            logger.exception("Failed to index record: %s", json.dumps(record))
+
+    return {"status": "ok"}
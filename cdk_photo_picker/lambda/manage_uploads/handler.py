@@ -1,21 +1,59 @@
+import base64
+import hashlib
+import heapq
 import json
 import os
 import time
-import urllib.error
-import urllib.request
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
-from typing import Dict, List
+from typing import Dict, List, Optional
 
 import boto3
+from botocore.config import Config
 
-s3 = boto3.client("s3")
+import cloudfront_signer
+import google_id_token
+
+LIST_SHARDS = int(os.environ.get("LIST_SHARDS", "8"))
+# One pooled client is shared by every listing thread; size the pool for all of them
+s3 = boto3.client("s3", config=Config(max_pool_connections=max(10, 3 * LIST_SHARDS)))
+dynamodb = boto3.client("dynamodb")
+lambda_client = boto3.client("lambda")
 BUCKET = os.environ.get("UPLOAD_BUCKET")
 ALLOW_ORIGIN = os.environ.get("ALLOW_ORIGIN", "*")
 GOOGLE_CLIENT_ID = os.environ.get("GOOGLE_CLIENT_ID")
 UPLOAD_PREFIX = os.environ.get("UPLOAD_PREFIX", "uploads/")
 PROCESSED_PREFIX = os.environ.get("PROCESSED_PREFIX", "processed/")
+FRAMES_PREFIX = os.environ.get("FRAMES_PREFIX", "frames/")
+FRAME_REFS_PREFIX = os.environ.get("FRAME_REFS_PREFIX", "frame-refs/")
+HASH_INDEX_PREFIX = os.environ.get("HASH_INDEX_PREFIX", "hashes/")
+THUMBNAILS_PREFIX = os.environ.get("THUMBNAILS_PREFIX", "thumbnails/")
+THUMBNAIL_EXTENSIONS = (".webp", ".jpg")
+INDEX_TABLE = os.environ.get("INDEX_TABLE")
+INDEX_NAME = os.environ.get("INDEX_NAME", "ByUploadedAt")
+INDEX_LISTING = "uploads"
+INDEX_COUNT_KEY = "#count"
 MAX_ITEMS = int(os.environ.get("MAX_ITEMS", "200"))
+MAX_DELETE_KEYS = int(os.environ.get("MAX_DELETE_KEYS", "1000"))
+# DeleteObjects accepts at most 1000 keys per call
+DELETE_OBJECTS_BATCH = 1000
+HEAD_CONCURRENCY = 16
 DEFAULT_PAGE_SIZE = 10
+PRESIGN_TTL_SECONDS = 600
+# Media CDN: stable URLs on the site distribution, authorized by signed cookies from
+# /media-session. An empty MEDIA_BASE_URL means paths relative to the site origin.
+MEDIA_BASE_URL = (os.environ.get("MEDIA_BASE_URL") or "").rstrip("/")
+MEDIA_KEY_PAIR_ID = os.environ.get("MEDIA_KEY_PAIR_ID", "")
+MEDIA_PRIVATE_KEY_SECRET_ARN = os.environ.get("MEDIA_PRIVATE_KEY_SECRET_ARN", "")
+MEDIA_COOKIE_TTL_SECONDS = int(os.environ.get("MEDIA_COOKIE_TTL_SECONDS", "43200"))
+MEDIA_SESSION_PATH = "/media-session"
+MEDIA_CDN_ENABLED = bool(MEDIA_KEY_PAIR_ID and MEDIA_PRIVATE_KEY_SECRET_ARN)
+# GET /preview renders through the display pipeline's format_image function
+PREVIEW_FUNCTION_NAME = os.environ.get("PREVIEW_FUNCTION_NAME", "")
+PREVIEW_PATH = "/preview"
+PREVIEW_PARAMS = ("saturation", "contrast", "brightness", "sharpen", "dither")
+PREVIEW_CACHE_CONTROL = "private, max-age=3600"
 ALLOWED_EMAIL_DOMAINS = {
     d.strip().lower()
     for d in (os.environ.get("ALLOWED_EMAIL_DOMAINS") or "").split(",")
@@ -28,79 +66,203 @@ ALLOWED_EMAILS = {
 }
 
 
-def _response(status: int, body: Dict):
-    return {
-        "statusCode": status,
-        "headers": {
-            "content-type": "application/json",
-            "access-control-allow-origin": ALLOW_ORIGIN,
-            "access-control-allow-headers": "authorization,content-type",
-            "access-control-allow-methods": "OPTIONS,GET,DELETE",
-        },
-        "body": json.dumps(body),
+def _response(status: int, body: Optional[Dict]):
+    headers = {
+        "access-control-allow-origin": ALLOW_ORIGIN,
+        "access-control-allow-headers": "authorization,content-type,if-none-match",
+        "access-control-allow-methods": "OPTIONS,GET,POST,DELETE",
+        "access-control-expose-headers": "etag,x-preview-settings",
     }
+    if body is None:
+        return {"statusCode": status, "headers": headers, "body": ""}
+    headers["content-type"] = "application/json"
+    return {"statusCode": status, "headers": headers, "body": json.dumps(body)}
+
+
+def _listing_etag(*parts) -> str:
+    """Strong validator for a listing page.
+
+    Presigned URLs change on every request, so while they are in use the
+    validator also rolls over at half their lifetime; a revalidated page
+    never hands out URLs that are about to expire.
+    """
+    url_epoch = 0 if MEDIA_CDN_ENABLED else int(time.time()) // (PRESIGN_TTL_SECONDS // 2)
+    payload = json.dumps([url_epoch, *parts], sort_keys=True, default=str)
+    return '"' + hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32] + '"'
+
+
+def _if_none_match(event) -> set:
+    headers = {k.lower(): v for k, v in (event.get("headers") or {}).items()}
+    return {tag.strip() for tag in (headers.get("if-none-match") or "").split(",")}
+
+
+def _cached_response(event, etag: str, body: Optional[Dict] = None):
+    """200 with ``body`` or, when the client already holds ``etag``, an empty 304."""
+    candidates = _if_none_match(event)
+    if etag in candidates or "*" in candidates:
+        resp = _response(304, None)
+    elif body is None:
+        return None
+    else:
+        resp = _response(200, body)
+    resp["headers"]["etag"] = etag
+    # Cacheable, but always revalidated: the listing changes whenever uploads do
+    resp["headers"]["cache-control"] = "private, no-cache"
+    return resp
 
 
 def _verify_google_id_token(id_token: str):
-    if not id_token:
-        return False, {"error": "missing id token"}
-    url = f"https://oauth2.googleapis.com/tokeninfo?id_token={id_token}"
-    try:
-        with urllib.request.urlopen(url, timeout=5) as resp:
-            data = json.loads(resp.read().decode("utf-8"))
-    except urllib.error.HTTPError as exc:
-        return False, {"error": f"tokeninfo http {exc.code}"}
-    except Exception as exc:
-        return False, {"error": str(exc)}
+    return google_id_token.verify(id_token, GOOGLE_CLIENT_ID)
 
-    aud = data.get("aud")
-    iss = data.get("iss")
-    exp = int(data.get("exp", "0")) if data.get("exp") else 0
-    now = int(time.time())
-    if GOOGLE_CLIENT_ID and aud != GOOGLE_CLIENT_ID:
-        return False, {"error": "invalid audience"}
-    if iss not in ("accounts.google.com", "https://accounts.google.com"):
-        return False, {"error": "invalid issuer"}
-    if exp and now > exp:
-        return False, {"error": "token expired"}
-    return True, data
 
+# Prefixes with fewer keys than this are listed page by page
+SHARD_MIN_KEYS = int(os.environ.get("SHARD_MIN_KEYS", "2000"))
+# Evenly spaced keys from the previous listing of each prefix, kept while the container is warm
+_shard_bounds: Dict[str, List[str]] = {}
 
-def _list_objects(prefix: str) -> List[Dict]:
+
+def _keep(obj: Dict) -> bool:
+    key = obj.get("Key")
+    return bool(key) and not key.endswith("/")
+
+
+def _list_range(prefix: str, start_after: Optional[str], until: Optional[str]) -> List[Dict]:
+    """List keys in ``(start_after, until]``; ``None`` leaves that side open."""
     items: List[Dict] = []
+    params = {"Bucket": BUCKET, "Prefix": prefix}
+    if start_after:
+        params["StartAfter"] = start_after
     paginator = s3.get_paginator("list_objects_v2")
-    for page in paginator.paginate(Bucket=BUCKET, Prefix=prefix):
+    for page in paginator.paginate(**params):
         for obj in page.get("Contents", []):
-            key = obj.get("Key")
-            if not key or key.endswith("/"):
-                continue
-            items.append(obj)
+            if until is not None and obj["Key"] > until:
+                return items
+            if _keep(obj):
+                items.append(obj)
+    return items
+
+
+def _list_objects(prefix: str) -> List[Dict]:
+    bounds = _shard_bounds.get(prefix, [])
+    starts: List[Optional[str]] = [None, *bounds]
+    ends: List[Optional[str]] = [*bounds, None]
+    if len(starts) == 1:
+        items = _list_range(prefix, None, None)
+    else:
+        # Ranges still cover the whole prefix when the bounds are stale, only less evenly
+        items = []
+        with ThreadPoolExecutor(max_workers=len(starts)) as pool:
+            for shard in pool.map(_list_range, [prefix] * len(starts), starts, ends):
+                items.extend(shard)
+    if len(items) >= SHARD_MIN_KEYS and LIST_SHARDS > 1:
+        _shard_bounds[prefix] = [items[len(items) * i // LIST_SHARDS]["Key"] for i in range(1, LIST_SHARDS)]
+    else:
+        _shard_bounds.pop(prefix, None)
     return items
 
 
+def _list_prefixes(*prefixes: str) -> List[List[Dict]]:
+    with ThreadPoolExecutor(max_workers=len(prefixes)) as pool:
+        return list(pool.map(_list_objects, prefixes))
+
+
+_media_private_key = None
+
+
+def _media_signing_key():
+    global _media_private_key
+    if _media_private_key is None:
+        secret = boto3.client("secretsmanager").get_secret_value(SecretId=MEDIA_PRIVATE_KEY_SECRET_ARN)
+        _media_private_key = cloudfront_signer.load_private_key(secret["SecretString"])
+    return _media_private_key
+
+
+def _media_session():
+    expires_at = int(time.time()) + MEDIA_COOKIE_TTL_SECONDS
+    cookies = cloudfront_signer.set_cookie_headers(
+        MEDIA_BASE_URL or "https://*",
+        [UPLOAD_PREFIX, PROCESSED_PREFIX, THUMBNAILS_PREFIX],
+        MEDIA_KEY_PAIR_ID,
+        _media_signing_key(),
+        expires_at,
+        MEDIA_COOKIE_TTL_SECONDS,
+    )
+    resp = _response(200, {"expiresAt": expires_at})
+    resp["headers"]["cache-control"] = "no-store"
+    resp["multiValueHeaders"] = {"set-cookie": cookies}
+    return resp
+
+
+def _preview(event, params: Dict):
+    """Invoke format_image in preview mode and return its memoized PNG."""
+    key = params.get("key") or ""
+    if not key.startswith(UPLOAD_PREFIX):
+        return _response(400, {"error": "invalid key"})
+    overrides = {name: params[name] for name in PREVIEW_PARAMS if params.get(name)}
+    invoked = lambda_client.invoke(
+        FunctionName=PREVIEW_FUNCTION_NAME,
+        Payload=json.dumps({"action": "preview", "key": key, "overrides": overrides}).encode("utf-8"),
+    )
+    result = json.loads(invoked["Payload"].read() or b"{}")
+    if invoked.get("FunctionError"):
+        return _response(502, {"error": result.get("errorMessage") or "preview failed"})
+    if result.get("status") != "ok":
+        reason = result.get("reason") or "preview failed"
+        return _response(404 if reason == "not found" else 400, {"error": reason})
+
+    etag = f'"{result["etag"]}"'
+    if etag in _if_none_match(event):
+        resp = _response(304, None)
+    else:
+        resp = _response(200, None)
+        resp["headers"]["content-type"] = result["contentType"]
+        resp["body"] = result["body"]
+        resp["isBase64Encoded"] = True
+    resp["headers"]["etag"] = etag
+    # The URL carries the key and every setting, so revisiting a slider value hits the browser cache
+    resp["headers"]["cache-control"] = PREVIEW_CACHE_CONTROL
+    resp["headers"]["x-preview-settings"] = json.dumps(result.get("settings") or {}, separators=(",", ":"))
+    return resp
+
+
 def _generate_get_url(key: str) -> str:
+    if MEDIA_CDN_ENABLED:
+        # Same URL on every listing, so browsers and CloudFront can cache the media
+        return f"{MEDIA_BASE_URL}/{urllib.parse.quote(key)}"
     return s3.generate_presigned_url(
         "get_object",
         Params={"Bucket": BUCKET, "Key": key},
-        ExpiresIn=600,
+        ExpiresIn=PRESIGN_TTL_SECONDS,
     )
 
 
+def _thumbnail_key(thumbnail_names: set, stem: str):
+    for ext in THUMBNAIL_EXTENSIONS:
+        name = f"{stem}{ext}"
+        if name in thumbnail_names:
+            return f"{THUMBNAILS_PREFIX}{name}"
+    return None
+
+
 def _list_uploads(limit: int, offset: int = 0):
-    uploads = _list_objects(UPLOAD_PREFIX)
-    processed_items = _list_objects(PROCESSED_PREFIX)
+    uploads, processed_items, thumbnail_items = _list_prefixes(
+        UPLOAD_PREFIX, PROCESSED_PREFIX, THUMBNAILS_PREFIX
+    )
     processed_map = {
         os.path.basename(item["Key"]): item for item in processed_items
     }
+    thumbnail_names = {os.path.basename(item["Key"]) for item in thumbnail_items}
 
     entries = []
-    sorted_uploads = sorted(
+    now = datetime.now(timezone.utc)
+    # Only the requested page is ordered and presigned
+    newest = heapq.nlargest(
+        offset + limit,
         uploads,
-        key=lambda o: o.get("LastModified", datetime.now(timezone.utc)),
-        reverse=True,
+        key=lambda o: o.get("LastModified", now),
     )
 
-    sliced = sorted_uploads[offset: offset + limit]
+    sliced = newest[offset: offset + limit]
 
     for obj in sliced:
         key = obj["Key"]
@@ -116,6 +278,9 @@ def _list_uploads(limit: int, offset: int = 0):
             "downloadUrl": _generate_get_url(key),
             "etag": obj.get("ETag", "").strip('"'),
         }
+        thumbnail_key = _thumbnail_key(thumbnail_names, root or base_name)
+        if thumbnail_key:
+            entry["thumbnailUrl"] = _generate_get_url(thumbnail_key)
         if processed_obj:
             entry.update({
                 "processedKey": processed_key,
@@ -123,20 +288,147 @@ def _list_uploads(limit: int, offset: int = 0):
                 "processedLastModified": processed_obj.get("LastModified").isoformat() if processed_obj.get("LastModified") else None,
                 "processedUrl": _generate_get_url(processed_key),
             })
+            processed_thumbnail_key = _thumbnail_key(thumbnail_names, f"{root or base_name}.epaper")
+            if processed_thumbnail_key:
+                entry["processedThumbnailUrl"] = _generate_get_url(processed_thumbnail_key)
         entries.append(entry)
-    return entries, len(sorted_uploads)
+    return entries, len(uploads)
+
+
+def _encode_cursor(last_key: Dict) -> str:
+    raw = json.dumps(last_key, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> Dict:
+    try:
+        last_key = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except Exception as exc:
+        raise ValueError("invalid cursor") from exc
+    if not isinstance(last_key, dict) or set(last_key) != {"key", "listing", "sortKey"}:
+        raise ValueError("invalid cursor")
+    if not all(isinstance(value, dict) and isinstance(value.get("S"), str) for value in last_key.values()):
+        raise ValueError("invalid cursor")
+    return last_key
+
+
+def _index_entry(item: Dict) -> Dict:
+    def _s(name: str):
+        return item.get(name, {}).get("S")
+
+    def _n(name: str) -> int:
+        return int(item.get(name, {}).get("N", "0"))
+
+    key = _s("key")
+    entry = {
+        "key": key,
+        "size": _n("size"),
+        "lastModified": _s("lastModified"),
+        "downloadUrl": _generate_get_url(key),
+        "etag": _s("etag") or "",
+    }
+    if _s("thumbnailKey"):
+        entry["thumbnailUrl"] = _generate_get_url(_s("thumbnailKey"))
+    if _s("processedKey"):
+        entry.update({
+            "processedKey": _s("processedKey"),
+            "processedSize": _n("processedSize"),
+            "processedLastModified": _s("processedLastModified"),
+            "processedUrl": _generate_get_url(_s("processedKey")),
+        })
+        if _s("processedThumbnailKey"):
+            entry["processedThumbnailUrl"] = _generate_get_url(_s("processedThumbnailKey"))
+    return entry
+
+
+def _index_counter():
+    """Return (total, version); index_uploads bumps the version on every change."""
+    counter = dynamodb.get_item(
+        TableName=INDEX_TABLE,
+        Key={"key": {"S": INDEX_COUNT_KEY}},
+    ).get("Item") or {}
+    return int(counter.get("total", {}).get("N", "0")), int(counter.get("version", {}).get("N", "0"))
+
+
+def _list_uploads_from_index(limit: int, cursor: str = ""):
+    """Read one page from the time-sorted index; cost does not grow with the library."""
+    params = {
+        "TableName": INDEX_TABLE,
+        "IndexName": INDEX_NAME,
+        "KeyConditionExpression": "listing = :listing",
+        "ExpressionAttributeValues": {":listing": {"S": INDEX_LISTING}},
+        "ScanIndexForward": False,
+        "Limit": limit,
+    }
+    if cursor:
+        params["ExclusiveStartKey"] = _decode_cursor(cursor)
+    page = dynamodb.query(**params)
+    last_key = page.get("LastEvaluatedKey")
+    entries = [_index_entry(item) for item in page.get("Items", [])]
+    return entries, _encode_cursor(last_key) if last_key else None
+
+
+def _derived_keys(key: str) -> List[str]:
+    base_name = os.path.basename(key)
+    stem = os.path.splitext(base_name)[0] or base_name
+    keys = [f"{PROCESSED_PREFIX}{stem}.bmp"]
+    for suffix in ("", ".epaper"):
+        keys.extend(f"{THUMBNAILS_PREFIX}{stem}{suffix}{ext}" for ext in THUMBNAIL_EXTENSIONS)
+    return keys
+
+
+def _frame_key(processed_key: str) -> Optional[str]:
+    """Content-addressed frame format_image recorded on the render of an upload."""
+    try:
+        metadata = s3.head_object(Bucket=BUCKET, Key=processed_key).get("Metadata") or {}
+    except Exception:
+        return None
+    frame_key = metadata.get("frame-key") or ""
+    return frame_key if frame_key.startswith(FRAMES_PREFIX) else None
+
+
+def _frame_refs(frame_key: str) -> str:
+    digest = os.path.splitext(frame_key[len(FRAMES_PREFIX):])[0]
+    return f"{FRAME_REFS_PREFIX}{digest}/"
+
+
+def _frame_ref(frame_key: str, processed_key: str) -> str:
+    """Empty object format_image writes for each render pointing at a shared frame."""
+    return _frame_refs(frame_key) + urllib.parse.quote(processed_key, safe="")
+
+
+def _unreferenced(frame_key: str) -> bool:
+    """True once no render points at ``frame_key``; identical renders share one frame."""
+    try:
+        listed = s3.list_objects_v2(Bucket=BUCKET, Prefix=_frame_refs(frame_key), MaxKeys=1)
+    except Exception:
+        return False
+    return not listed.get("KeyCount")
 
 
 def _delete_upload(key: str):
     removed = []
+    marker = _hash_marker(key)
     s3.delete_object(Bucket=BUCKET, Key=key)
+    if marker:
+        # Drop the dedupe index entry so the same photo can be uploaded again
+        try:
+            s3.delete_object(Bucket=BUCKET, Key=marker)
+        except Exception:
+            pass
     removed.append(key)
-    base_name = os.path.basename(key)
-    root, _ext = os.path.splitext(base_name)
-    processed_key = f"{PROCESSED_PREFIX}{(root or base_name)}.bmp"
+    processed_key, *thumbnail_keys = _derived_keys(key)
+    frame_key = _frame_key(processed_key)
     try:
         s3.delete_object(Bucket=BUCKET, Key=processed_key)
         removed.append(processed_key)
+        if frame_key:
+            s3.delete_object(Bucket=BUCKET, Key=_frame_ref(frame_key, processed_key))
+            if _unreferenced(frame_key):
+                s3.delete_object(Bucket=BUCKET, Key=frame_key)
+                removed.append(frame_key)
+        for thumbnail_key in thumbnail_keys:
+            s3.delete_object(Bucket=BUCKET, Key=thumbnail_key)
     except s3.exceptions.NoSuchKey:
         pass
     except Exception as exc:
@@ -144,6 +436,87 @@ def _delete_upload(key: str):
     return removed, None
 
 
+def _hash_marker(key: str) -> Optional[str]:
+    """Dedupe index entry for ``key``, only while it still points at ``key``.
+
+    Another upload with the same content may have claimed the marker since, and
+    deleting it then would let the next copy of that photo past the duplicate check.
+    """
+    try:
+        sha256 = (s3.head_object(Bucket=BUCKET, Key=key).get("Metadata") or {}).get("sha256")
+        if not sha256:
+            return None
+        marker = f"{HASH_INDEX_PREFIX}{sha256}"
+        claimed = json.loads(s3.get_object(Bucket=BUCKET, Key=marker)["Body"].read()).get("key")
+    except Exception:
+        return None
+    return marker if claimed == key else None
+
+
+def _delete_objects(keys: List[str]) -> Dict[str, str]:
+    """Delete ``keys`` in DeleteObjects batches and return ``{key: error}`` for failures."""
+    errors: Dict[str, str] = {}
+    for start in range(0, len(keys), DELETE_OBJECTS_BATCH):
+        batch = keys[start: start + DELETE_OBJECTS_BATCH]
+        try:
+            result = s3.delete_objects(
+                Bucket=BUCKET,
+                Delete={"Objects": [{"Key": k} for k in batch], "Quiet": True},
+            )
+        except Exception as exc:
+            errors.update({k: str(exc) for k in batch})
+            continue
+        for err in result.get("Errors", []):
+            errors[err.get("Key")] = err.get("Message") or err.get("Code") or "delete failed"
+    return errors
+
+
+def _delete_uploads(keys: List[str]) -> List[Dict]:
+    valid = [k for k in keys if k.startswith(UPLOAD_PREFIX)]
+    # Hash markers and frames are named in object metadata, so they need a HEAD each
+    with ThreadPoolExecutor(max_workers=HEAD_CONCURRENCY) as pool:
+        markers = list(pool.map(_hash_marker, valid))
+        frames = list(pool.map(_frame_key, [_derived_keys(key)[0] for key in valid]))
+
+    targets: List[str] = []
+    derived: Dict[str, List[str]] = {}
+    for key, marker, frame in zip(valid, markers, frames):
+        processed_key = _derived_keys(key)[0]
+        ref = _frame_ref(frame, processed_key) if frame else None
+        derived[key] = _derived_keys(key) + [extra for extra in (marker, ref) if extra]
+        targets.append(key)
+        targets.extend(derived[key])
+    errors = _delete_objects(targets)
+
+    # Frames go in a second batch, only once the last render pointing at them is gone
+    released = sorted({
+        frame for key, frame in zip(valid, frames)
+        if frame and _frame_ref(frame, _derived_keys(key)[0]) not in errors
+    })
+    if released:
+        with ThreadPoolExecutor(max_workers=HEAD_CONCURRENCY) as pool:
+            unreferenced = [frame for frame, free in zip(released, pool.map(_unreferenced, released)) if free]
+        if unreferenced:
+            errors.update(_delete_objects(unreferenced))
+        for key, frame in zip(valid, frames):
+            if frame in unreferenced:
+                derived[key].append(frame)
+
+    results = []
+    for key in keys:
+        if key not in derived:
+            results.append({"key": key, "deleted": False, "error": "invalid key"})
+            continue
+        result = {"key": key, "deleted": key not in errors}
+        if key in errors:
+            result["error"] = errors[key]
+        failed = [k for k in derived[key] if k in errors]
+        if failed:
+            result["warning"] = f"failed to delete {', '.join(failed)}"
+        results.append(result)
+    return results
+
+
 def handler(event, _context):
     if event.get("httpMethod") == "OPTIONS":
         return _response(200, {"ok": True})
@@ -173,6 +546,16 @@ def handler(event, _context):
 
     method = event.get("httpMethod")
     try:
+        if method == "POST" and (event.get("path") or "").endswith(MEDIA_SESSION_PATH):
+            if not MEDIA_CDN_ENABLED:
+                return _response(404, {"error": "media CDN is not configured"})
+            return _media_session()
+
+        if method == "GET" and (event.get("path") or "").endswith(PREVIEW_PATH):
+            if not PREVIEW_FUNCTION_NAME:
+                return _response(404, {"error": "preview is not configured"})
+            return _preview(event, event.get("queryStringParameters") or {})
+
         if method == "GET":
             params = event.get("queryStringParameters") or {}
             try:
@@ -186,18 +569,51 @@ def handler(event, _context):
             limit = max(1, min(limit, MAX_ITEMS))
             offset = max(0, offset)
 
+            if INDEX_TABLE:
+                cursor = params.get("cursor") or ""
+                # Only the counter item is read when the client's copy is still current
+                total_count, version = _index_counter()
+                etag = _listing_etag("index", version, limit, offset, cursor)
+                not_modified = _cached_response(event, etag)
+                if not_modified:
+                    return not_modified
+                try:
+                    items, next_cursor = _list_uploads_from_index(limit, cursor)
+                except ValueError as exc:
+                    return _response(400, {"error": str(exc)})
+                has_more = next_cursor is not None
+                next_offset = offset + len(items)
+                return _cached_response(
+                    event,
+                    etag,
+                    {
+                        "items": items,
+                        "count": len(items),
+                        "total": total_count,
+                        "nextCursor": next_cursor,
+                        "nextOffset": next_offset if has_more else None,
+                        "hasMore": has_more,
+                        "mediaSessionUrl": f"{MEDIA_BASE_URL}{MEDIA_SESSION_PATH}" if MEDIA_CDN_ENABLED else None,
+                    },
+                )
+
             items, total_count = _list_uploads(limit, offset)
             next_offset = offset + len(items)
             has_more = next_offset < total_count
+            # Without an index the page is listed anyway; the validator still saves the transfer
+            listed = [{k: v for k, v in item.items() if not k.endswith("Url")} for item in items]
+            etag = _listing_etag("scan", listed, total_count, limit, offset)
 
-            return _response(
-                200,
+            return _cached_response(
+                event,
+                etag,
                 {
                     "items": items,
                     "count": len(items),
                     "total": total_count,
                     "nextOffset": next_offset if has_more else None,
                     "hasMore": has_more,
+                    "mediaSessionUrl": f"{MEDIA_BASE_URL}{MEDIA_SESSION_PATH}" if MEDIA_CDN_ENABLED else None,
                 },
             )
 
@@ -207,6 +623,22 @@ def handler(event, _context):
                 body = json.loads(body or "{}")
             elif body is None:
                 body = {}
+            if "keys" in body:
+                keys = body.get("keys")
+                if not isinstance(keys, list) or not keys or not all(isinstance(k, str) and k for k in keys):
+                    return _response(400, {"error": "keys must be a non-empty list of strings"})
+                keys = list(dict.fromkeys(keys))
+                if len(keys) > MAX_DELETE_KEYS:
+                    return _response(400, {"error": f"at most {MAX_DELETE_KEYS} keys per request"})
+                results = _delete_uploads(keys)
+                return _response(
+                    200,
+                    {
+                        "results": results,
+                        "deleted": sum(1 for r in results if r["deleted"]),
+                        "failed": sum(1 for r in results if not r["deleted"]),
+                    },
+                )
             key = body.get("key")
             if not key:
                 return _response(400, {"error": "key required"})
@@ -1,12 +1,20 @@
+import base64
 import json
 import os
-import time
-import urllib.request
-import urllib.error
+import re
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
 import boto3
+from botocore.config import Config
+from botocore.exceptions import ClientError
+
+import google_id_token
 
 
-s3 = boto3.client("s3")
+# Batch lookups share one pooled client across LOOKUP_CONCURRENCY threads
+LOOKUP_CONCURRENCY = 16
+s3 = boto3.client("s3", config=Config(max_pool_connections=LOOKUP_CONCURRENCY))
 BUCKET = os.environ.get("UPLOAD_BUCKET")
 ALLOW_ORIGIN = os.environ.get("ALLOW_ORIGIN", "*")
 GOOGLE_CLIENT_ID = os.environ.get("GOOGLE_CLIENT_ID")
@@ -20,6 +28,11 @@ ALLOWED_EMAILS = {
     for e in (os.environ.get("ALLOWED_EMAILS") or "").split(",")
     if e.strip()
 }
+MAX_BATCH_ITEMS = int(os.environ.get("MAX_BATCH_ITEMS", "100"))
+URL_EXPIRES_IN = 900
+MAX_MULTIPART_PARTS = 10000
+HASH_INDEX_PREFIX = os.environ.get("HASH_INDEX_PREFIX", "hashes/")
+_SHA256_HEX = re.compile(r"^[0-9a-f]{64}$")
 
 
 def _response(status: int, body: dict):
@@ -36,28 +49,176 @@ def _response(status: int, body: dict):
 
 
 def _verify_google_id_token(id_token: str):
-    if not id_token:
-        return False, {"error": "missing id token"}
-    url = f"https://oauth2.googleapis.com/tokeninfo?id_token={id_token}"
+    return google_id_token.verify(id_token, GOOGLE_CLIENT_ID)
+
+
+def _checksum_sha256(sha256: str) -> str:
+    """S3 takes the SHA-256 checksum as base64 of the digest, not hex."""
+    return base64.b64encode(bytes.fromhex(sha256)).decode("ascii")
+
+
+def _hash_metadata(sha256: str, upload_sha256: str = "") -> dict:
+    """``sha256`` names the original content for dedupe; ``upload-sha256`` is the resized body, when it differs."""
+    if not sha256:
+        return {}
+    if upload_sha256 and upload_sha256 != sha256:
+        return {"sha256": sha256, "upload-sha256": upload_sha256}
+    return {"sha256": sha256}
+
+
+def _presign_put(key: str, content_type: str = "", sha256: str = "", upload_sha256: str = "") -> str:
+    params = {"Bucket": BUCKET, "Key": key, "ContentType": content_type or "application/octet-stream"}
+    if sha256:
+        params["Metadata"] = _hash_metadata(sha256, upload_sha256)
+        # S3 rejects the PUT unless the body hashes to the bytes the client said it would send
+        params["ChecksumSHA256"] = _checksum_sha256(upload_sha256 or sha256)
+    return s3.generate_presigned_url(
+        ClientMethod="put_object",
+        Params=params,
+        ExpiresIn=URL_EXPIRES_IN,
+    )
+
+
+def _checked_sha256(value) -> str:
+    if value in (None, ""):
+        return ""
+    value = str(value).lower()
+    if not _SHA256_HEX.match(value):
+        raise ValueError("sha256 must be 64 hex characters")
+    return value
+
+
+def _existing_upload_for(sha256: str):
+    """Return the key already holding content with this hash, if it still exists."""
     try:
-        with urllib.request.urlopen(url, timeout=5) as resp:
-            data = json.loads(resp.read().decode("utf-8"))
-    except urllib.error.HTTPError as e:
-        return False, {"error": f"tokeninfo http {e.code}"}
-    except Exception as e:
-        return False, {"error": str(e)}
+        marker = s3.get_object(Bucket=BUCKET, Key=f"{HASH_INDEX_PREFIX}{sha256}")
+        key = json.loads(marker["Body"].read()).get("key")
+        if not key:
+            return None
+        head = s3.head_object(Bucket=BUCKET, Key=key)
+    except (ClientError, ValueError):
+        return None
+    if (head.get("Metadata") or {}).get("sha256") != sha256:
+        return None
+    return key
+
+
+def _presign_item(key: str, content_type: str = "", sha256: str = "", upload_sha256: str = "") -> dict:
+    if sha256:
+        # index_uploads points hashes/<sha256> at the key once S3 has the verified object
+        existing = _existing_upload_for(sha256)
+        if existing:
+            return {"key": key, "duplicate": True, "existingKey": existing}
+        headers = {f"x-amz-meta-{name}": value for name, value in _hash_metadata(sha256, upload_sha256).items()}
+        headers["x-amz-checksum-sha256"] = _checksum_sha256(upload_sha256 or sha256)
+        return {
+            "key": key,
+            "url": _presign_put(key, content_type, sha256, upload_sha256),
+            "headers": headers,
+        }
+    return {"key": key, "url": _presign_put(key, content_type)}
+
+
+def _checked_hashes(body: dict) -> tuple:
+    """``(sha256, uploadSha256)``; the upload hash only means something next to the content hash."""
+    sha256 = _checked_sha256(body.get("sha256"))
+    upload_sha256 = _checked_sha256(body.get("uploadSha256"))
+    if upload_sha256 and not sha256:
+        raise ValueError("uploadSha256 requires sha256")
+    return sha256, upload_sha256
+
+
+def _presign_items(items: list, hashes: list) -> list:
+    """Presign a batch; each hashed item costs up to two S3 round trips, so run them together."""
+    with ThreadPoolExecutor(max_workers=LOOKUP_CONCURRENCY) as pool:
+        return list(pool.map(
+            lambda pair: _presign_item(pair[0]["key"], pair[0].get("contentType"), *pair[1]),
+            zip(items, hashes),
+        ))
 
-    aud = data.get("aud")
-    iss = data.get("iss")
-    exp = int(data.get("exp", "0")) if data.get("exp") else 0
-    now = int(time.time())
-    if GOOGLE_CLIENT_ID and aud != GOOGLE_CLIENT_ID:
-        return False, {"error": "invalid audience"}
-    if iss not in ("accounts.google.com", "https://accounts.google.com"):
-        return False, {"error": "invalid issuer"}
-    if exp and now > exp:
-        return False, {"error": "token expired"}
-    return True, data
+
+def _part_numbers(values) -> list:
+    if not isinstance(values, list) or not values:
+        raise ValueError("partNumbers must be a non-empty list")
+    if len(values) > MAX_BATCH_ITEMS:
+        raise ValueError(f"at most {MAX_BATCH_ITEMS} partNumbers per request")
+    numbers = [int(v) for v in values]
+    if any(n < 1 or n > MAX_MULTIPART_PARTS for n in numbers):
+        raise ValueError(f"partNumbers must be between 1 and {MAX_MULTIPART_PARTS}")
+    return numbers
+
+
+def _presign_parts(key: str, upload_id: str, part_numbers: list) -> list:
+    return [
+        {
+            "partNumber": number,
+            "url": s3.generate_presigned_url(
+                ClientMethod="upload_part",
+                Params={"Bucket": BUCKET, "Key": key, "UploadId": upload_id, "PartNumber": number},
+                ExpiresIn=URL_EXPIRES_IN,
+            ),
+        }
+        for number in part_numbers
+    ]
+
+
+def _multipart_action(action: str, body: dict):
+    key = body.get("key")
+    if not key:
+        return _response(400, {"error": "key required"})
+
+    if action == "createMultipart":
+        try:
+            sha256, upload_sha256 = _checked_hashes(body)
+        except ValueError as e:
+            return _response(400, {"error": str(e)})
+        params = {"Bucket": BUCKET, "Key": key, "ContentType": body.get("contentType") or "application/octet-stream"}
+        if sha256:
+            existing = _existing_upload_for(sha256)
+            if existing:
+                return _response(200, {"key": key, "duplicate": True, "existingKey": existing})
+            params["Metadata"] = _hash_metadata(sha256, upload_sha256)
+        # No ChecksumAlgorithm: S3 only keeps FULL_OBJECT multipart checksums for the CRC
+        # algorithms, and a COMPOSITE SHA-256 (a hash of part hashes) would need every part
+        # hashed before presigning without ever matching sha256. index_uploads hashes the
+        # completed body instead and writes no hashes/ marker unless it matches.
+        created = s3.create_multipart_upload(**params)
+        return _response(200, {"key": key, "uploadId": created["UploadId"]})
+
+    upload_id = body.get("uploadId")
+    if not upload_id:
+        return _response(400, {"error": "uploadId required"})
+
+    try:
+        if action == "presignParts":
+            parts = _presign_parts(key, upload_id, _part_numbers(body.get("partNumbers")))
+            return _response(200, {"parts": parts, "expiresIn": URL_EXPIRES_IN})
+
+        if action == "completeMultipart":
+            parts = body.get("parts")
+            if not isinstance(parts, list) or not parts or len(parts) > MAX_MULTIPART_PARTS:
+                return _response(400, {"error": "parts must be a non-empty list"})
+            completed_parts = sorted(
+                ({"PartNumber": int(p["partNumber"]), "ETag": str(p["etag"])} for p in parts),
+                key=lambda part: part["PartNumber"],
+            )
+            completed = s3.complete_multipart_upload(
+                Bucket=BUCKET,
+                Key=key,
+                UploadId=upload_id,
+                MultipartUpload={"Parts": completed_parts},
+            )
+            return _response(200, {"key": key, "etag": completed.get("ETag")})
+    except KeyError as e:
+        return _response(400, {"error": f"missing field {e}"})
+    except (TypeError, ValueError) as e:
+        return _response(400, {"error": str(e)})
+
+    if action == "abortMultipart":
+        s3.abort_multipart_upload(Bucket=BUCKET, Key=key, UploadId=upload_id)
+        return _response(200, {"key": key, "aborted": True})
+
+    return _response(400, {"error": f"unknown action {action}"})
 
 
 def handler(event, context):
@@ -93,19 +254,42 @@ def handler(event, context):
             body = json.loads(body or "{}")
         elif body is None:
             body = {}
-        key = body.get("key")
-        content_type = body.get("contentType", "application/octet-stream")
-        if not key:
-            return _response(400, {"error": "key required"})
         if not BUCKET:
             return _response(500, {"error": "UPLOAD_BUCKET not set"})
 
-        url = s3.generate_presigned_url(
-            ClientMethod="put_object",
-            Params={"Bucket": BUCKET, "Key": key, "ContentType": content_type},
-            ExpiresIn=900,
-        )
+        action = body.get("action")
+        if action:
+            return _multipart_action(action, body)
+
+        items = body.get("items")
+        if items is not None:
+            if not isinstance(items, list) or not items:
+                return _response(400, {"error": "items must be a non-empty list"})
+            if len(items) > MAX_BATCH_ITEMS:
+                return _response(400, {"error": "too many items", "maxItems": MAX_BATCH_ITEMS})
+            if any(not isinstance(item, dict) or not item.get("key") for item in items):
+                return _response(400, {"error": "key required for every item"})
+            # Two items with one key would overwrite each other's upload
+            duplicates = sorted(k for k, n in Counter(item["key"] for item in items).items() if n > 1)
+            if duplicates:
+                return _response(400, {"error": "duplicate keys in batch", "keys": duplicates})
+            try:
+                hashes = [_checked_hashes(item) for item in items]
+            except ValueError as e:
+                return _response(400, {"error": str(e)})
+            return _response(
+                200,
+                {"items": _presign_items(items, hashes), "expiresIn": URL_EXPIRES_IN},
+            )
+
+        key = body.get("key")
+        if not key:
+            return _response(400, {"error": "key required"})
+        try:
+            sha256, upload_sha256 = _checked_hashes(body)
+        except ValueError as e:
+            return _response(400, {"error": str(e)})
 
-        return _response(200, {"url": url})
+        return _response(200, _presign_item(key, body.get("contentType"), sha256, upload_sha256))
     except Exception as e:
         return _response(500, {"error": str(e)})
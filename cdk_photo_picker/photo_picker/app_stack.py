@@ -1,5 +1,6 @@
 from pathlib import Path
 from typing import Optional
+import shutil
 import typing
 import aws_cdk as cdk
 from constructs import Construct
@@ -14,14 +15,24 @@ from aws_cdk import (
     aws_certificatemanager as acm,
     aws_lambda as _lambda,
     aws_apigateway as apigw,
+    aws_dynamodb as dynamodb,
     aws_iam as iam,
     aws_s3_deployment as s3deploy,
+    aws_secretsmanager as secretsmanager,
+    aws_events as events,
+    aws_events_targets as events_targets,
 )
 
+from . import site_build
+
 
 PACKAGE_ROOT = Path(__file__).resolve().parents[1]
 LAMBDA_DIR = PACKAGE_ROOT / "lambda"
 SITE_DIR = PACKAGE_ROOT / "site"
+SITE_EXCLUDE = ["cdk/*", "cdk/**", "tools/*", "tools/**", "*.example.js"]
+SITE_ASSET_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# index.html and config.js keep their names, so browsers must pick up new builds quickly
+SITE_PAGE_CACHE_CONTROL = "public, max-age=60, must-revalidate"
 
 
 class PhotoPickerAppStack(cdk.Stack):
@@ -78,6 +89,9 @@ class PhotoPickerAppStack(cdk.Stack):
                 encryption=s3.BucketEncryption.S3_MANAGED,
                 removal_policy=RemovalPolicy.RETAIN,
                 auto_delete_objects=False,
+                # index_uploads subscribes through EventBridge, which leaves the bucket's
+                # direct notifications free for the display pipeline when it is shared
+                event_bridge_enabled=True,
                 cors=[
                     s3.CorsRule(
                         allowed_methods=[s3.HttpMethods.PUT, s3.HttpMethods.POST],
@@ -89,6 +103,13 @@ class PhotoPickerAppStack(cdk.Stack):
                         max_age=3000,
                     )
                 ],
+                lifecycle_rules=[
+                    # Parts of multipart uploads the browser never completed or aborted
+                    s3.LifecycleRule(
+                        id="AbortIncompleteMultipartUploads",
+                        abort_incomplete_multipart_upload_after=Duration.days(1),
+                    )
+                ],
             )
 
         cf_cert = None
@@ -97,13 +118,55 @@ class PhotoPickerAppStack(cdk.Stack):
                 self, "ImportedCert", certificate_arn
             )
 
+        # Built inside the cloud assembly so every synth reuses (and cleans) one directory
+        site_build_dir = Path(cdk.Stage.of(self).outdir) / f"site-build.{self.node.addr}"
+        shutil.rmtree(site_build_dir, ignore_errors=True)
+        site_build.build_site(SITE_DIR, site_build_dir, exclude=SITE_EXCLUDE)
+        site_origin = origins.S3BucketOrigin(site_bucket)
+        assets_encoding_fn = cloudfront.Function(
+            self,
+            "SiteAssetsEncodingFunction",
+            code=cloudfront.FunctionCode.from_inline(site_build.encoding_function_code()),
+            runtime=cloudfront.FunctionRuntime.JS_2_0,
+            comment="Serve precompressed site assets for the viewer's Accept-Encoding",
+        )
+
+        assets_headers = cloudfront.ResponseHeadersPolicy(
+            self,
+            "SiteAssetsHeaders",
+            custom_headers_behavior=cloudfront.ResponseCustomHeadersBehavior(
+                custom_headers=[
+                    # One URL serves brotli, gzip or identity bodies; keep shared caches from mixing them
+                    cloudfront.ResponseCustomHeader(
+                        header="vary",
+                        value="Accept-Encoding",
+                        override=True,
+                    )
+                ]
+            ),
+        )
+
         distribution = cloudfront.Distribution(
             self,
             "Distribution",
             default_behavior=cloudfront.BehaviorOptions(
-                origin=origins.S3BucketOrigin(site_bucket),
+                origin=site_origin,
                 viewer_protocol_policy=cloudfront.ViewerProtocolPolicy.REDIRECT_TO_HTTPS,
             ),
+            additional_behaviors={
+                f"/{site_build.ASSETS_DIR}/*": cloudfront.BehaviorOptions(
+                    origin=site_origin,
+                    viewer_protocol_policy=cloudfront.ViewerProtocolPolicy.REDIRECT_TO_HTTPS,
+                    cache_policy=cloudfront.CachePolicy.CACHING_OPTIMIZED,
+                    response_headers_policy=assets_headers,
+                    function_associations=[
+                        cloudfront.FunctionAssociation(
+                            function=assets_encoding_fn,
+                            event_type=cloudfront.FunctionEventType.VIEWER_REQUEST,
+                        )
+                    ],
+                ),
+            },
             default_root_object="index.html",
             certificate=cf_cert,
             domain_names=[domain_name] if domain_name and cf_cert else None,
@@ -212,6 +275,18 @@ class PhotoPickerAppStack(cdk.Stack):
         cors_origin = f"https://{domain_name}" if domain_name else "*"
         uploads_prefix = self.node.try_get_context("uploadsPrefix") or "uploads/"
         processed_prefix = self.node.try_get_context("processedPrefix") or "processed/"
+        frames_prefix = self.node.try_get_context("framesPrefix") or "frames/"
+        frame_refs_prefix = self.node.try_get_context("frameRefsPrefix") or "frame-refs/"
+        thumbnails_prefix = self.node.try_get_context("thumbnailsPrefix") or "thumbnails/"
+
+        # Shared Google ID token verifier and CloudFront signer (lambda/common/python)
+        auth_layer = _lambda.LayerVersion(
+            self,
+            "GoogleIdTokenLayer",
+            code=_lambda.Code.from_asset(str(LAMBDA_DIR / "common")),
+            compatible_runtimes=[_lambda.Runtime.PYTHON_3_11],
+            description="Local Google ID token verification with cached signing keys",
+        )
 
         presign_fn = _lambda.Function(
             self,
@@ -219,6 +294,7 @@ class PhotoPickerAppStack(cdk.Stack):
             runtime=_lambda.Runtime.PYTHON_3_11,
             handler="handler.handler",
             code=_lambda.Code.from_asset(str(LAMBDA_DIR / "presign")),
+            layers=[auth_layer],
             timeout=Duration.seconds(10),
             environment={
                 "UPLOAD_BUCKET": uploads_bucket.bucket_name,
@@ -226,9 +302,60 @@ class PhotoPickerAppStack(cdk.Stack):
                 "GOOGLE_CLIENT_ID": self.node.try_get_context("googleClientId") or "",
                 "ALLOWED_EMAIL_DOMAINS": self.node.try_get_context("allowedEmailDomains") or "",
                 "ALLOWED_EMAILS": self.node.try_get_context("allowedEmails") or "",
+                "MAX_BATCH_ITEMS": str(self.node.try_get_context("presignMaxItems") or 100),
             },
         )
         uploads_bucket.grant_put(presign_fn)
+        # Duplicate lookups read the hash index and the metadata of existing uploads
+        uploads_bucket.grant_read(presign_fn)
+
+        # Time-sorted uploads index so listing pages never scan the bucket
+        index_table = dynamodb.Table(
+            self,
+            "UploadsIndexTable",
+            partition_key=dynamodb.Attribute(name="key", type=dynamodb.AttributeType.STRING),
+            billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+            removal_policy=RemovalPolicy.DESTROY,
+        )
+        index_table.add_global_secondary_index(
+            index_name="ByUploadedAt",
+            partition_key=dynamodb.Attribute(name="listing", type=dynamodb.AttributeType.STRING),
+            sort_key=dynamodb.Attribute(name="sortKey", type=dynamodb.AttributeType.STRING),
+        )
+
+        index_fn = _lambda.Function(
+            self,
+            "IndexUploadsFunction",
+            runtime=_lambda.Runtime.PYTHON_3_11,
+            handler="handler.handler",
+            code=_lambda.Code.from_asset(str(LAMBDA_DIR / "index_uploads")),
+            timeout=Duration.minutes(5),
+            environment={
+                "UPLOAD_BUCKET": uploads_bucket.bucket_name,
+                "INDEX_TABLE": index_table.table_name,
+                "UPLOAD_PREFIX": uploads_prefix,
+                "PROCESSED_PREFIX": processed_prefix,
+            },
+        )
+        uploads_bucket.grant_read(index_fn)
+        # Verified uploads are entered into the dedupe hash index here, not at presign time
+        uploads_bucket.grant_put(index_fn, "hashes/*")
+        index_table.grant_read_write_data(index_fn)
+        # An imported bucket must already send events to EventBridge (the display
+        # pipeline stack enables it on the bucket it creates)
+        events.Rule(
+            self,
+            "UploadsIndexRule",
+            event_pattern=events.EventPattern(
+                source=["aws.s3"],
+                detail_type=["Object Created", "Object Deleted"],
+                detail={
+                    "bucket": {"name": [uploads_bucket.bucket_name]},
+                    "object": {"key": [{"prefix": uploads_prefix}, {"prefix": processed_prefix}]},
+                },
+            ),
+            targets=[events_targets.LambdaFunction(index_fn)],
+        )
 
         manage_fn = _lambda.Function(
             self,
@@ -236,6 +363,7 @@ class PhotoPickerAppStack(cdk.Stack):
             runtime=_lambda.Runtime.PYTHON_3_11,
             handler="handler.handler",
             code=_lambda.Code.from_asset(str(LAMBDA_DIR / "manage_uploads")),
+            layers=[auth_layer],
             timeout=Duration.seconds(20),
             environment={
                 "UPLOAD_BUCKET": uploads_bucket.bucket_name,
@@ -245,9 +373,17 @@ class PhotoPickerAppStack(cdk.Stack):
                 "ALLOWED_EMAILS": self.node.try_get_context("allowedEmails") or "",
                 "UPLOAD_PREFIX": uploads_prefix,
                 "PROCESSED_PREFIX": processed_prefix,
+                "FRAMES_PREFIX": frames_prefix,
+                "FRAME_REFS_PREFIX": frame_refs_prefix,
+                "THUMBNAILS_PREFIX": thumbnails_prefix,
             },
         )
         uploads_bucket.grant_read_write(manage_fn)
+        # The index stays fed (dedupe markers depend on it); this only picks the listing source
+        if not _context_flag("listUploadsFromBucket"):
+            manage_fn.add_environment("INDEX_TABLE", index_table.table_name)
+            manage_fn.add_environment("INDEX_NAME", "ByUploadedAt")
+            index_table.grant_read_data(manage_fn)
 
         allow_origins = ([cors_origin] if cors_origin != "*" else apigw.Cors.ALL_ORIGINS)
         api = apigw.RestApi(
@@ -257,8 +393,12 @@ class PhotoPickerAppStack(cdk.Stack):
             default_cors_preflight_options=apigw.CorsOptions(
                 allow_origins=allow_origins,
                 allow_methods=["OPTIONS", "POST", "GET", "DELETE"],
-                allow_headers=["content-type", "authorization", "x-device-token"],
+                allow_headers=["content-type", "authorization", "x-device-token", "if-none-match"],
             ),
+            # Gzip/deflate JSON larger than this when the client sends Accept-Encoding
+            min_compression_size=cdk.Size.kibibytes(1),
+            # /preview returns PNG bodies base64-encoded by the function
+            binary_media_types=["image/png"],
             deploy_options=apigw.StageOptions(
                 throttling_rate_limit=50,
                 throttling_burst_limit=100,
@@ -285,10 +425,138 @@ class PhotoPickerAppStack(cdk.Stack):
             method_responses=[apigw.MethodResponse(status_code="200")],
         )
 
+        # e-paper previews rendered by the display pipeline's format_image function
+        preview_function_name = self.node.try_get_context("previewFunctionName") or None
+        preview_endpoint_url = None
+        if preview_function_name:
+            preview_fn = _lambda.Function.from_function_name(self, "PreviewFunction", preview_function_name)
+            preview_fn.grant_invoke(manage_fn)
+            manage_fn.add_environment("PREVIEW_FUNCTION_NAME", preview_function_name)
+            preview_res = api.root.add_resource("preview")
+            preview_res.add_method(
+                "GET",
+                uploads_integration,
+                method_responses=[apigw.MethodResponse(status_code="200")],
+            )
+            preview_endpoint_url = f"{api.url}preview"
+
+        # Gallery media through the site distribution, authorized by signed cookies
+        media_cdn_public_key_pem = self.node.try_get_context("mediaCdnPublicKeyPem") or None
+        media_cdn_private_key_secret_arn = self.node.try_get_context("mediaCdnPrivateKeySecretArn") or None
+        if bool(media_cdn_public_key_pem) != bool(media_cdn_private_key_secret_arn):
+            raise ValueError(
+                "mediaCdnPublicKeyPem and mediaCdnPrivateKeySecretArn must be set together."
+            )
+        if media_cdn_public_key_pem and use_existing_uploads_bucket:
+            # Policies cannot be attached to an imported bucket, so CloudFront would get 403s
+            raise ValueError(
+                "mediaCdnPublicKeyPem cannot be combined with useExistingUploadsBucket; "
+                "grant the distribution s3:GetObject in the bucket's own stack instead."
+            )
+        if media_cdn_public_key_pem and media_cdn_private_key_secret_arn:
+            media_public_key = cloudfront.PublicKey(
+                self,
+                "MediaCdnPublicKey",
+                encoded_key=media_cdn_public_key_pem,
+            )
+            media_key_group = cloudfront.KeyGroup(
+                self,
+                "MediaCdnKeyGroup",
+                items=[media_public_key],
+            )
+            media_headers = cloudfront.ResponseHeadersPolicy(
+                self,
+                "MediaCacheHeaders",
+                custom_headers_behavior=cloudfront.ResponseCustomHeadersBehavior(
+                    custom_headers=[
+                        # Upload keys are timestamped and never rewritten in place
+                        cloudfront.ResponseCustomHeader(
+                            header="cache-control",
+                            value="private, max-age=604800",
+                            override=False,
+                        )
+                    ]
+                ),
+            )
+            # format_image rewrites processed/<stem>.bmp and the thumbnails under the same
+            # key on every re-render, so those are revalidated (S3 answers 304 by ETag)
+            derived_headers = cloudfront.ResponseHeadersPolicy(
+                self,
+                "DerivedMediaCacheHeaders",
+                custom_headers_behavior=cloudfront.ResponseCustomHeadersBehavior(
+                    custom_headers=[
+                        cloudfront.ResponseCustomHeader(
+                            header="cache-control",
+                            value="private, no-cache",
+                            override=True,
+                        )
+                    ]
+                ),
+            )
+            derived_cache = cloudfront.CachePolicy(
+                self,
+                "DerivedMediaCachePolicy",
+                default_ttl=cdk.Duration.seconds(0),
+                min_ttl=cdk.Duration.seconds(0),
+                max_ttl=cdk.Duration.seconds(60),
+                enable_accept_encoding_gzip=True,
+                enable_accept_encoding_brotli=True,
+            )
+            # Adds the OAC and a bucket policy limited to this distribution; only the
+            # cookie-protected behaviors below route to it
+            media_origin = origins.S3BucketOrigin.with_origin_access_control(uploads_bucket)
+            media_behaviors = [
+                (uploads_prefix, cloudfront.CachePolicy.CACHING_OPTIMIZED, media_headers),
+                (processed_prefix, derived_cache, derived_headers),
+                (thumbnails_prefix, derived_cache, derived_headers),
+            ]
+            for prefix, cache_policy, headers_policy in media_behaviors:
+                distribution.add_behavior(
+                    f"/{prefix.strip('/')}/*",
+                    media_origin,
+                    viewer_protocol_policy=cloudfront.ViewerProtocolPolicy.REDIRECT_TO_HTTPS,
+                    allowed_methods=cloudfront.AllowedMethods.ALLOW_GET_HEAD,
+                    cache_policy=cache_policy,
+                    response_headers_policy=headers_policy,
+                    trusted_key_groups=[media_key_group],
+                )
+
+            # Cookies must come from the site's own origin, so proxy the session endpoint through it
+            media_session_res = api.root.add_resource("media-session")
+            # POST: CloudFront forwards Authorization with all-viewer headers only for non-GET requests
+            media_session_res.add_method(
+                "POST",
+                uploads_integration,
+                method_responses=[apigw.MethodResponse(status_code="200")],
+            )
+            distribution.add_behavior(
+                "/media-session",
+                origins.RestApiOrigin(api),
+                viewer_protocol_policy=cloudfront.ViewerProtocolPolicy.HTTPS_ONLY,
+                allowed_methods=cloudfront.AllowedMethods.ALLOW_ALL,
+                cache_policy=cloudfront.CachePolicy.CACHING_DISABLED,
+                origin_request_policy=cloudfront.OriginRequestPolicy.ALL_VIEWER_EXCEPT_HOST_HEADER,
+            )
+
+            media_private_key = secretsmanager.Secret.from_secret_complete_arn(
+                self, "MediaCdnPrivateKey", media_cdn_private_key_secret_arn
+            )
+            media_private_key.grant_read(manage_fn)
+            # MEDIA_BASE_URL stays unset: media paths are relative to the site, which also avoids
+            # a Distribution -> API -> function -> Distribution dependency cycle
+            manage_fn.add_environment("MEDIA_KEY_PAIR_ID", media_public_key.public_key_id)
+            manage_fn.add_environment("MEDIA_PRIVATE_KEY_SECRET_ARN", media_cdn_private_key_secret_arn)
+
         presign_endpoint_url = f"{api.url}presign"
         manage_endpoint_url = f"{api.url}uploads"
         cdk.CfnOutput(self, "SiteBucketName", value=site_bucket.bucket_name)
         cdk.CfnOutput(self, "UploadsBucketName", value=uploads_bucket.bucket_name)
+        cdk.CfnOutput(
+            self,
+            "IndexUploadsFunctionName",
+            value=index_fn.function_name,
+            description='Invoke once with {"action": "backfill"} to index existing uploads.',
+        )
         cdk.CfnOutput(self, "DistributionDomainName", value=distribution.distribution_domain_name)
         cdk.CfnOutput(
             self,
@@ -302,14 +570,52 @@ class PhotoPickerAppStack(cdk.Stack):
             value=manage_endpoint_url,
             description="Use this value for site/config.js upload.manageEndpoint.",
         )
+        if preview_endpoint_url:
+            cdk.CfnOutput(
+                self,
+                "PreviewEndpointForConfig",
+                value=preview_endpoint_url,
+                description="Use this value for site/config.js upload.previewEndpoint.",
+            )
 
-        s3deploy.BucketDeployment(
+        # Fingerprinted assets are immutable, so old copies are kept (prune=False) for pages
+        # still open on the previous build, and they are uploaded before the pages that reference them
+        assets_dir = site_build_dir / site_build.ASSETS_DIR
+        asset_deployments = [
+            s3deploy.BucketDeployment(
+                self,
+                "DeploySiteAssets",
+                sources=[s3deploy.Source.asset(str(assets_dir))],
+                destination_bucket=site_bucket,
+                destination_key_prefix=f"{site_build.ASSETS_DIR}/",
+                exclude=[f"{directory}/*" for directory in site_build.PRECOMPRESSED],
+                prune=False,
+                cache_control=[s3deploy.CacheControl.from_string(SITE_ASSET_CACHE_CONTROL)],
+            )
+        ]
+        for directory, encoding in site_build.PRECOMPRESSED.items():
+            asset_deployments.append(
+                s3deploy.BucketDeployment(
+                    self,
+                    f"DeploySiteAssets{directory.capitalize()}",
+                    sources=[s3deploy.Source.asset(str(assets_dir / directory))],
+                    destination_bucket=site_bucket,
+                    destination_key_prefix=f"{site_build.ASSETS_DIR}/{directory}/",
+                    prune=False,
+                    cache_control=[s3deploy.CacheControl.from_string(SITE_ASSET_CACHE_CONTROL)],
+                    content_encoding=encoding,
+                )
+            )
+        site_deployment = s3deploy.BucketDeployment(
             self,
             "DeploySite",
-            sources=[s3deploy.Source.asset(str(SITE_DIR))],
+            sources=[s3deploy.Source.asset(str(site_build_dir))],
             destination_bucket=site_bucket,
-            exclude=["cdk/*", "cdk/**", "tools/*", "tools/**", "*.example.js"],
+            # Excluded keys survive pruning, so the fingerprinted assets stay in place
+            exclude=[f"{site_build.ASSETS_DIR}/*", f"{site_build.ASSETS_DIR}/**"],
             distribution=distribution,
-            distribution_paths=["/*"],
-            cache_control=[s3deploy.CacheControl.from_string("public, max-age=300")],
+            distribution_paths=site_build.short_ttl_paths(site_build_dir),
+            cache_control=[s3deploy.CacheControl.from_string(SITE_PAGE_CACHE_CONTROL)],
         )
+        for deployment in asset_deployments:
+            site_deployment.node.add_dependency(deployment)
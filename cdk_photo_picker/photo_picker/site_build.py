@@ -0,0 +1,135 @@
+"""Synth-time build of the static site: minify, fingerprint and precompress.
+
+Scripts and styles are written to ``assets/<name>.<hash>.<ext>`` with the
+same file under ``assets/br/`` and ``assets/gz/`` precompressed, so the
+asset behavior's CloudFront Function only has to rewrite the path for the
+viewer's ``Accept-Encoding``. References in ``main.js`` and ``index.html``
+are rewritten to the hashed names; ``index.html`` and ``config.js`` keep
+their names and are deployed with a short TTL.
+
+``rjsmin``/``rcssmin`` and ``brotli`` are optional: without them files are
+only fingerprinted and gzip-compressed.
+"""
+
+import fnmatch
+import gzip
+import hashlib
+import re
+import shutil
+from pathlib import Path
+from typing import Dict, Iterable, List
+
+try:  # pragma: no cover - optional dependency
+    import rjsmin
+except ImportError:  # pragma: no cover
+    rjsmin = None
+
+try:  # pragma: no cover - optional dependency
+    import rcssmin
+except ImportError:  # pragma: no cover
+    rcssmin = None
+
+try:  # pragma: no cover - optional dependency
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+ASSETS_DIR = "assets"
+# Directory under ASSETS_DIR -> Content-Encoding
+PRECOMPRESSED = {"br": "br", "gz": "gzip"} if brotli else {"gz": "gzip"}
+# Workers first: main.js refers to them, and index.html to main.js and styles.css
+HASHED_FILES = ("resize-worker.js", "hash-worker.js", "styles.css", "main.js")
+HASH_LENGTH = 10
+
+
+def _minify(name: str, text: str) -> str:
+    if name.endswith(".js") and rjsmin:
+        return rjsmin.jsmin(text)
+    if name.endswith(".css") and rcssmin:
+        return rcssmin.cssmin(text)
+    return text
+
+
+def _fingerprint(name: str, data: bytes) -> str:
+    stem, ext = name.rsplit(".", 1)
+    return f"{stem}.{hashlib.sha256(data).hexdigest()[:HASH_LENGTH]}.{ext}"
+
+
+def _rewrite_references(text: str, renamed: Dict[str, str]) -> str:
+    """Point quoted references such as ``'./main.js'`` at the hashed copies."""
+    for name, hashed in renamed.items():
+        pattern = re.compile(r"""(["'`])(\./)?""" + re.escape(name) + r"\1")
+        text = pattern.sub(lambda m, h=hashed: f"{m.group(1)}{m.group(2) or ''}{ASSETS_DIR}/{h}{m.group(1)}", text)
+    return text
+
+
+def _compress(encoding: str, data: bytes) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=11)
+    # mtime=0 keeps the output, and so the CDK asset hash, stable between synths
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def build_site(source: Path, output: Path, exclude: Iterable[str] = ()) -> Dict[str, str]:
+    """Build ``source`` into ``output`` and return ``{original name: hashed name}``."""
+    exclude = list(exclude)
+    if output.exists():
+        shutil.rmtree(output)
+    assets = output / ASSETS_DIR
+    for directory in PRECOMPRESSED:
+        (assets / directory).mkdir(parents=True)
+
+    renamed: Dict[str, str] = {}
+    for name in HASHED_FILES:
+        path = source / name
+        if not path.is_file():
+            continue
+        text = _minify(name, _rewrite_references(path.read_text(encoding="utf-8"), renamed))
+        data = text.encode("utf-8")
+        hashed = _fingerprint(name, data)
+        (assets / hashed).write_bytes(data)
+        for directory, encoding in PRECOMPRESSED.items():
+            (assets / directory / hashed).write_bytes(_compress(encoding, data))
+        renamed[name] = hashed
+
+    for path in sorted(source.rglob("*")):
+        relative = path.relative_to(source).as_posix()
+        if not path.is_file() or relative in renamed or any(fnmatch.fnmatch(relative, p) for p in exclude):
+            continue
+        target = output / relative
+        target.parent.mkdir(parents=True, exist_ok=True)
+        if path.suffix in {".html", ".js", ".css"}:
+            target.write_text(_rewrite_references(path.read_text(encoding="utf-8"), renamed), encoding="utf-8")
+        else:
+            shutil.copyfile(path, target)
+    return renamed
+
+
+def short_ttl_paths(output: Path) -> List[str]:
+    """Distribution paths to invalidate: everything outside the immutable assets."""
+    paths = ["/"]
+    for path in sorted(output.rglob("*")):
+        relative = path.relative_to(output).as_posix()
+        if path.is_file() and not relative.startswith(f"{ASSETS_DIR}/"):
+            paths.append(f"/{relative}")
+    return paths
+
+
+def encoding_function_code() -> str:
+    """CloudFront Function (viewer request) selecting the precompressed copy of an asset."""
+    branches = []
+    for directory, encoding in PRECOMPRESSED.items():
+        branches.append(
+            f"if (/\\b{encoding}\\b/.test(accepted)) {{ request.uri = '/{ASSETS_DIR}/{directory}/' + name; }}"
+        )
+    return (
+        "function handler(event) {\n"
+        "  var request = event.request;\n"
+        "  var header = request.headers['accept-encoding'];\n"
+        "  var accepted = header ? header.value : '';\n"
+        f"  var name = request.uri.slice({len(ASSETS_DIR) + 2});\n"
+        "  if (name.indexOf('/') !== -1) return request;\n"
+        f"  {' else '.join(branches)}\n"
+        "  return request;\n"
+        "}\n"
+    )
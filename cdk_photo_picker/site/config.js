@@ -13,7 +13,41 @@ window.AppConfig = {
     presignEndpoint: "https://xxxxx.execute-api.ap-northeast-1.amazonaws.com/prod/presign",
     // Endpoint for listing & deleting uploaded objects
     manageEndpoint: "https://xxxxx.execute-api.ap-northeast-1.amazonaws.com/prod/uploads",
+    // Optional: e-paper preview with adjustable settings (stack output PreviewEndpointForConfig)
+    previewEndpoint: "",
     // Optional: prefix for S3 object keys, e.g., "uploads/"
-    s3KeyPrefix: "uploads/"
+    s3KeyPrefix: "uploads/",
+    // Optional: URLs requested per /presign call (keep <= presignMaxItems on the stack)
+    presignBatchSize: 100,
+    // Optional: photos transferred in parallel, and retries per photo (exponential backoff)
+    concurrency: 4,
+    retries: 3,
+    // Optional: files at or above this size use S3 multipart upload with parallel parts
+    multipartThresholdBytes: 16 * 1024 * 1024,
+    multipartPartSizeBytes: 8 * 1024 * 1024,
+    multipartConcurrency: 4,
+    // Optional: shrink photos in the browser before upload (skipped when "keep original" is checked).
+    // The output covers the panel size times `scale` in either orientation; JPEG/PNG/WebP keep their type.
+    resize: {
+      enabled: true,
+      scale: 2,
+      quality: 0.9
+    },
+    // Optional: download Google Photos picks as size-bounded JPEG renditions (=wN-hN) instead of originals.
+    // N covers every panel profile times `headroom` for photos up to `maxAspect`:1; "keep original" uses =d.
+    googleRendition: {
+      enabled: true,
+      headroom: 1.5,
+      maxAspect: 2
+    },
+    // Optional: skip photos whose SHA-256 matches something already uploaded
+    dedupe: true
+  },
+  display: {
+    // e-paper panel size (match the display pipeline's epaperWidth / epaperHeight)
+    panelWidth: 800,
+    panelHeight: 480,
+    // Optional: several panels sharing this library, e.g. [{ width: 800, height: 480 }, { width: 1200, height: 825 }]
+    profiles: []
   }
 };
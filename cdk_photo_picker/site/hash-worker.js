@@ -0,0 +1,105 @@
+// Computes the SHA-256 of a Blob off the main thread for upload deduplication.
+// Message in:  { id, blob, chunkBytes, subtleMaxBytes }
+// Message out: { id, sha256 } (lowercase hex) or { id, error }
+// Blobs up to `subtleMaxBytes` are hashed with SubtleCrypto in one call. SubtleCrypto
+// cannot hash incrementally, so larger blobs are streamed through the incremental
+// implementation below one chunk at a time to keep memory flat.
+
+const K = new Uint32Array([
+  0x428a2f98, 0x71374491, 0xb5c0fbcf, 0xe9b5dba5, 0x3956c25b, 0x59f111f1, 0x923f82a4, 0xab1c5ed5,
+  0xd807aa98, 0x12835b01, 0x243185be, 0x550c7dc3, 0x72be5d74, 0x80deb1fe, 0x9bdc06a7, 0xc19bf174,
+  0xe49b69c1, 0xefbe4786, 0x0fc19dc6, 0x240ca1cc, 0x2de92c6f, 0x4a7484aa, 0x5cb0a9dc, 0x76f988da,
+  0x983e5152, 0xa831c66d, 0xb00327c8, 0xbf597fc7, 0xc6e00bf3, 0xd5a79147, 0x06ca6351, 0x14292967,
+  0x27b70a85, 0x2e1b2138, 0x4d2c6dfc, 0x53380d13, 0x650a7354, 0x766a0abb, 0x81c2c92e, 0x92722c85,
+  0xa2bfe8a1, 0xa81a664b, 0xc24b8b70, 0xc76c51a3, 0xd192e819, 0xd6990624, 0xf40e3585, 0x106aa070,
+  0x19a4c116, 0x1e376c08, 0x2748774c, 0x34b0bcb5, 0x391c0cb3, 0x4ed8aa4a, 0x5b9cca4f, 0x682e6ff3,
+  0x748f82ee, 0x78a5636f, 0x84c87814, 0x8cc70208, 0x90befffa, 0xa4506ceb, 0xbef9a3f7, 0xc67178f2,
+]);
+
+class Sha256 {
+  constructor() {
+    this.h = new Uint32Array([
+      0x6a09e667, 0xbb67ae85, 0x3c6ef372, 0xa54ff53a, 0x510e527f, 0x9b05688c, 0x1f83d9ab, 0x5be0cd19,
+    ]);
+    this.w = new Uint32Array(64);
+    this.buffer = new Uint8Array(64);
+    this.buffered = 0;
+    this.length = 0;
+  }
+
+  update(bytes) {
+    let offset = 0;
+    this.length += bytes.length;
+    if (this.buffered) {
+      const take = Math.min(64 - this.buffered, bytes.length);
+      this.buffer.set(bytes.subarray(0, take), this.buffered);
+      this.buffered += take;
+      offset = take;
+      if (this.buffered < 64) return;
+      this.block(this.buffer, 0);
+      this.buffered = 0;
+    }
+    for (; offset + 64 <= bytes.length; offset += 64) this.block(bytes, offset);
+    this.buffer.set(bytes.subarray(offset), 0);
+    this.buffered = bytes.length - offset;
+  }
+
+  block(bytes, offset) {
+    const { w, h } = this;
+    for (let i = 0; i < 16; i += 1) {
+      const j = offset + i * 4;
+      w[i] = (bytes[j] << 24) | (bytes[j + 1] << 16) | (bytes[j + 2] << 8) | bytes[j + 3];
+    }
+    for (let i = 16; i < 64; i += 1) {
+      const a = w[i - 15];
+      const b = w[i - 2];
+      const s0 = ((a >>> 7) | (a << 25)) ^ ((a >>> 18) | (a << 14)) ^ (a >>> 3);
+      const s1 = ((b >>> 17) | (b << 15)) ^ ((b >>> 19) | (b << 13)) ^ (b >>> 10);
+      w[i] = (w[i - 16] + s0 + w[i - 7] + s1) | 0;
+    }
+    let [a, b, c, d, e, f, g, hh] = h;
+    for (let i = 0; i < 64; i += 1) {
+      const s1 = ((e >>> 6) | (e << 26)) ^ ((e >>> 11) | (e << 21)) ^ ((e >>> 25) | (e << 7));
+      const t1 = (hh + s1 + ((e & f) ^ (~e & g)) + K[i] + w[i]) | 0;
+      const s0 = ((a >>> 2) | (a << 30)) ^ ((a >>> 13) | (a << 19)) ^ ((a >>> 22) | (a << 10));
+      const t2 = (s0 + ((a & b) ^ (a & c) ^ (b & c))) | 0;
+      hh = g; g = f; f = e; e = (d + t1) | 0;
+      d = c; c = b; b = a; a = (t1 + t2) | 0;
+    }
+    h[0] += a; h[1] += b; h[2] += c; h[3] += d;
+    h[4] += e; h[5] += f; h[6] += g; h[7] += hh;
+  }
+
+  hex() {
+    const bitLength = this.length * 8;
+    const padding = new Uint8Array(((this.buffered < 56 ? 56 : 120) - this.buffered) + 8);
+    padding[0] = 0x80;
+    const view = new DataView(padding.buffer);
+    view.setUint32(padding.length - 8, Math.floor(bitLength / 0x100000000));
+    view.setUint32(padding.length - 4, bitLength >>> 0);
+    this.update(padding);
+    return Array.from(this.h, (word) => word.toString(16).padStart(8, '0')).join('');
+  }
+}
+
+function toHex(buffer) {
+  return Array.from(new Uint8Array(buffer), (byte) => byte.toString(16).padStart(2, '0')).join('');
+}
+
+self.onmessage = async (event) => {
+  const { id, blob, chunkBytes, subtleMaxBytes } = event.data || {};
+  try {
+    if (blob.size <= subtleMaxBytes && self.crypto?.subtle) {
+      const digest = await self.crypto.subtle.digest('SHA-256', await blob.arrayBuffer());
+      self.postMessage({ id, sha256: toHex(digest) });
+      return;
+    }
+    const hash = new Sha256();
+    for (let offset = 0; offset < blob.size; offset += chunkBytes) {
+      hash.update(new Uint8Array(await blob.slice(offset, offset + chunkBytes).arrayBuffer()));
+    }
+    self.postMessage({ id, sha256: hash.hex() });
+  } catch (err) {
+    self.postMessage({ id, error: err?.message || String(err) });
+  }
+};
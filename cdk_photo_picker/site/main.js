@@ -11,21 +11,75 @@
   const uploadsListEl = document.getElementById('uploadsList');
   const uploadsEmptyEl = document.getElementById('uploadsEmpty');
   const refreshUploadsDefaultText = btnRefreshUploads?.textContent || '';
+  const uploadsTopSpacer = document.createElement('div');
+  const uploadsBottomSpacer = document.createElement('div');
+  uploadsTopSpacer.className = 'uploads-spacer';
+  uploadsBottomSpacer.className = 'uploads-spacer';
+  let uploadsWindowFrame = 0;
   if (btnRefreshUploads) btnRefreshUploads.disabled = true;
   const signinOverlay = document.getElementById('signinOverlay');
   const overlaySignIn = document.getElementById('overlaySignIn');
   const popupHintEl = document.getElementById('popupHint');
   const popupHintMessageEl = document.getElementById('popupHintMessage');
   const inputLocalFiles = document.getElementById('inputLocalFiles');
+  const keepOriginalInput = document.getElementById('chkKeepOriginal');
+  const uploadSummaryEl = document.getElementById('uploadSummary');
+  const uploadSummaryBarEl = document.getElementById('uploadSummaryBar');
+  const uploadSummaryTextEl = document.getElementById('uploadSummaryText');
+  const previewSectionEl = document.getElementById('previewSection');
+  const previewImageEl = document.getElementById('previewImage');
+  const previewKeyEl = document.getElementById('previewKey');
+  const previewStatusEl = document.getElementById('previewStatus');
+  const previewDitherInput = document.getElementById('previewDither');
+  const previewRangeInputs = {
+    saturation: document.getElementById('previewSaturation'),
+    contrast: document.getElementById('previewContrast'),
+    brightness: document.getElementById('previewBrightness'),
+  };
 
   const PENDING_SESSION_KEY = 'photopicker.pendingSession';
   const STORED_AUTH_STATE_KEY = 'photopicker.authState';
   const INITIAL_UPLOADS_VISIBLE = 5;
   const UPLOADS_PAGE_STEP = 10;
+  const UPLOAD_ROW_GAP = 14; // keep in sync with .upload-item margin-bottom
+  const UPLOAD_ROW_STRIDE_ESTIMATE = 168;
+  const UPLOADS_VIEWPORT_FALLBACK = 640;
+  const UPLOAD_OVERSCAN_ROWS = 4;
+  const UPLOAD_THUMB_PRELOAD_PX = 200;
+  const PRESIGN_BATCH_SIZE = 100;
+  const BULK_DELETE_BATCH_SIZE = 1000; // manage_uploads MAX_DELETE_KEYS
+  const PREVIEW_DEBOUNCE_MS = 120;
+  const PREVIEW_CACHE_ITEMS = 40; // rendered previews kept as object URLs (~30-80 KB each)
+  const MEDIA_SESSION_RENEW_MARGIN_MS = 10 * 60 * 1000;
+  const PRESIGN_DEFAULT_TTL_MS = 15 * 60 * 1000;
+  const PRESIGN_EXPIRY_MARGIN_MS = 60 * 1000;
+  const DEFAULT_UPLOAD_CONCURRENCY = 4;
+  const DEFAULT_UPLOAD_RETRIES = 3;
+  const UPLOAD_RETRY_BASE_MS = 1000;
+  const DEFAULT_MULTIPART_THRESHOLD_BYTES = 16 * 1024 * 1024;
+  const DEFAULT_MULTIPART_PART_BYTES = 8 * 1024 * 1024;
+  const MULTIPART_MIN_PART_BYTES = 5 * 1024 * 1024; // S3 minimum for every part but the last
+  const DEFAULT_MULTIPART_CONCURRENCY = 4;
+  const DEFAULT_PANEL_WIDTH = 800;
+  const DEFAULT_PANEL_HEIGHT = 480;
+  const DEFAULT_RESIZE_SCALE = 2;
+  const DEFAULT_RESIZE_QUALITY = 0.9;
+  const DEFAULT_RENDITION_HEADROOM = 1.5;
+  const DEFAULT_RENDITION_MAX_ASPECT = 2;
+  const HASH_CHUNK_BYTES = 4 * 1024 * 1024;
+  const HASH_SUBTLE_MAX_BYTES = 64 * 1024 * 1024;
   const isLikelyMobile = /Android|webOS|iPhone|iPad|iPod|BlackBerry|IEMobile|Opera Mini/i.test(navigator.userAgent || '');
   const signInUxMode = isLikelyMobile ? 'redirect' : 'popup';
   const loginRedirectUri = `${window.location.origin}${window.location.pathname}`;
   let localItemSequence = 0;
+  const uploadThumbObserver = uploadsListEl && typeof IntersectionObserver === 'function'
+    ? new IntersectionObserver(handleUploadThumbIntersections, {
+      root: uploadsListEl,
+      rootMargin: `${UPLOAD_THUMB_PRELOAD_PX}px 0px`,
+    })
+    : null;
+  const resizeWorker = createWorkerClient('resize-worker.js', () => typeof OffscreenCanvas !== 'undefined');
+  const hashWorker = createWorkerClient('hash-worker.js');
 
   const state = {
     accessToken: null,
@@ -39,13 +93,20 @@
     uploads: [],
     uploadsVisibleCount: INITIAL_UPLOADS_VISIBLE,
     nextUploadsOffset: 0,
+    nextUploadsCursor: null,
+    uploadsPageCache: new Map(), // listing URL -> { etag, data }
+    mediaSessionExpiresAt: 0, // epoch ms; signed media cookies are HttpOnly
     uploadsHasMore: false,
     uploadsTotal: null,
     uploadsLoading: false,
     uploadsFetched: false,
     uploadsSelected: new Set(),
+    uploadRowStride: 0, // measured row height + gap for the virtualized uploads list
     signedIn: false,
     signInInProgress: false,
+    uploadRun: null, // { items, done, failed, duplicates } while an upload batch is running
+    preview: null, // { key, timer, controller } while the preview panel is open
+    previewCache: new Map(), // preview URL -> object URL, oldest first
   };
 
   const cfg = window.AppConfig;
@@ -248,6 +309,13 @@
     rawLink.rel = 'noopener';
     controls.appendChild(rawLink);
 
+    const adjustBtn = document.createElement('button');
+    adjustBtn.className = 'secondary';
+    adjustBtn.textContent = '調整';
+    adjustBtn.classList.toggle('hidden', !cfg?.upload?.previewEndpoint);
+    adjustBtn.addEventListener('click', () => openPreview(row.dataset.key));
+    controls.appendChild(adjustBtn);
+
     row.appendChild(controls);
     row._els = {
       thumbImg,
@@ -283,17 +351,23 @@
     } = row._els || {};
 
     const previewUrl = item.processedUrl || item.downloadUrl || '';
+    // Small WebP/JPEG derivatives when present; full-size files stay behind the links
+    const thumbUrl = item.processedThumbnailUrl || item.thumbnailUrl || previewUrl;
     if (thumbImg && thumbPlaceholder) {
-      if (previewUrl) {
+      if (thumbUrl) {
         thumbPlaceholder.classList.add('hidden');
         thumbImg.classList.remove('hidden');
-        if (thumbImg.getAttribute('src') !== previewUrl) {
-          thumbImg.src = previewUrl;
+        if (thumbImg.dataset.src !== thumbUrl) {
+          thumbImg.dataset.src = thumbUrl;
+          thumbImg.removeAttribute('src');
+          if (!uploadThumbObserver || thumbImg._inView) loadUploadThumb(thumbImg);
         }
+        uploadThumbObserver?.observe(thumbImg);
         thumbImg.alt = item.key;
       } else {
         thumbImg.classList.add('hidden');
-        thumbImg.removeAttribute('src');
+        releaseUploadThumb(thumbImg);
+        delete thumbImg.dataset.src;
         thumbPlaceholder.classList.remove('hidden');
       }
     }
@@ -347,6 +421,193 @@
     }
   }
 
+  function previewOverrides() {
+    const params = {};
+    Object.entries(previewRangeInputs).forEach(([name, input]) => {
+      if (input?.value) params[name] = Number(input.value).toFixed(2);
+    });
+    if (previewDitherInput) params.dither = previewDitherInput.checked ? 'floyd' : 'none';
+    return params;
+  }
+
+  function setPreviewControls(settings) {
+    Object.entries(previewRangeInputs).forEach(([name, input]) => {
+      if (!input || typeof settings[name] !== 'number') return;
+      input.value = String(settings[name]);
+      if (input.nextElementSibling) input.nextElementSibling.textContent = Number(settings[name]).toFixed(2);
+    });
+    if (previewDitherInput && settings.dither) previewDitherInput.checked = settings.dither !== 'none';
+  }
+
+  function openPreview(key) {
+    if (!key || !cfg?.upload?.previewEndpoint || !previewSectionEl) return;
+    closePreview();
+    state.preview = { key, timer: null, controller: null };
+    previewKeyEl.textContent = key;
+    previewImageEl.removeAttribute('src');
+    previewSectionEl.classList.remove('hidden');
+    previewSectionEl.scrollIntoView({ behavior: 'smooth', block: 'start' });
+    // First render uses the deployed settings; the response reports them for the sliders
+    loadPreview({});
+  }
+
+  function closePreview() {
+    if (state.preview) {
+      clearTimeout(state.preview.timer);
+      state.preview.controller?.abort();
+    }
+    state.preview = null;
+    previewSectionEl?.classList.add('hidden');
+  }
+
+  function schedulePreview() {
+    if (!state.preview) return;
+    Object.values(previewRangeInputs).forEach((input) => {
+      if (input?.nextElementSibling) input.nextElementSibling.textContent = Number(input.value).toFixed(2);
+    });
+    clearTimeout(state.preview.timer);
+    state.preview.timer = setTimeout(() => loadPreview(previewOverrides()), PREVIEW_DEBOUNCE_MS);
+  }
+
+  async function loadPreview(overrides) {
+    const preview = state.preview;
+    if (!preview) return;
+    const url = new URL(cfg.upload.previewEndpoint);
+    url.searchParams.set('key', preview.key);
+    Object.entries(overrides).forEach(([name, value]) => url.searchParams.set(name, value));
+    const cachedUrl = state.previewCache.get(url.toString());
+    if (cachedUrl) {
+      // Dragging back to a value already rendered needs no request at all
+      state.previewCache.delete(url.toString());
+      state.previewCache.set(url.toString(), cachedUrl);
+      previewImageEl.src = cachedUrl;
+      previewStatusEl.textContent = '';
+      return;
+    }
+    preview.controller?.abort();
+    preview.controller = new AbortController();
+    previewStatusEl.textContent = 'プレビューを生成中…';
+    try {
+      await ensureIdTokenInteractive(false, { allowPrompt: true });
+      const started = performance.now();
+      const resp = await fetch(url.toString(), {
+        headers: { Authorization: `Bearer ${state.idToken}`, Accept: 'image/png' },
+        signal: preview.controller.signal,
+      });
+      if (!resp.ok) {
+        const text = await resp.text().catch(() => '');
+        throw new Error(`status ${resp.status}${text ? ` ${text}` : ''}`);
+      }
+      const objectUrl = URL.createObjectURL(await resp.blob());
+      state.previewCache.set(url.toString(), objectUrl);
+      while (state.previewCache.size > PREVIEW_CACHE_ITEMS) {
+        const [oldestUrl, oldestObjectUrl] = state.previewCache.entries().next().value;
+        state.previewCache.delete(oldestUrl);
+        URL.revokeObjectURL(oldestObjectUrl);
+      }
+      if (state.preview !== preview) return;
+      if (!Object.keys(overrides).length) {
+        try {
+          setPreviewControls(JSON.parse(resp.headers.get('X-Preview-Settings') || '{}'));
+        } catch (_) {
+          // Older functions do not report settings; the sliders keep their values
+        }
+      }
+      previewImageEl.src = objectUrl;
+      previewStatusEl.textContent = `${Math.round(performance.now() - started)} ms`;
+    } catch (err) {
+      if (err?.name === 'AbortError') return;
+      previewStatusEl.textContent = '';
+      appendLog(`ERROR: プレビューの生成に失敗しました: ${err.message}`);
+    }
+  }
+
+  function loadUploadThumb(img) {
+    const src = img.dataset.src;
+    if (src && img.getAttribute('src') !== src) img.src = src;
+  }
+
+  // Drop the image so the browser can free the decoded bitmap while the row is offscreen.
+  function releaseUploadThumb(img) {
+    if (img.hasAttribute('src')) img.removeAttribute('src');
+  }
+
+  function handleUploadThumbIntersections(entries) {
+    entries.forEach((entry) => {
+      entry.target._inView = entry.isIntersecting;
+      if (entry.isIntersecting) loadUploadThumb(entry.target);
+      else releaseUploadThumb(entry.target);
+    });
+  }
+
+  function detachUploadRow(row) {
+    const img = row._els?.thumbImg;
+    if (img) {
+      uploadThumbObserver?.unobserve(img);
+      img._inView = false;
+      releaseUploadThumb(img);
+    }
+    row.remove();
+  }
+
+  // Render only the rows inside (or near) the scroll viewport; spacers stand in for the rest.
+  function renderUploadsWindow() {
+    if (!uploadsListEl) return;
+    const visibleCount = Math.min(state.uploadsVisibleCount || 0, state.uploads.length);
+    const stride = state.uploadRowStride || UPLOAD_ROW_STRIDE_ESTIMATE;
+    const viewport = uploadsListEl.clientHeight || UPLOADS_VIEWPORT_FALLBACK;
+    const scrollTop = uploadsListEl.scrollTop;
+    const start = Math.max(0, Math.min(visibleCount, Math.floor(scrollTop / stride) - UPLOAD_OVERSCAN_ROWS));
+    const end = Math.min(visibleCount, Math.ceil((scrollTop + viewport) / stride) + UPLOAD_OVERSCAN_ROWS);
+    const slice = state.uploads.slice(start, end);
+
+    if (uploadsTopSpacer.parentElement !== uploadsListEl) uploadsListEl.prepend(uploadsTopSpacer);
+    if (uploadsBottomSpacer.parentElement !== uploadsListEl) uploadsListEl.appendChild(uploadsBottomSpacer);
+    uploadsTopSpacer.style.height = `${start * stride}px`;
+    uploadsBottomSpacer.style.height = `${(visibleCount - end) * stride}px`;
+
+    const existingRows = new Map();
+    Array.from(uploadsListEl.children).forEach((child) => {
+      if (child instanceof HTMLElement && child.dataset.key) {
+        existingRows.set(child.dataset.key, child);
+      }
+    });
+
+    let previous = uploadsTopSpacer;
+    slice.forEach((item, offset) => {
+      let row = existingRows.get(item.key);
+      if (!row) {
+        row = createUploadRow();
+      }
+      updateUploadRow(row, item, start + offset);
+      existingRows.delete(item.key);
+      if (previous.nextSibling !== row) {
+        uploadsListEl.insertBefore(row, previous.nextSibling);
+      }
+      previous = row;
+    });
+
+    // rows that scrolled out of the window or were removed from the list
+    existingRows.forEach((row) => detachUploadRow(row));
+
+    const firstRow = uploadsTopSpacer.nextElementSibling;
+    if (firstRow && firstRow !== uploadsBottomSpacer && firstRow.offsetHeight) {
+      const measured = firstRow.offsetHeight + UPLOAD_ROW_GAP;
+      if (Math.abs(measured - stride) > 1) {
+        state.uploadRowStride = measured;
+        scheduleUploadsWindowRender();
+      }
+    }
+  }
+
+  function scheduleUploadsWindowRender() {
+    if (uploadsWindowFrame) return;
+    uploadsWindowFrame = requestAnimationFrame(() => {
+      uploadsWindowFrame = 0;
+      renderUploadsWindow();
+    });
+  }
+
   function renderUploadsList() {
     if (!uploadsContainerEl || !uploadsListEl) return;
     const totalUploads = state.uploads.length;
@@ -354,7 +615,9 @@
     visibleCount = Math.min(visibleCount, totalUploads);
     state.uploadsVisibleCount = visibleCount;
     if (!totalUploads) {
-      uploadsListEl.innerHTML = '';
+      Array.from(uploadsListEl.children).forEach((child) => {
+        if (child._els) detachUploadRow(child);
+      });
       uploadsContainerEl.classList.add('empty');
       if (uploadsEmptyEl) {
         if (state.uploadsLoading) {
@@ -371,37 +634,7 @@
     uploadsContainerEl.classList.remove('empty');
     if (uploadsEmptyEl) uploadsEmptyEl.textContent = '';
 
-    const slice = state.uploads.slice(0, visibleCount);
-
-    const existingRows = new Map();
-    Array.from(uploadsListEl.children).forEach((child) => {
-      if (child instanceof HTMLElement && child.dataset.key) {
-        existingRows.set(child.dataset.key, child);
-      }
-    });
-
-    slice.forEach((item, index) => {
-      let row = existingRows.get(item.key);
-      if (!row) {
-        row = createUploadRow();
-      }
-      updateUploadRow(row, item, index);
-      existingRows.delete(item.key);
-      const currentChild = uploadsListEl.children[index];
-      if (currentChild !== row) {
-        uploadsListEl.insertBefore(row, currentChild || null);
-      }
-    });
-
-    // remove extra rows beyond current slice
-    while (uploadsListEl.children.length > slice.length) {
-      uploadsListEl.removeChild(uploadsListEl.lastElementChild);
-    }
-    existingRows.forEach((row) => {
-      if (row.parentElement === uploadsListEl) {
-        uploadsListEl.removeChild(row);
-      }
-    });
+    renderUploadsWindow();
 
     if (btnLoadMoreUploads) {
       const totalKnown = typeof state.uploadsTotal === 'number' ? state.uploadsTotal : null;
@@ -502,7 +735,24 @@
     }
   }
 
-  async function fetchUploadsList({ resetVisible = false, offset = 0, limit = INITIAL_UPLOADS_VISIBLE } = {}) {
+  // Media URLs from the CDN are stable and need the signed cookies this endpoint sets
+  async function ensureMediaSession(sessionUrl) {
+    if (state.mediaSessionExpiresAt - Date.now() > MEDIA_SESSION_RENEW_MARGIN_MS) return;
+    try {
+      const resp = await fetch(sessionUrl, {
+        method: 'POST',
+        credentials: 'same-origin',
+        headers: { Authorization: `Bearer ${state.idToken}` },
+      });
+      if (!resp.ok) throw new Error(`status ${resp.status}`);
+      const data = await resp.json();
+      state.mediaSessionExpiresAt = Number(data.expiresAt) * 1000 || 0;
+    } catch (err) {
+      appendLog(`WARN: 画像配信用 Cookie の取得に失敗しました: ${err.message}`);
+    }
+  }
+
+  async function fetchUploadsList({ resetVisible = false, offset = 0, limit = INITIAL_UPLOADS_VISIBLE, cursor = null } = {}) {
     if (!cfg?.upload?.manageEndpoint) {
       appendLog('WARN: upload.manageEndpoint is not configured in config.js');
       return;
@@ -520,17 +770,22 @@
       const safeOffset = Math.max(0, offset);
       url.searchParams.set('limit', String(safeLimit));
       url.searchParams.set('offset', String(safeOffset));
-
-      const resp = await fetch(url.toString(), {
-        headers: {
-          Authorization: `Bearer ${state.idToken}`,
-        },
-      });
-      if (!resp.ok) {
+      // Index-backed servers page by opaque cursor; offset remains for the bucket-scan fallback
+      if (cursor && safeOffset > 0) url.searchParams.set('cursor', cursor);
+
+      // Revalidate the last copy of this page; an unchanged listing comes back as an empty 304
+      const cached = state.uploadsPageCache.get(url.toString());
+      const headers = { Authorization: `Bearer ${state.idToken}` };
+      if (cached) headers['If-None-Match'] = cached.etag;
+      const resp = await fetch(url.toString(), { headers, cache: 'no-store' });
+      if (resp.status !== 304 && !resp.ok) {
         const text = await resp.text().catch(() => '');
         throw new Error(`status ${resp.status}${text ? ` ${text}` : ''}`);
       }
-      const data = await resp.json();
+      const data = resp.status === 304 && cached ? cached.data : await resp.json();
+      const etag = resp.headers.get('ETag');
+      if (etag && resp.status !== 304) state.uploadsPageCache.set(url.toString(), { etag, data });
+      if (data.mediaSessionUrl) await ensureMediaSession(data.mediaSessionUrl);
       const incoming = Array.isArray(data.items) ? data.items : [];
       const totalFromApi = typeof data.total === 'number' ? data.total : undefined;
 
@@ -552,6 +807,7 @@
       }
 
       state.uploadsFetched = true;
+      state.nextUploadsCursor = typeof data.nextCursor === 'string' ? data.nextCursor : null;
       const validKeys = new Set(state.uploads.map((item) => item.key));
       state.uploadsSelected = new Set(
         Array.from(state.uploadsSelected).filter((key) => validKeys.has(key))
@@ -638,6 +894,38 @@
     return data;
   }
 
+  // One DELETE per batch; the server removes originals and derivatives with DeleteObjects
+  async function deleteUploads(keys) {
+    if (!cfg?.upload?.manageEndpoint) {
+      throw new Error('manageEndpoint is not configured');
+    }
+    await ensureIdTokenInteractive(false, { allowPrompt: true });
+    const results = [];
+    for (let start = 0; start < keys.length; start += BULK_DELETE_BATCH_SIZE) {
+      const batch = keys.slice(start, start + BULK_DELETE_BATCH_SIZE);
+      const resp = await fetch(cfg.upload.manageEndpoint, {
+        method: 'DELETE',
+        headers: {
+          'content-type': 'application/json',
+          Authorization: `Bearer ${state.idToken}`,
+        },
+        body: JSON.stringify({ keys: batch }),
+      });
+      if (!resp.ok) {
+        const text = await resp.text().catch(() => '');
+        throw new Error(`status ${resp.status}${text ? ` ${text}` : ''}`);
+      }
+      const data = await resp.json();
+      results.push(...(Array.isArray(data.results) ? data.results : []));
+    }
+    const deleted = new Set(results.filter((result) => result.deleted).map((result) => result.key));
+    state.uploads = state.uploads.filter((item) => !deleted.has(item.key));
+    deleted.forEach((key) => state.uploadsSelected.delete(key));
+    renderUploadsList();
+    updateBulkDeleteVisibility();
+    return results;
+  }
+
   function buildMediaUrl(baseUrl, variant) {
     if (!baseUrl) return '';
     const variantPart = variant ? `=${variant}` : '';
@@ -645,6 +933,32 @@
     return `${baseUrl}${variantPart}${tokenQuery}`;
   }
 
+  function panelProfiles() {
+    const profiles = Array.isArray(cfg?.display?.profiles) ? cfg.display.profiles : [];
+    const valid = profiles
+      .map((profile) => ({ width: Number(profile?.width), height: Number(profile?.height) }))
+      .filter(({ width, height }) => width > 0 && height > 0);
+    if (valid.length) return valid;
+    return [{
+      width: Number(cfg?.display?.panelWidth) || DEFAULT_PANEL_WIDTH,
+      height: Number(cfg?.display?.panelHeight) || DEFAULT_PANEL_HEIGHT,
+    }];
+  }
+
+  // Google Photos variant used for uploads: a size-bounded rendition that still covers every panel
+  // profile after cropping (in either orientation, for photos up to `maxAspect`), or `d` for the original.
+  function downloadVariant() {
+    const policy = cfg?.upload?.googleRendition || {};
+    if (!policy.enabled || keepOriginalInput?.checked) return 'd';
+    const headroom = Math.max(1, Number(policy.headroom) || DEFAULT_RENDITION_HEADROOM);
+    const maxAspect = Math.max(1, Number(policy.maxAspect) || DEFAULT_RENDITION_MAX_ASPECT);
+    const edge = Math.max(...panelProfiles().map(({ width, height }) => (
+      Math.max(Math.max(width, height), Math.min(width, height) * maxAspect)
+    )));
+    const bound = Math.ceil(edge * headroom);
+    return `w${bound}-h${bound}`;
+  }
+
   function refreshAllMediaUrls() {
     for (const item of state.items) {
       if (item.source === 'local') {
@@ -658,7 +972,7 @@
         continue;
       }
       item.thumbUrl = buildMediaUrl(item.baseUrl, 'w400-h400-c');
-      item.downloadUrl = buildMediaUrl(item.baseUrl, 'd');
+      item.downloadUrl = buildMediaUrl(item.baseUrl, downloadVariant());
       if (item._els?.img && item.thumbUrl) {
         item._els.img.src = item.thumbUrl;
       }
@@ -1088,7 +1402,7 @@
         filename: media.filename || `${item.id}.jpg`,
         mimeType: media.mimeType || 'application/octet-stream',
         thumbUrl: buildMediaUrl(baseUrl, 'w400-h400-c'),
-        downloadUrl: buildMediaUrl(baseUrl, 'd'),
+        downloadUrl: buildMediaUrl(baseUrl, downloadVariant()),
         status: 'ready',
         progress: 0,
         uploaded: false,
@@ -1104,7 +1418,7 @@
       throw new Error('ローカルファイルのデータを取得できませんでした');
     }
     const attemptFetch = async () => {
-      const url = buildMediaUrl(item.baseUrl, 'd');
+      const url = buildMediaUrl(item.baseUrl, downloadVariant());
       item.downloadUrl = url;
       return fetch(url, { mode: 'cors', credentials: 'omit' });
     };
@@ -1156,12 +1470,113 @@
     item.progress = percent;
     if (item._els?.bar) item._els.bar.style.width = `${percent}%`;
     if (statusText && item._els?.status) item._els.status.textContent = statusText;
+    if (state.uploadRun) updateUploadSummary();
   }
 
   function wait(ms) {
     return new Promise((resolve) => setTimeout(resolve, ms));
   }
 
+  function updateUploadSummary() {
+    const run = state.uploadRun;
+    if (!uploadSummaryEl) return;
+    if (!run) {
+      uploadSummaryEl.classList.add('hidden');
+      return;
+    }
+    const total = run.items.length;
+    const percent = total ? run.items.reduce((sum, item) => sum + (item.progress || 0), 0) / total : 0;
+    uploadSummaryEl.classList.remove('hidden');
+    if (uploadSummaryBarEl) uploadSummaryBarEl.style.width = `${Math.round(percent)}%`;
+    if (uploadSummaryTextEl) {
+      const failedText = `${run.duplicates ? ` / 重複スキップ ${run.duplicates} 件` : ''}${run.failed ? ` / 失敗 ${run.failed} 件` : ''}`;
+      uploadSummaryTextEl.textContent = `${run.done + run.failed} / ${total} 件処理済み（${Math.round(percent)}%）${failedText}`;
+    }
+  }
+
+  // Run `worker` over `entries` with at most `limit` calls in flight; stop handing out work after a failure.
+  async function runWithConcurrency(entries, limit, worker) {
+    let next = 0;
+    let failed = false;
+    const lanes = Array.from({ length: Math.min(limit, entries.length) }, async () => {
+      while (!failed && next < entries.length) {
+        const entry = entries[next];
+        next += 1;
+        try {
+          await worker(entry);
+        } catch (err) {
+          failed = true;
+          throw err;
+        }
+      }
+    });
+    await Promise.all(lanes);
+  }
+
+  async function withRetry(fn, { retries = DEFAULT_UPLOAD_RETRIES, onRetry } = {}) {
+    for (let attempt = 0; ; attempt += 1) {
+      try {
+        return await fn();
+      } catch (err) {
+        if (attempt >= retries) throw err;
+        const delayMs = UPLOAD_RETRY_BASE_MS * (2 ** attempt) * (0.5 + Math.random());
+        onRetry?.(err, attempt + 1, delayMs);
+        await wait(delayMs);
+      }
+    }
+  }
+
+  // Resolves to `{ duplicateOf }` when the server already has the same content, `{}` after an upload.
+  async function uploadPlannedItem(entry, presignedByKey) {
+    const { item, key } = entry;
+    if (!(item.blob instanceof Blob)) {
+      updateItemProgress(item, 0, item.source === 'local' ? 'preparing' : 'downloading');
+      item.blob = await fetchItemBlob(item);
+    }
+    if (dedupeEnabled() && entry.sha256 === undefined) {
+      entry.sha256 = await hashForDedupe(item);
+    }
+    const known = presignedByKey.get(key);
+    if (known?.duplicate) return { duplicateOf: known.existingKey };
+    if (!(item.uploadBlob instanceof Blob)) {
+      item.uploadBlob = await downscaleForUpload(item, entry.contentType);
+      if (item.uploadBlob.type && item.uploadBlob.type !== entry.contentType) {
+        // Resized output or a Google rendition (always JPEG) changes the type the presigned PUT was bound to
+        entry.contentType = item.uploadBlob.type;
+        presignedByKey.delete(key);
+      }
+    }
+    const blob = item.uploadBlob;
+    if (entry.sha256 && blob !== item.blob && entry.uploadSha256 === undefined) {
+      // S3 checks the PUT against the bytes sent; sha256 still names the original for dedupe
+      entry.uploadSha256 = await hashBlob(item, blob);
+      // Without it the original's hash would be checked against the resized body
+      if (!entry.uploadSha256) entry.sha256 = '';
+      presignedByKey.delete(key);
+    }
+    const { contentType, sha256, uploadSha256 } = entry;
+    if (blob.size >= multipartThresholdBytes()) {
+      return uploadMultipart(item, blob, key, contentType, sha256, uploadSha256);
+    }
+    let presigned = presignedByKey.get(key);
+    if (!presigned || presigned.expiresAt <= Date.now() + PRESIGN_EXPIRY_MARGIN_MS) {
+      updateItemProgress(item, 5, 'requesting upload URL');
+      presigned = await getPresigned(key, contentType, sha256, uploadSha256);
+      presignedByKey.set(key, presigned);
+      if (presigned.duplicate) return { duplicateOf: presigned.existingKey };
+    }
+    const onProgress = (mode) => (p) => updateItemProgress(item, Math.max(5, p), `uploading (${mode})`);
+    if (presigned.fields) {
+      await xhrUploadPOST(presigned.url, presigned.fields, blob, onProgress('POST'));
+    } else if (presigned.url) {
+      await xhrUploadPUT(presigned.url, blob, contentType, onProgress('PUT'), presigned.headers);
+    } else {
+      throw new Error('Invalid presign response');
+    }
+    return {};
+  }
+
+
   btnSignIn?.addEventListener('click', async () => {
     await completeSignIn(true);
   });
@@ -1306,33 +1721,75 @@
       await ensureAccessTokenInteractive();
     }
     refreshAllMediaUrls();
-    for (const item of pendingItems) {
+    const keyPrefix = cfg.upload.s3KeyPrefix || '';
+    const datePart = new Date().toISOString().replace(/[:.]/g, '-');
+    const plannedKeys = new Set();
+    const uploadPlan = pendingItems.map((item, index) => {
+      const safeName = (item.filename || `${item.id}.jpg`).replace(/[^a-zA-Z0-9._-]+/g, '_');
+      let key = `${keyPrefix}${datePart}_${safeName}`;
+      // Every key shares one timestamp, so keep same-named photos apart
+      if (plannedKeys.has(key)) key = `${keyPrefix}${datePart}-${index}_${safeName}`;
+      plannedKeys.add(key);
+      item.uploadBlob = null; // resize again in case "keep original" changed since the last attempt
+      return { item, key, contentType: item.mimeType || 'application/octet-stream' };
+    });
+    if (dedupeEnabled()) {
+      // Local files are already in memory: hash them now so the batch presign can also answer duplicates
+      for (const entry of uploadPlan) {
+        if (entry.item.blob instanceof Blob) entry.sha256 = await hashForDedupe(entry.item);
+      }
+    }
+    uploadPlan.forEach(({ item }) => updateItemProgress(item, 0, 'requesting upload URL'));
+    let presignedByKey = new Map();
+    try {
+      // Files already known to be large go through multipart and need no single PUT URL;
+      // with dedupe on, Google items are presigned after download once their hash is known
+      const threshold = multipartThresholdBytes();
+      presignedByKey = await getPresignedBatch(uploadPlan.filter(({ item, sha256 }) => (
+        !(item.size >= threshold) && (!dedupeEnabled() || sha256 !== undefined)
+      )));
+    } catch (err) {
+      appendLog(`WARN: アップロード URL の一括取得に失敗したため 1 件ずつ取得します: ${err.message}`);
+    }
+    const concurrency = Math.max(1, Number(cfg.upload.concurrency) || DEFAULT_UPLOAD_CONCURRENCY);
+    const retries = Math.max(0, Number(cfg.upload.retries ?? DEFAULT_UPLOAD_RETRIES));
+    btnUpload.disabled = true;
+    state.uploadRun = { items: uploadPlan.map(({ item }) => item), done: 0, failed: 0, duplicates: 0 };
+    updateUploadSummary();
+    const startedAt = Date.now();
+    await runWithConcurrency(uploadPlan, concurrency, async (entry) => {
+      const { item, key } = entry;
       try {
-        updateItemProgress(item, 0, item.source === 'local' ? 'preparing' : 'downloading');
-        const blob = await fetchItemBlob(item);
-        item.blob = blob;
-        const keyPrefix = cfg.upload.s3KeyPrefix || '';
-        const safeName = (item.filename || `${item.id}.jpg`).replace(/[^a-zA-Z0-9._-]+/g, '_');
-        const datePart = new Date().toISOString().replace(/[:.]/g, '-');
-        const key = `${keyPrefix}${datePart}_${safeName}`;
-        updateItemProgress(item, 5, 'requesting upload URL');
-        const presigned = await getPresigned(key, blob.type || item.mimeType || 'application/octet-stream');
-        if (presigned.fields) {
-          await xhrUploadPOST(presigned.url, presigned.fields, blob, (p) => updateItemProgress(item, Math.max(5, p), 'uploading (POST)'));
-        } else if (presigned.url) {
-          await xhrUploadPUT(presigned.url, blob, blob.type || item.mimeType || 'application/octet-stream', (p) => updateItemProgress(item, Math.max(5, p), 'uploading (PUT)'));
+        const result = await withRetry(() => uploadPlannedItem(entry, presignedByKey), {
+          retries,
+          onRetry: (err, attempt, delayMs) => {
+            // A failed transfer may have been rejected for an expired URL; presign again on retry
+            presignedByKey.delete(key);
+            updateItemProgress(item, item.progress || 0, `retrying (${attempt}/${retries})`);
+            appendLog(`WARN: ${item.filename || item.id} を ${Math.round(delayMs / 1000)} 秒後に再試行します: ${err.message}`);
+          },
+        });
+        item.uploaded = true;
+        state.uploadRun.done += 1;
+        if (result?.duplicateOf) {
+          item.status = 'already uploaded';
+          state.uploadRun.duplicates += 1;
+          updateItemProgress(item, 100, 'already uploaded');
+          appendLog(`INFO: 同じ写真がアップロード済みのためスキップしました: ${item.filename || item.id} (${result.duplicateOf})`);
         } else {
-          throw new Error('Invalid presign response');
+          item.status = 'uploaded';
+          updateItemProgress(item, 100, 'uploaded');
+          appendLog(`Uploaded: ${key}`);
         }
-        updateItemProgress(item, 100, 'uploaded');
-        item.uploaded = true;
-        item.status = 'uploaded';
-        appendLog(`Uploaded: ${key}`);
       } catch (err) {
+        state.uploadRun.failed += 1;
         updateItemProgress(item, item.progress || 0, 'error');
         appendLog(`ERROR: Upload failed for ${item.filename || item.id}: ${err.message}`);
       }
-    }
+    });
+    const { done, failed, duplicates } = state.uploadRun;
+    appendLog(`INFO: アップロード完了 ${done} 件（うち重複スキップ ${duplicates} 件）/ 失敗 ${failed} 件（${((Date.now() - startedAt) / 1000).toFixed(1)} 秒、並列数 ${concurrency}）`);
+    state.uploadRun = null;
     if (cfg?.upload?.manageEndpoint) {
       const currentVisible = state.uploadsVisibleCount || INITIAL_UPLOADS_VISIBLE;
       await fetchUploadsList({ resetVisible: true, offset: 0, limit: Math.max(currentVisible, INITIAL_UPLOADS_VISIBLE) });
@@ -1340,6 +1797,10 @@
     refreshUploadButtonState();
   });
 
+  Object.values(previewRangeInputs).forEach((input) => input?.addEventListener('input', schedulePreview));
+  previewDitherInput?.addEventListener('change', schedulePreview);
+  document.getElementById('btnClosePreview')?.addEventListener('click', closePreview);
+
   btnRefreshUploads?.addEventListener('click', () => {
     fetchUploadsList({ resetVisible: true, offset: 0, limit: INITIAL_UPLOADS_VISIBLE });
   });
@@ -1375,9 +1836,12 @@
 
     const offset = state.nextUploadsOffset ?? state.uploads.length;
     appendLog(`INFO: さらに表示のためサーバーから最大 ${fetchLimit} 件を取得します（offset ${offset}）`);
-    fetchUploadsList({ offset, limit: fetchLimit });
+    fetchUploadsList({ offset, limit: fetchLimit, cursor: state.nextUploadsCursor });
   });
 
+  uploadsListEl?.addEventListener('scroll', scheduleUploadsWindowRender, { passive: true });
+  window.addEventListener('resize', scheduleUploadsWindowRender);
+
   uploadsListEl?.addEventListener('change', (event) => {
     const checkbox = event.target instanceof HTMLInputElement && event.target.classList.contains('upload-select') ? event.target : null;
     if (!checkbox) return;
@@ -1393,14 +1857,16 @@
     bulkDeleteBtn.disabled = true;
     bulkDeleteBtn.textContent = '削除中…';
     try {
-      await ensureIdTokenInteractive(false, { allowPrompt: true });
-      for (const key of keys) {
-        try {
-          await deleteUpload(key);
-          appendLog(`削除しました: ${key}`);
-        } catch (err) {
-          appendLog(`ERROR: 削除に失敗しました ${key}: ${err.message}`);
-        }
+      try {
+        const results = await deleteUploads(keys);
+        const failed = results.filter((result) => !result.deleted);
+        appendLog(`削除しました: ${results.length - failed.length} 件`);
+        failed.forEach((result) => appendLog(`ERROR: 削除に失敗しました ${result.key}: ${result.error || 'unknown error'}`));
+        results
+          .filter((result) => result.deleted && result.warning)
+          .forEach((result) => appendLog(`WARN: ${result.key}: ${result.warning}`));
+      } catch (err) {
+        appendLog(`ERROR: 一括削除に失敗しました: ${err.message}`);
       }
       state.uploadsSelected.clear();
       const currentVisible = state.uploadsVisibleCount || INITIAL_UPLOADS_VISIBLE;
@@ -1412,7 +1878,161 @@
     }
   });
 
-  async function getPresigned(key, contentType) {
+  // Lazily started Web Worker that answers `{ id, ... }` messages; rejects when workers are unavailable.
+  function createWorkerClient(url, isSupported = () => true) {
+    let worker = null; // null: not started yet, false: unavailable
+    let sequence = 0;
+    const pending = new Map();
+    return {
+      run(payload) {
+        if (worker === null) {
+          try {
+            if (typeof Worker === 'undefined' || !isSupported()) throw new Error('not supported by this browser');
+            worker = new Worker(url);
+            worker.onmessage = (event) => {
+              const { id, error, ...result } = event.data || {};
+              const request = pending.get(id);
+              if (!request) return;
+              pending.delete(id);
+              if (error) request.reject(new Error(error)); else request.resolve(result);
+            };
+          } catch (err) {
+            worker = false;
+            return Promise.reject(err);
+          }
+        }
+        if (!worker) return Promise.reject(new Error('not supported by this browser'));
+        const id = ++sequence;
+        return new Promise((resolve, reject) => {
+          pending.set(id, { resolve, reject });
+          worker.postMessage({ id, ...payload });
+        });
+      },
+    };
+  }
+
+  function resizeSettings() {
+    const resize = cfg?.upload?.resize || {};
+    if (!resize.enabled || keepOriginalInput?.checked) return null;
+    const profiles = panelProfiles();
+    const scale = Math.max(1, Number(resize.scale) || DEFAULT_RESIZE_SCALE);
+    return {
+      longEdge: Math.round(Math.max(...profiles.map(({ width, height }) => Math.max(width, height))) * scale),
+      shortEdge: Math.round(Math.max(...profiles.map(({ width, height }) => Math.min(width, height))) * scale),
+      quality: Number(resize.quality) || DEFAULT_RESIZE_QUALITY,
+    };
+  }
+
+  // Shrink the photo to a multiple of the panel size in a worker; fall back to the original on any problem.
+  async function downscaleForUpload(item, contentType) {
+    const settings = resizeSettings();
+    if (!settings) return item.blob;
+    updateItemProgress(item, item.progress || 0, 'resizing');
+    try {
+      const result = await resizeWorker.run({ blob: item.blob, type: contentType, ...settings });
+      if (!result.resized || result.blob.size >= item.blob.size) return item.blob;
+      appendLog(`INFO: ${item.filename || item.id} を ${result.width}x${result.height} に縮小しました（${formatBytes(item.blob.size)} → ${formatBytes(result.blob.size)}）`);
+      return result.blob;
+    } catch (err) {
+      appendLog(`WARN: ${item.filename || item.id} を縮小できなかったため元の画像をアップロードします: ${err.message}`);
+      return item.blob;
+    }
+  }
+
+  function dedupeEnabled() {
+    return Boolean(cfg?.upload?.dedupe);
+  }
+
+  // SHA-256 of the downloaded/selected bytes; '' when hashing is unavailable (the upload then proceeds normally).
+  async function hashForDedupe(item) {
+    if (typeof item.sha256 === 'string') return item.sha256;
+    item.sha256 = await hashBlob(item, item.blob);
+    return item.sha256;
+  }
+
+  async function hashBlob(item, blob) {
+    updateItemProgress(item, item.progress || 0, 'hashing');
+    try {
+      const { sha256 } = await hashWorker.run({ blob, chunkBytes: HASH_CHUNK_BYTES, subtleMaxBytes: HASH_SUBTLE_MAX_BYTES });
+      return sha256;
+    } catch (err) {
+      appendLog(`WARN: ${item.filename || item.id} の重複チェックをスキップします: ${err.message}`);
+      return '';
+    }
+  }
+
+  function multipartThresholdBytes() {
+    return Number(cfg?.upload?.multipartThresholdBytes) || DEFAULT_MULTIPART_THRESHOLD_BYTES;
+  }
+
+  // Upload a large blob as S3 multipart parts in parallel; each part retries on its own.
+  async function uploadMultipart(item, blob, key, contentType, sha256, uploadSha256) {
+    const partSize = Math.max(MULTIPART_MIN_PART_BYTES, Number(cfg?.upload?.multipartPartSizeBytes) || DEFAULT_MULTIPART_PART_BYTES);
+    const partConcurrency = Math.max(1, Number(cfg?.upload?.multipartConcurrency) || DEFAULT_MULTIPART_CONCURRENCY);
+    const retries = Math.max(0, Number(cfg?.upload?.retries ?? DEFAULT_UPLOAD_RETRIES));
+    const batchSize = Math.max(1, Number(cfg?.upload?.presignBatchSize) || PRESIGN_BATCH_SIZE);
+    const partNumbers = Array.from({ length: Math.ceil(blob.size / partSize) }, (_, i) => i + 1);
+    const loadedByPart = new Array(partNumbers.length).fill(0);
+    const partUrls = new Map();
+    const completed = [];
+
+    const reportProgress = () => {
+      const loaded = loadedByPart.reduce((sum, bytes) => sum + bytes, 0);
+      updateItemProgress(item, Math.max(5, Math.round((loaded / blob.size) * 100)), `uploading (${completed.length}/${partNumbers.length} parts)`);
+    };
+    const presignParts = async (numbers) => {
+      for (let i = 0; i < numbers.length; i += batchSize) {
+        const requestedAt = Date.now();
+        const data = await postPresign({ action: 'presignParts', key, uploadId, partNumbers: numbers.slice(i, i + batchSize) });
+        const ttlMs = (Number(data.expiresIn) * 1000) || PRESIGN_DEFAULT_TTL_MS;
+        (data.parts || []).forEach((part) => partUrls.set(part.partNumber, { url: part.url, expiresAt: requestedAt + ttlMs }));
+      }
+    };
+
+    updateItemProgress(item, 5, 'starting multipart upload');
+    const created = await postPresign(Object.assign({ action: 'createMultipart', key, contentType }, hashFields(sha256, uploadSha256)));
+    if (created.duplicate) return { duplicateOf: created.existingKey };
+    const { uploadId } = created;
+    try {
+      await presignParts(partNumbers);
+      await runWithConcurrency(partNumbers, partConcurrency, async (partNumber) => {
+        const start = (partNumber - 1) * partSize;
+        const chunk = blob.slice(start, Math.min(start + partSize, blob.size));
+        const etag = await withRetry(async () => {
+          let target = partUrls.get(partNumber);
+          if (!target || target.expiresAt <= Date.now() + PRESIGN_EXPIRY_MARGIN_MS) {
+            await presignParts([partNumber]);
+            target = partUrls.get(partNumber);
+          }
+          return xhrUploadPUT(target.url, chunk, null, (p) => {
+            loadedByPart[partNumber - 1] = (chunk.size * p) / 100;
+            reportProgress();
+          });
+        }, {
+          retries,
+          onRetry: (err, attempt) => {
+            partUrls.delete(partNumber);
+            loadedByPart[partNumber - 1] = 0;
+            appendLog(`WARN: ${item.filename || item.id} のパート ${partNumber} を再試行します (${attempt}/${retries}): ${err.message}`);
+          },
+        });
+        if (!etag) throw new Error('ETag header is not exposed by the bucket CORS policy');
+        completed.push({ partNumber, etag });
+        reportProgress();
+      });
+      await postPresign({ action: 'completeMultipart', key, uploadId, parts: completed });
+      return {};
+    } catch (err) {
+      try {
+        await postPresign({ action: 'abortMultipart', key, uploadId });
+      } catch (abortErr) {
+        appendLog(`WARN: マルチパートアップロードの中止に失敗しました ${key}: ${abortErr.message}`);
+      }
+      throw err;
+    }
+  }
+
+  async function postPresign(body) {
     const endpoint = cfg?.upload?.presignEndpoint;
     const resp = await fetch(endpoint, {
       method: 'POST',
@@ -1420,23 +2040,58 @@
         { 'content-type': 'application/json' },
         state.idToken ? { Authorization: `Bearer ${state.idToken}` } : {}
       ),
-      body: JSON.stringify({ key, contentType })
+      body: JSON.stringify(body)
     });
     if (!resp.ok) throw new Error(`Presign endpoint error: ${resp.status}`);
     return await resp.json();
   }
 
-  function xhrUploadPUT(url, blob, contentType, onProgress) {
+  // Only send the hash of the uploaded bytes when resizing made it differ from the original's
+  function hashFields(sha256, uploadSha256) {
+    if (!sha256) return {};
+    return uploadSha256 && uploadSha256 !== sha256 ? { sha256, uploadSha256 } : { sha256 };
+  }
+
+  async function getPresigned(key, contentType, sha256, uploadSha256) {
+    const presigned = await postPresign(Object.assign({ key, contentType }, hashFields(sha256, uploadSha256)));
+    return Object.assign({ expiresAt: Date.now() + PRESIGN_DEFAULT_TTL_MS }, presigned);
+  }
+
+  // Presign every planned upload in as few round trips as the server allows.
+  async function getPresignedBatch(plan) {
+    const batchSize = Math.max(1, Number(cfg?.upload?.presignBatchSize) || PRESIGN_BATCH_SIZE);
+    const byKey = new Map();
+    for (let i = 0; i < plan.length; i += batchSize) {
+      const chunk = plan.slice(i, i + batchSize);
+      const requestedAt = Date.now();
+      const data = await postPresign({
+        items: chunk.map(({ key, contentType, sha256, uploadSha256 }) => Object.assign({ key, contentType }, hashFields(sha256, uploadSha256))),
+      });
+      if (!Array.isArray(data?.items)) throw new Error('Presign endpoint does not support batches');
+      const ttlMs = (Number(data.expiresIn) * 1000) || PRESIGN_DEFAULT_TTL_MS;
+      data.items.forEach((entry) => {
+        if (entry?.key && entry?.duplicate) {
+          byKey.set(entry.key, { duplicate: true, existingKey: entry.existingKey });
+        } else if (entry?.key && entry?.url) {
+          byKey.set(entry.key, { url: entry.url, headers: entry.headers, expiresAt: requestedAt + ttlMs });
+        }
+      });
+    }
+    return byKey;
+  }
+
+  function xhrUploadPUT(url, blob, contentType, onProgress, headers = {}) {
     return new Promise((resolve, reject) => {
       const xhr = new XMLHttpRequest();
       xhr.open('PUT', url);
-      xhr.setRequestHeader('Content-Type', contentType);
+      if (contentType) xhr.setRequestHeader('Content-Type', contentType);
+      Object.entries(headers || {}).forEach(([name, value]) => xhr.setRequestHeader(name, value));
       xhr.upload.onprogress = (e) => {
         if (e.lengthComputable && onProgress) onProgress(Math.round((e.loaded / e.total) * 100));
       };
       xhr.onerror = () => reject(new Error('XHR PUT error'));
       xhr.onload = () => {
-        if (xhr.status >= 200 && xhr.status < 300) resolve(); else reject(new Error(`PUT failed: ${xhr.status}`));
+        if (xhr.status >= 200 && xhr.status < 300) resolve(xhr.getResponseHeader('ETag')); else reject(new Error(`PUT failed: ${xhr.status}`));
       };
       xhr.send(blob);
     });
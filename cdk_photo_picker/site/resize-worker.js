@@ -0,0 +1,41 @@
+// Downscales images off the main thread before upload.
+// Message in:  { id, blob, longEdge, shortEdge, type, quality }
+// Message out: { id, blob, width, height, resized } or { id, error }
+// The output keeps enough pixels for format_image to crop the panel size in
+// either orientation, and EXIF orientation is baked into the pixels.
+
+const ENCODABLE_TYPES = new Set(['image/jpeg', 'image/png', 'image/webp']);
+
+self.onmessage = async (event) => {
+  const { id, blob, longEdge, shortEdge, type, quality } = event.data || {};
+  try {
+    const source = await createImageBitmap(blob, { imageOrientation: 'from-image' });
+    const { width: sourceWidth, height: sourceHeight } = source;
+    source.close();
+    // Smallest scale that still covers the target box; never upscale
+    const scale = Math.max(
+      longEdge / Math.max(sourceWidth, sourceHeight),
+      shortEdge / Math.min(sourceWidth, sourceHeight),
+    );
+    const width = Math.round(sourceWidth * scale);
+    const height = Math.round(sourceHeight * scale);
+    if (scale >= 1 || !width || !height) {
+      self.postMessage({ id, blob, width: sourceWidth, height: sourceHeight, resized: false });
+      return;
+    }
+    const bitmap = await createImageBitmap(blob, {
+      imageOrientation: 'from-image',
+      resizeWidth: width,
+      resizeHeight: height,
+      resizeQuality: 'high',
+    });
+    const canvas = new OffscreenCanvas(width, height);
+    canvas.getContext('2d').drawImage(bitmap, 0, 0);
+    bitmap.close();
+    const outputType = ENCODABLE_TYPES.has(type) ? type : 'image/jpeg';
+    const output = await canvas.convertToBlob({ type: outputType, quality });
+    self.postMessage({ id, blob: output, width, height, resized: true });
+  } catch (err) {
+    self.postMessage({ id, error: err?.message || String(err) });
+  }
+};
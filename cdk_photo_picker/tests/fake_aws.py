@@ -0,0 +1,252 @@
+"""In-memory stand-ins for the boto3 clients the Lambda handlers use.
+
+Only the calls and expression forms the handlers actually issue are
+supported, so a new call shows up as an AttributeError or an assertion
+instead of silently passing.
+"""
+
+import base64
+import hashlib
+import importlib.util
+import io
+import itertools
+import os
+import re
+import sys
+import threading
+import urllib.parse
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+from unittest import mock
+
+from botocore.exceptions import ClientError
+
+ROOT = Path(__file__).resolve().parents[1]
+LAMBDA_DIR = ROOT / "lambda"
+LAYER_DIR = LAMBDA_DIR / "common" / "python"
+BUCKET = "test-uploads"
+INDEX_TABLE = "test-index"
+_module_ids = itertools.count()
+
+
+def load_handler(name: str, env: Optional[Dict[str, str]] = None, **clients):
+    """Import a fresh copy of ``lambda/<name>/handler.py`` with its clients replaced.
+
+    Configuration is read at import time, so the environment is patched only
+    for the import.
+    """
+    if str(LAYER_DIR) not in sys.path:
+        sys.path.insert(0, str(LAYER_DIR))
+    spec = importlib.util.spec_from_file_location(
+        f"{name}_under_test_{next(_module_ids)}", LAMBDA_DIR / name / "handler.py"
+    )
+    module = importlib.util.module_from_spec(spec)
+    assert spec.loader is not None
+    with mock.patch.dict(os.environ, {"AWS_DEFAULT_REGION": "us-east-1", "UPLOAD_BUCKET": BUCKET, **(env or {})}):
+        spec.loader.exec_module(module)
+    for attr, client in clients.items():
+        setattr(module, attr, client)
+    return module
+
+
+def _client_error(code: str, operation: str) -> ClientError:
+    return ClientError({"Error": {"Code": code, "Message": code}}, operation)
+
+
+class _NoSuchKey(ClientError):
+    pass
+
+
+class FakeS3:
+    """Objects with bodies, user metadata and an optional stored SHA-256 checksum."""
+
+    class exceptions:
+        NoSuchKey = _NoSuchKey
+
+    def __init__(self) -> None:
+        self.objects: Dict[str, dict] = {}
+        self.calls: List[tuple] = []
+        self._lock = threading.Lock()
+
+    def seed(self, key: str, body: bytes = b"data", metadata: Optional[dict] = None, checksum: Optional[str] = None) -> None:
+        """Store an object; ``checksum="auto"`` records the full-object SHA-256 like a checksummed PUT."""
+        if checksum == "auto":
+            checksum = base64.b64encode(hashlib.sha256(body).digest()).decode("ascii")
+        self.objects[key] = {
+            "Body": body,
+            "Metadata": dict(metadata or {}),
+            "ChecksumSHA256": checksum,
+            "LastModified": datetime(2026, 1, 1, tzinfo=timezone.utc),
+        }
+
+    def _record(self, *call) -> None:
+        with self._lock:
+            self.calls.append(call)
+
+    def _get(self, key: str, operation: str) -> dict:
+        obj = self.objects.get(key)
+        if obj is None:
+            raise _NoSuchKey({"Error": {"Code": "NoSuchKey" if operation == "GetObject" else "404"}}, operation)
+        return obj
+
+    def head_object(self, Bucket: str, Key: str, ChecksumMode: Optional[str] = None):
+        self._record("head_object", Key)
+        obj = self._get(Key, "HeadObject")
+        head = {
+            "ContentLength": len(obj["Body"]),
+            "LastModified": obj["LastModified"],
+            "Metadata": dict(obj["Metadata"]),
+        }
+        if ChecksumMode == "ENABLED" and obj["ChecksumSHA256"]:
+            head["ChecksumSHA256"] = obj["ChecksumSHA256"]
+            head["ChecksumType"] = "COMPOSITE" if "-" in obj["ChecksumSHA256"] else "FULL_OBJECT"
+        return head
+
+    def get_object(self, Bucket: str, Key: str, **_kwargs):
+        self._record("get_object", Key)
+        obj = self._get(Key, "GetObject")
+        return {"Body": io.BytesIO(obj["Body"]), "Metadata": dict(obj["Metadata"])}
+
+    def put_object(self, Bucket: str, Key: str, Body=b"", Metadata=None, **_kwargs):
+        self._record("put_object", Key)
+        self.seed(Key, Body if isinstance(Body, bytes) else Body.encode("utf-8"), Metadata)
+        return {"ETag": '"fake"'}
+
+    def delete_object(self, Bucket: str, Key: str):
+        self._record("delete_object", Key)
+        self.objects.pop(Key, None)
+        return {}
+
+    def delete_objects(self, Bucket: str, Delete: dict):
+        keys = [item["Key"] for item in Delete["Objects"]]
+        self._record("delete_objects", tuple(keys))
+        for key in keys:
+            self.objects.pop(key, None)
+        return {}
+
+    def list_objects_v2(self, Bucket: str, Prefix: str = "", MaxKeys: int = 1000, **_kwargs):
+        self._record("list_objects_v2", Prefix)
+        keys = sorted(key for key in self.objects if key.startswith(Prefix))[:MaxKeys]
+        return {"KeyCount": len(keys), "Contents": [{"Key": key, "Size": len(self.objects[key]["Body"])} for key in keys]}
+
+    def generate_presigned_url(self, ClientMethod: str, Params: dict, ExpiresIn: int) -> str:
+        self._record("generate_presigned_url", ClientMethod, dict(Params))
+        query = urllib.parse.urlencode(sorted((k, str(v)) for k, v in Params.items() if k not in ("Bucket", "Key")))
+        return f"https://{Params['Bucket']}.s3.example/{Params['Key']}?{query}"
+
+    def upload_presigned(self, params: dict, body: bytes) -> None:
+        """PUT ``body`` through a URL signed with ``params``, checking its checksum like S3."""
+        checksum = params.get("ChecksumSHA256")
+        if checksum and base64.b64encode(hashlib.sha256(body).digest()).decode("ascii") != checksum:
+            raise _client_error("BadDigest", "PutObject")
+        self.seed(params["Key"], body, params.get("Metadata"), checksum)
+
+    def create_multipart_upload(self, **params):
+        self._record("create_multipart_upload", dict(params))
+        return {"UploadId": f"upload-{len(self.calls)}"}
+
+    def complete_multipart_upload(self, **params):
+        self._record("complete_multipart_upload", dict(params))
+        return {"ETag": '"fake-3"'}
+
+    def calls_named(self, name: str) -> List[tuple]:
+        return [call for call in self.calls if call[0] == name]
+
+
+_CONDITION = re.compile(r"attribute_(not_)?exists\((\w+)\)|([#\w]+) = (:\w+)")
+
+
+class FakeDynamoDB:
+    """Single table keyed by ``key`` with the ``listing``/``sortKey`` GSI used for uploads."""
+
+    def __init__(self) -> None:
+        self.items: Dict[str, dict] = {}
+        self.calls: List[str] = []
+
+    @staticmethod
+    def _name(token: str, names: Optional[dict]) -> str:
+        return (names or {}).get(token, token)
+
+    def _check(self, item: Optional[dict], condition: Optional[str], names, values) -> None:
+        if not condition:
+            return
+        for term in condition.split(" AND "):
+            match = _CONDITION.fullmatch(term.strip())
+            assert match, f"unsupported condition {term!r}"
+            negate, exists_attr, attr, placeholder = match.groups()
+            if exists_attr:
+                present = item is not None and exists_attr in item
+                ok = not present if negate else present
+            else:
+                ok = item is not None and item.get(self._name(attr, names)) == values[placeholder]
+            if not ok:
+                raise _client_error("ConditionalCheckFailedException", "UpdateItem")
+
+    def update_item(
+        self,
+        TableName: str,
+        Key: dict,
+        UpdateExpression: str,
+        ConditionExpression: Optional[str] = None,
+        ExpressionAttributeNames: Optional[dict] = None,
+        ExpressionAttributeValues: Optional[dict] = None,
+    ):
+        self.calls.append("update_item")
+        key = Key["key"]["S"]
+        current = self.items.get(key)
+        self._check(current, ConditionExpression, ExpressionAttributeNames, ExpressionAttributeValues)
+        item = dict(current or {"key": {"S": key}})
+        for action, body in re.findall(r"(SET|ADD|REMOVE) (.*?)(?= (?:SET|ADD|REMOVE) |$)", UpdateExpression):
+            for clause in body.split(","):
+                clause = clause.strip()
+                if action == "REMOVE":
+                    item.pop(self._name(clause, ExpressionAttributeNames), None)
+                    continue
+                if action == "SET":
+                    attr, placeholder = (part.strip() for part in clause.split("="))
+                    item[self._name(attr, ExpressionAttributeNames)] = ExpressionAttributeValues[placeholder]
+                    continue
+                attr, placeholder = clause.split()
+                attr = self._name(attr, ExpressionAttributeNames)
+                total = int(item.get(attr, {"N": "0"})["N"]) + int(ExpressionAttributeValues[placeholder]["N"])
+                item[attr] = {"N": str(total)}
+        self.items[key] = item
+        return {}
+
+    def put_item(self, TableName: str, Item: dict):
+        self.calls.append("put_item")
+        self.items[Item["key"]["S"]] = dict(Item)
+        return {}
+
+    def get_item(self, TableName: str, Key: dict, **_kwargs):
+        self.calls.append("get_item")
+        item = self.items.get(Key["key"]["S"])
+        return {"Item": dict(item)} if item else {}
+
+    def delete_item(self, TableName: str, Key: dict, ReturnValues: str = "NONE"):
+        self.calls.append("delete_item")
+        old = self.items.pop(Key["key"]["S"], None)
+        return {"Attributes": old} if old and ReturnValues == "ALL_OLD" else {}
+
+    def query(self, TableName: str, IndexName: str, ExpressionAttributeValues: dict, Limit: int, ExclusiveStartKey=None, **_kwargs):
+        self.calls.append("query")
+        listing = ExpressionAttributeValues[":listing"]
+        rows = sorted(
+            (item for item in self.items.values() if item.get("listing") == listing),
+            key=lambda item: item["sortKey"]["S"],
+            reverse=True,
+        )
+        if ExclusiveStartKey:
+            rows = [row for row in rows if row["sortKey"]["S"] < ExclusiveStartKey["sortKey"]["S"]]
+        page = rows[:Limit]
+        result = {"Items": page}
+        if len(rows) > Limit:
+            last = page[-1]
+            result["LastEvaluatedKey"] = {name: last[name] for name in ("key", "listing", "sortKey")}
+        return result
+
+    def row(self, key: str) -> dict:
+        """Plain ``{attribute: value}`` view of one item."""
+        item = self.items.get(key) or {}
+        return {name: next(iter(value.values())) for name, value in item.items()}
@@ -0,0 +1,32 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT / "tools") not in sys.path:
+    sys.path.insert(0, str(ROOT / "tools"))
+
+pytest.importorskip("boto3")
+
+import bench_list_uploads
+
+
+def test_sharded_listing_matches_sequential_and_presigns_one_page() -> None:
+    sequential = bench_list_uploads.run_benchmark(objects=2500, shards=1, limit=5, repeat=1)
+    sharded = bench_list_uploads.run_benchmark(objects=2500, shards=4, limit=5, repeat=1)
+
+    assert sharded["newest_key"] == sequential["newest_key"]
+    # Four URLs per row (original, render and both thumbnails) for the returned page only
+    assert sharded["presigns_per_request"] == sequential["presigns_per_request"] == 20
+    # Warm listings split each large prefix into LIST_SHARDS ranges
+    assert sharded["list_calls_per_request"] > sequential["list_calls_per_request"]
+
+
+def test_benchmark_leaves_process_environment_untouched() -> None:
+    before = dict(os.environ)
+
+    bench_list_uploads.run_benchmark(objects=10, shards=1, limit=5, repeat=1)
+
+    assert dict(os.environ) == before
@@ -0,0 +1,61 @@
+import base64
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+LAYER_DIR = ROOT / "lambda" / "common" / "python"
+DISPLAY_SIGNER_DIR = ROOT.parent / "cdk_display_pipeline" / "lambda" / "get_next_image"
+if str(LAYER_DIR) not in sys.path:
+    sys.path.insert(0, str(LAYER_DIR))
+
+pytest.importorskip("botocore")
+
+import cloudfront_signer
+import rsa_pkcs1
+
+# Fixed test key built from the Mersenne primes 2**521 - 1 and 2**607 - 1
+_P, _Q, _E = 2**521 - 1, 2**607 - 1, 65537
+KEY = (_P * _Q, _E, pow(_E, -1, (_P - 1) * (_Q - 1)))
+
+
+def _cloudfront_b64decode(value: str) -> bytes:
+    return base64.b64decode(value.translate(str.maketrans("-_~", "+=/")))
+
+
+@pytest.mark.parametrize("name", ["cloudfront_signer.py", "rsa_pkcs1.py"])
+def test_vendored_copies_match_display_pipeline(name: str) -> None:
+    display_copy = DISPLAY_SIGNER_DIR / name
+    if not display_copy.exists():
+        pytest.skip("cdk_display_pipeline is not checked out next to this project")
+    assert (LAYER_DIR / name).read_bytes() == display_copy.read_bytes()
+
+
+def test_blinded_signatures_are_deterministic_and_verify() -> None:
+    first = rsa_pkcs1.sign(b"policy", KEY, "sha256")
+    assert first == rsa_pkcs1.sign(b"policy", KEY, "sha256")
+    assert rsa_pkcs1.verify(b"policy", first, KEY[:2], "sha256")
+    assert not rsa_pkcs1.verify(b"other", first, KEY[:2], "sha256")
+
+
+def test_cookies_grant_each_prefix_under_its_own_path() -> None:
+    headers = cloudfront_signer.set_cookie_headers(
+        "https://photos.example.com", ["uploads/", "thumbnails/"], "K123", KEY, 2_000_000_000, 3600
+    )
+
+    assert len(headers) == 6
+    cookies = {}
+    for header in headers:
+        name_value, *attributes = header.split("; ")
+        name, value = name_value.split("=", 1)
+        cookies[(name, attributes[0])] = value
+        assert "HttpOnly" in attributes and "Secure" in attributes
+    policy = _cloudfront_b64decode(cookies[("CloudFront-Policy", "Path=/uploads/")])
+    statement = json.loads(policy)["Statement"][0]
+    assert statement["Resource"] == "https://photos.example.com/uploads/*"
+    assert statement["Condition"]["DateLessThan"]["AWS:EpochTime"] == 2_000_000_000
+    signature = _cloudfront_b64decode(cookies[("CloudFront-Signature", "Path=/uploads/")])
+    assert rsa_pkcs1.verify(policy, signature, KEY[:2], "sha1")
+    assert cookies[("CloudFront-Key-Pair-Id", "Path=/thumbnails/")] == "K123"
@@ -0,0 +1,225 @@
+import base64
+import json
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Tuple
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+LAYER_DIR = ROOT / "lambda" / "common" / "python"
+if str(LAYER_DIR) not in sys.path:
+    sys.path.insert(0, str(LAYER_DIR))
+
+import google_id_token
+import rsa_pkcs1
+
+CLIENT_ID = "client-123.apps.googleusercontent.com"
+_rng = random.Random(20240601)
+
+
+def _is_probable_prime(n: int) -> bool:
+    if n < 2:
+        return False
+    for p in (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37):
+        if n % p == 0:
+            return n == p
+    d, s = n - 1, 0
+    while d % 2 == 0:
+        d //= 2
+        s += 1
+    for _ in range(16):
+        x = pow(_rng.randrange(2, n - 1), d, n)
+        if x in (1, n - 1):
+            continue
+        for _ in range(s - 1):
+            x = pow(x, 2, n)
+            if x == n - 1:
+                break
+        else:
+            return False
+    return True
+
+
+def _generate_rsa_key(bits: int = 1024) -> Tuple[int, int, int]:
+    e = 65537
+    while True:
+        primes = []
+        while len(primes) < 2:
+            candidate = _rng.getrandbits(bits // 2) | (1 << (bits // 2 - 1)) | 1
+            if _is_probable_prime(candidate):
+                primes.append(candidate)
+        p, q = primes
+        phi = (p - 1) * (q - 1)
+        if p != q and phi % e:
+            return p * q, e, pow(e, -1, phi)
+
+
+def _b64url(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _int_b64url(value: int) -> str:
+    return _b64url(value.to_bytes((value.bit_length() + 7) // 8, "big"))
+
+
+def _sign_token(key: Tuple[int, int, int], kid: str, claims: dict, alg: str = "RS256") -> str:
+    header = _b64url(json.dumps({"alg": alg, "kid": kid, "typ": "JWT"}).encode())
+    payload = _b64url(json.dumps(claims).encode())
+    signature = rsa_pkcs1.sign(f"{header}.{payload}".encode(), key, "sha256")
+    return f"{header}.{payload}.{_b64url(signature)}"
+
+
+def _jwk(key: Tuple[int, int, int], kid: str) -> dict:
+    n, e, _d = key
+    return {"kty": "RSA", "alg": "RS256", "use": "sig", "kid": kid, "n": _int_b64url(n), "e": _int_b64url(e)}
+
+
+KEY_A = _generate_rsa_key()
+KEY_B = _generate_rsa_key()
+
+
+def _claims(**overrides) -> dict:
+    now = int(time.time())
+    claims = {
+        "iss": "https://accounts.google.com",
+        "aud": CLIENT_ID,
+        "sub": "1234567890",
+        "email": "user@example.com",
+        "iat": now,
+        "exp": now + 3600,
+    }
+    claims.update(overrides)
+    return claims
+
+
+@pytest.fixture
+def jwks(monkeypatch):
+    """Serve a mutable JWKS document and count fetches instead of calling Google."""
+    state = {"keys": [_jwk(KEY_A, "kid-a")], "max_age": 3600, "fetches": 0}
+
+    def fake_fetch():
+        state["fetches"] += 1
+        return {"keys": list(state["keys"])}, state["max_age"]
+
+    monkeypatch.setattr(google_id_token, "_fetch_jwks", fake_fetch)
+    monkeypatch.setattr(google_id_token, "_keys", {})
+    monkeypatch.setattr(google_id_token, "_keys_expire_at", 0.0)
+    monkeypatch.setattr(google_id_token, "_keys_fetched_at", 0.0)
+    monkeypatch.setattr(google_id_token, "_verified", {})
+    return state
+
+
+def test_valid_token_returns_claims(jwks) -> None:
+    ok, claims = google_id_token.verify(_sign_token(KEY_A, "kid-a", _claims()), CLIENT_ID)
+
+    assert ok
+    assert claims["email"] == "user@example.com"
+
+
+@pytest.mark.parametrize(
+    ("overrides", "error"),
+    [
+        ({"aud": "someone-else"}, "invalid audience"),
+        ({"iss": "https://evil.example.com"}, "invalid issuer"),
+        ({"exp": int(time.time()) - 10}, "token expired"),
+    ],
+)
+def test_claims_are_checked(jwks, overrides, error) -> None:
+    ok, detail = google_id_token.verify(_sign_token(KEY_A, "kid-a", _claims(**overrides)), CLIENT_ID)
+
+    assert not ok
+    assert detail == {"error": error}
+
+
+def test_audience_is_not_checked_without_client_id(jwks) -> None:
+    ok, _ = google_id_token.verify(_sign_token(KEY_A, "kid-a", _claims(aud="anything")), None)
+
+    assert ok
+
+
+def test_signature_from_another_key_is_rejected(jwks) -> None:
+    ok, detail = google_id_token.verify(_sign_token(KEY_B, "kid-a", _claims()), CLIENT_ID)
+
+    assert not ok
+    assert detail == {"error": "invalid signature"}
+
+
+def test_tampered_payload_is_rejected(jwks) -> None:
+    header, _payload, signature = _sign_token(KEY_A, "kid-a", _claims()).split(".")
+    forged = _b64url(json.dumps(_claims(email="admin@example.com")).encode())
+
+    ok, detail = google_id_token.verify(f"{header}.{forged}.{signature}", CLIENT_ID)
+
+    assert not ok
+    assert detail == {"error": "invalid signature"}
+
+
+@pytest.mark.parametrize("token", ["", "not-a-jwt", "a.b.c"])
+def test_malformed_tokens_are_rejected(jwks, token) -> None:
+    ok, detail = google_id_token.verify(token, CLIENT_ID)
+
+    assert not ok
+    assert "error" in detail
+
+
+def test_non_rs256_tokens_are_rejected(jwks) -> None:
+    ok, detail = google_id_token.verify(_sign_token(KEY_A, "kid-a", _claims(), alg="HS256"), CLIENT_ID)
+
+    assert not ok
+    assert detail == {"error": "unsupported algorithm"}
+
+
+def test_keys_are_cached_across_calls(jwks) -> None:
+    for subject in ("1", "2", "3"):
+        ok, _ = google_id_token.verify(_sign_token(KEY_A, "kid-a", _claims(sub=subject)), CLIENT_ID)
+        assert ok
+
+    assert jwks["fetches"] == 1
+
+
+def test_keys_are_refetched_after_max_age(jwks, monkeypatch) -> None:
+    jwks["max_age"] = 10
+    google_id_token.verify(_sign_token(KEY_A, "kid-a", _claims(sub="1")), CLIENT_ID)
+
+    later = time.time() + 11
+    monkeypatch.setattr(google_id_token.time, "time", lambda: later)
+    google_id_token.verify(_sign_token(KEY_A, "kid-a", _claims(sub="2")), CLIENT_ID)
+
+    assert jwks["fetches"] == 2
+
+
+def test_unknown_kid_triggers_rate_limited_refresh(jwks, monkeypatch) -> None:
+    google_id_token.verify(_sign_token(KEY_A, "kid-a", _claims()), CLIENT_ID)
+    jwks["keys"].append(_jwk(KEY_B, "kid-b"))
+    rotated = _sign_token(KEY_B, "kid-b", _claims())
+
+    # Within the refresh window the unknown kid is rejected without refetching
+    ok, detail = google_id_token.verify(rotated, CLIENT_ID)
+    assert not ok
+    assert detail == {"error": "unknown key id"}
+    assert jwks["fetches"] == 1
+
+    later = time.time() + google_id_token.UNKNOWN_KID_REFRESH_SECONDS
+    monkeypatch.setattr(google_id_token.time, "time", lambda: later)
+    ok, _ = google_id_token.verify(rotated, CLIENT_ID)
+    assert ok
+    assert jwks["fetches"] == 2
+
+
+def test_verified_tokens_are_cached_until_expiry(jwks, monkeypatch) -> None:
+    exp = int(time.time()) + 120
+    token = _sign_token(KEY_A, "kid-a", _claims(exp=exp))
+    assert google_id_token.verify(token, CLIENT_ID)[0]
+
+    rs256_valid = google_id_token._rs256_valid
+    monkeypatch.setattr(google_id_token, "_rs256_valid", lambda *_args: pytest.fail("signature re-checked"))
+    assert google_id_token.verify(token, CLIENT_ID)[0]
+
+    monkeypatch.setattr(google_id_token, "_rs256_valid", rs256_valid)
+    monkeypatch.setattr(google_id_token.time, "time", lambda: exp + 1)
+    ok, detail = google_id_token.verify(token, CLIENT_ID)
+    assert not ok
+    assert detail == {"error": "token expired"}
@@ -0,0 +1,181 @@
+import hashlib
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+TESTS_DIR = Path(__file__).resolve().parent
+if str(TESTS_DIR) not in sys.path:
+    sys.path.insert(0, str(TESTS_DIR))
+
+pytest.importorskip("boto3")
+
+from fake_aws import BUCKET, INDEX_TABLE, FakeDynamoDB, FakeS3, load_handler
+
+BODY = b"jpeg bytes"
+SHA = hashlib.sha256(BODY).hexdigest()
+
+
+@pytest.fixture
+def s3() -> FakeS3:
+    return FakeS3()
+
+
+@pytest.fixture
+def table() -> FakeDynamoDB:
+    return FakeDynamoDB()
+
+
+@pytest.fixture
+def index(s3: FakeS3, table: FakeDynamoDB):
+    return load_handler("index_uploads", {"INDEX_TABLE": INDEX_TABLE}, s3=s3, dynamodb=table)
+
+
+def _bridge_event(key: str, created: bool = True) -> dict:
+    return {
+        "source": "aws.s3",
+        "detail-type": "Object Created" if created else "Object Deleted",
+        "time": "2026-01-02T03:04:05Z",
+        "detail": {"bucket": {"name": BUCKET}, "object": {"key": key, "size": 10, "etag": "abc"}},
+    }
+
+
+def _notification(key: str) -> dict:
+    return {
+        "Records": [
+            {
+                "eventName": "ObjectCreated:Put",
+                "eventTime": "2026-01-02T03:04:05.000Z",
+                "s3": {"bucket": {"name": BUCKET}, "object": {"key": key, "size": 10, "eTag": "abc"}},
+            }
+        ]
+    }
+
+
+def _marker(s3: FakeS3):
+    obj = s3.objects.get(f"hashes/{SHA}")
+    return json.loads(obj["Body"])["key"] if obj else None
+
+
+def test_upload_is_indexed_and_its_verified_hash_recorded(index, s3: FakeS3, table: FakeDynamoDB) -> None:
+    s3.seed("uploads/a.jpg", BODY, {"sha256": SHA}, checksum="auto")
+
+    index.handler(_bridge_event("uploads/a.jpg"), None)
+    # A redelivered event must not count the upload twice
+    index.handler(_notification("uploads/a.jpg"), None)
+
+    row = table.row("uploads/a.jpg")
+    assert row["listing"] == "uploads"
+    assert row["sortKey"].endswith("#uploads/a.jpg")
+    assert table.row("#count")["total"] == "1"
+    assert _marker(s3) == "uploads/a.jpg"
+    # S3's own full-object checksum is trusted; the body is not read back
+    assert ("get_object", "uploads/a.jpg") not in s3.calls
+
+
+def test_hash_is_not_recorded_for_content_that_does_not_match(index, s3: FakeS3, table: FakeDynamoDB) -> None:
+    s3.seed("uploads/a.jpg", b"something else", {"sha256": SHA})
+
+    index.handler(_bridge_event("uploads/a.jpg"), None)
+
+    assert table.row("uploads/a.jpg")["listing"] == "uploads"
+    assert _marker(s3) is None
+
+
+def test_multipart_upload_is_hashed_from_its_body(index, s3: FakeS3) -> None:
+    # Multipart uploads only carry a checksum of the part checksums
+    s3.seed("uploads/a.mov", BODY, {"sha256": SHA}, checksum="bm90LWEtZnVsbC1oYXNo-3")
+
+    index.handler(_bridge_event("uploads/a.mov"), None)
+
+    assert _marker(s3) == "uploads/a.mov"
+
+
+def test_existing_copy_keeps_the_hash_marker(index, s3: FakeS3) -> None:
+    s3.seed("uploads/first.jpg", BODY, {"sha256": SHA}, checksum="auto")
+    s3.seed(f"hashes/{SHA}", json.dumps({"key": "uploads/first.jpg"}).encode())
+    s3.seed("uploads/second.jpg", BODY, {"sha256": SHA}, checksum="auto")
+
+    index.handler(_bridge_event("uploads/second.jpg"), None)
+
+    assert _marker(s3) == "uploads/first.jpg"
+
+
+def test_processed_removal_clears_render_attributes(index, s3: FakeS3, table: FakeDynamoDB) -> None:
+    s3.seed("uploads/a.jpg", BODY)
+    s3.seed(
+        "processed/a.bmp",
+        b"bmp",
+        {"source-key": "uploads/a.jpg", "thumbnail-key": "thumbnails/a.webp", "processed-thumbnail-key": "thumbnails/a.epaper.webp"},
+    )
+    index.handler(_bridge_event("uploads/a.jpg"), None)
+    index.handler(_bridge_event("processed/a.bmp"), None)
+    assert table.row("uploads/a.jpg")["processedThumbnailKey"] == "thumbnails/a.epaper.webp"
+    version = int(table.row("#count")["version"])
+
+    del s3.objects["processed/a.bmp"]
+    index.handler(_bridge_event("processed/a.bmp", created=False), None)
+
+    row = table.row("uploads/a.jpg")
+    for attr in ("processedKey", "processedSize", "processedLastModified", "thumbnailKey", "processedThumbnailKey"):
+        assert attr not in row
+    assert row["listing"] == "uploads"
+    assert int(table.row("#count")["version"]) == version + 1
+
+
+def test_removing_a_superseded_render_keeps_the_newer_one(index, s3: FakeS3, table: FakeDynamoDB) -> None:
+    s3.seed("uploads/a.jpg", BODY)
+    s3.seed("processed/a.bmp", b"old", {"source-key": "uploads/a.jpg"})
+    s3.seed("processed/a-v2.bmp", b"new", {"source-key": "uploads/a.jpg"})
+    index.handler(_bridge_event("uploads/a.jpg"), None)
+    index.handler(_bridge_event("processed/a.bmp"), None)
+    index.handler(_bridge_event("processed/a-v2.bmp"), None)
+
+    index.handler(_bridge_event("processed/a.bmp", created=False), None)
+
+    assert table.row("uploads/a.jpg")["processedKey"] == "processed/a-v2.bmp"
+
+
+def test_render_indexed_before_its_upload_is_joined_when_the_upload_arrives(
+    index, s3: FakeS3, table: FakeDynamoDB
+) -> None:
+    s3.seed("uploads/a.jpg", BODY)
+    s3.seed(
+        "processed/a.bmp",
+        b"bmp",
+        {"source-key": "uploads/a.jpg", "thumbnail-key": "thumbnails/a.webp", "processed-thumbnail-key": "thumbnails/a.epaper.webp"},
+    )
+    index.handler(_bridge_event("processed/a.bmp"), None)
+    assert "uploads/a.jpg" not in table.items
+
+    index.handler(_bridge_event("uploads/a.jpg"), None)
+
+    row = table.row("uploads/a.jpg")
+    assert row["processedKey"] == "processed/a.bmp"
+    assert row["processedSize"] == "3"
+    assert (row["thumbnailKey"], row["processedThumbnailKey"]) == ("thumbnails/a.webp", "thumbnails/a.epaper.webp")
+    assert table.row("#count")["total"] == "1"
+    # The alias still resolves removals
+    del s3.objects["processed/a.bmp"]
+    index.handler(_bridge_event("processed/a.bmp", created=False), None)
+    assert "processedKey" not in table.row("uploads/a.jpg")
+
+
+def test_resized_upload_passes_the_checksum_and_dedupes_its_original(index, s3: FakeS3) -> None:
+    presign = load_handler("presign", s3=s3)
+    presign._verify_google_id_token = lambda _token: (True, {"email": "owner@example.com"})
+    resized = b"smaller jpeg"
+    request = {"key": "uploads/a.jpg", "sha256": SHA, "uploadSha256": hashlib.sha256(resized).hexdigest()}
+
+    resp = presign.handler({"headers": {"Authorization": "Bearer token"}, "body": json.dumps(request)}, None)
+    assert json.loads(resp["body"])["headers"]["x-amz-meta-sha256"] == SHA
+    (signed,) = s3.calls_named("generate_presigned_url")
+    s3.upload_presigned(signed[2], resized)
+    index.handler(_bridge_event("uploads/a.jpg"), None)
+    assert _marker(s3) == "uploads/a.jpg"
+
+    # The same original picked again is caught before it is resized or uploaded
+    request = {"key": "uploads/again.jpg", "sha256": SHA}
+    resp = presign.handler({"headers": {"Authorization": "Bearer token"}, "body": json.dumps(request)}, None)
+    assert json.loads(resp["body"]) == {"key": "uploads/again.jpg", "duplicate": True, "existingKey": "uploads/a.jpg"}
@@ -0,0 +1,175 @@
+import base64
+import hashlib
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+TESTS_DIR = Path(__file__).resolve().parent
+if str(TESTS_DIR) not in sys.path:
+    sys.path.insert(0, str(TESTS_DIR))
+
+pytest.importorskip("boto3")
+
+from fake_aws import INDEX_TABLE, LAYER_DIR, FakeDynamoDB, FakeS3, load_handler
+
+if str(LAYER_DIR) not in sys.path:
+    sys.path.insert(0, str(LAYER_DIR))
+
+import rsa_pkcs1
+
+SHA_A = hashlib.sha256(b"photo a").hexdigest()
+SHA_B = hashlib.sha256(b"photo b").hexdigest()
+# Fixed test key built from the Mersenne primes 2**521 - 1 and 2**607 - 1
+_P, _Q, _E = 2**521 - 1, 2**607 - 1, 65537
+MEDIA_KEY = (_P * _Q, _E, pow(_E, -1, (_P - 1) * (_Q - 1)))
+
+
+@pytest.fixture
+def s3() -> FakeS3:
+    return FakeS3()
+
+
+@pytest.fixture
+def table() -> FakeDynamoDB:
+    return FakeDynamoDB()
+
+
+def _load(s3: FakeS3, table: FakeDynamoDB, **env):
+    module = load_handler("manage_uploads", {"INDEX_TABLE": INDEX_TABLE, **env}, s3=s3, dynamodb=table)
+    module._verify_google_id_token = lambda _token: (True, {"email": "owner@example.com"})
+    return module
+
+
+def _call(module, method: str, body=None, path: str = "/uploads", headers=None, params=None) -> dict:
+    event = {
+        "httpMethod": method,
+        "path": path,
+        "headers": {"Authorization": "Bearer token", **(headers or {})},
+        "queryStringParameters": params,
+        "body": json.dumps(body) if body is not None else None,
+    }
+    return module.handler(event, None)
+
+
+def _seed_upload(s3: FakeS3, name: str, sha256: str, marker_key: str, frame: str = "") -> None:
+    frame = frame or name
+    s3.seed(f"uploads/{name}.jpg", b"photo", {"sha256": sha256})
+    s3.seed(f"hashes/{sha256}", json.dumps({"key": marker_key}).encode())
+    s3.seed(f"processed/{name}.bmp", b"bmp", {"frame-key": f"frames/{frame}.bmp"})
+    s3.seed(f"frames/{frame}.bmp", b"bmp")
+    s3.seed(f"frame-refs/{frame}/processed%2F{name}.bmp", b"")
+    s3.seed(f"thumbnails/{name}.webp", b"thumb")
+
+
+def test_bulk_delete_removes_renders_and_only_markers_it_owns(s3: FakeS3, table: FakeDynamoDB) -> None:
+    manage = _load(s3, table)
+    _seed_upload(s3, "a", SHA_A, "uploads/a.jpg")
+    # Another upload with the same content claimed this marker after b was uploaded
+    _seed_upload(s3, "b", SHA_B, "uploads/b-copy.jpg")
+    s3.seed("uploads/b-copy.jpg", b"photo", {"sha256": SHA_B})
+
+    resp = _call(manage, "DELETE", {"keys": ["uploads/a.jpg", "uploads/b.jpg", "state/x.json"]})
+
+    body = json.loads(resp["body"])
+    assert resp["statusCode"] == 200
+    assert (body["deleted"], body["failed"]) == (2, 1)
+    assert body["results"][2] == {"key": "state/x.json", "deleted": False, "error": "invalid key"}
+    for name in ("a", "b"):
+        for key in (f"uploads/{name}.jpg", f"processed/{name}.bmp", f"frames/{name}.bmp", f"thumbnails/{name}.webp"):
+            assert key not in s3.objects
+    assert f"hashes/{SHA_A}" not in s3.objects
+    assert f"hashes/{SHA_B}" in s3.objects
+    assert not [key for key in s3.objects if key.startswith("frame-refs/")]
+    # DeleteObjects batches instead of a DeleteObject per key: uploads first, then unused frames
+    (first, frames) = s3.calls_named("delete_objects")
+    assert not [key for key in first[1] if key.startswith("frames/")]
+    assert frames[1] == ("frames/a.bmp", "frames/b.bmp")
+    assert not s3.calls_named("delete_object")
+
+
+def test_single_delete_keeps_a_marker_claimed_by_another_upload(s3: FakeS3, table: FakeDynamoDB) -> None:
+    manage = _load(s3, table)
+    _seed_upload(s3, "b", SHA_B, "uploads/b-copy.jpg")
+
+    resp = _call(manage, "DELETE", {"key": "uploads/b.jpg"})
+
+    assert resp["statusCode"] == 200
+    assert "uploads/b.jpg" not in s3.objects
+    assert "frames/b.bmp" not in s3.objects
+    assert f"hashes/{SHA_B}" in s3.objects
+
+
+def test_delete_keeps_a_frame_other_renders_still_share(s3: FakeS3, table: FakeDynamoDB) -> None:
+    manage = _load(s3, table)
+    # Identical renders of two uploads are stored once
+    _seed_upload(s3, "a", SHA_A, "uploads/a.jpg", frame="same")
+    _seed_upload(s3, "b", SHA_B, "uploads/b.jpg", frame="same")
+
+    _call(manage, "DELETE", {"key": "uploads/a.jpg"})
+    assert "frames/same.bmp" in s3.objects
+    assert "frame-refs/same/processed%2Fa.bmp" not in s3.objects
+
+    resp = _call(manage, "DELETE", {"keys": ["uploads/b.jpg"]})
+    assert json.loads(resp["body"])["results"] == [{"key": "uploads/b.jpg", "deleted": True}]
+    assert "frames/same.bmp" not in s3.objects
+
+
+def test_index_listing_revalidates_without_querying(s3: FakeS3, table: FakeDynamoDB) -> None:
+    manage = _load(s3, table)
+    table.put_item(INDEX_TABLE, {"key": {"S": "#count"}, "total": {"N": "2"}, "version": {"N": "7"}})
+    for n in (1, 2):
+        table.put_item(
+            INDEX_TABLE,
+            {
+                "key": {"S": f"uploads/{n}.jpg"},
+                "listing": {"S": "uploads"},
+                "sortKey": {"S": f"2026-01-0{n}#uploads/{n}.jpg"},
+                "size": {"N": "5"},
+                "lastModified": {"S": f"2026-01-0{n}"},
+            },
+        )
+
+    first = _call(manage, "GET", params={"limit": "10"})
+    assert first["statusCode"] == 200
+    assert [item["key"] for item in json.loads(first["body"])["items"]] == ["uploads/2.jpg", "uploads/1.jpg"]
+    etag = first["headers"]["etag"]
+    assert first["headers"]["cache-control"] == "private, no-cache"
+
+    table.calls.clear()
+    again = _call(manage, "GET", headers={"If-None-Match": etag}, params={"limit": "10"})
+    assert again["statusCode"] == 304
+    assert again["body"] == ""
+    assert table.calls == ["get_item"]
+
+    # index_uploads bumps the version on every change
+    table.update_item(INDEX_TABLE, {"key": {"S": "#count"}}, "ADD version :one", ExpressionAttributeValues={":one": {"N": "1"}})
+    changed = _call(manage, "GET", headers={"If-None-Match": etag}, params={"limit": "10"})
+    assert changed["statusCode"] == 200
+    assert changed["headers"]["etag"] != etag
+
+
+def test_media_session_issues_signed_cookies_per_prefix(s3: FakeS3, table: FakeDynamoDB) -> None:
+    manage = _load(
+        s3,
+        table,
+        MEDIA_KEY_PAIR_ID="K2JCJMDEHXQW5F",
+        MEDIA_PRIVATE_KEY_SECRET_ARN="arn:aws:secretsmanager:ap-northeast-1:123456789012:secret:media-AbCdEf",
+    )
+    manage._media_private_key = MEDIA_KEY
+
+    resp = _call(manage, "POST", path="/media-session")
+
+    assert resp["statusCode"] == 200
+    assert resp["headers"]["cache-control"] == "no-store"
+    cookies = resp["multiValueHeaders"]["set-cookie"]
+    paths = {cookie.split("; ")[1] for cookie in cookies}
+    assert paths == {"Path=/uploads/", "Path=/processed/", "Path=/thumbnails/"}
+    assert len(cookies) == 9
+    by_name = {cookie.split("=", 1)[0]: cookie.split("; ")[0].split("=", 1)[1] for cookie in cookies if "Path=/uploads/" in cookie}
+    decode = lambda value: base64.b64decode(value.translate(str.maketrans("-_~", "+=/")))  # noqa: E731
+    policy = decode(by_name["CloudFront-Policy"])
+    assert json.loads(policy)["Statement"][0]["Resource"].endswith("/uploads/*")
+    assert rsa_pkcs1.verify(policy, decode(by_name["CloudFront-Signature"]), MEDIA_KEY[:2], "sha1")
+    assert by_name["CloudFront-Key-Pair-Id"] == "K2JCJMDEHXQW5F"
@@ -4,7 +4,7 @@ from typing import Any, Dict, Tuple
 
 import aws_cdk as cdk
 import pytest
-from aws_cdk.assertions import Template
+from aws_cdk.assertions import Match, Template
 
 ROOT = Path(__file__).resolve().parents[1]
 if str(ROOT) not in sys.path:
@@ -35,7 +35,9 @@ def test_stack_synthesizes_core_resources() -> None:
     _, template = synthesize_stack()
 
     template.resource_count_is("AWS::S3::Bucket", 2)
-    template.resource_count_is("AWS::Lambda::Function", 3)
+    # presign, manage_uploads, index_uploads, BucketDeployment and S3 notification handlers
+    template.resource_count_is("AWS::Lambda::Function", 5)
+    template.resource_count_is("AWS::DynamoDB::Table", 1)
     template.resource_count_is("AWS::ApiGateway::RestApi", 1)
     template.resource_count_is("AWS::CloudFront::Distribution", 1)
     template.resource_count_is("AWS::CloudFront::OriginAccessControl", 1)
@@ -47,7 +49,7 @@ def test_lambda_environment_uses_domain_for_cors() -> None:
     functions = template.find_resources("AWS::Lambda::Function")
     assert functions, "Expected presign/manage Lambda functions to be defined"
 
-    envs = [props["Properties"]["Environment"]["Variables"] for props in functions.values()]
+    envs = [props["Properties"].get("Environment", {}).get("Variables", {}) for props in functions.values()]
     targeted_envs = [env for env in envs if "ALLOW_ORIGIN" in env]
     assert len(targeted_envs) == 2, "Expected presign/manage Lambda envs to include ALLOW_ORIGIN"
 
@@ -60,6 +62,214 @@ def test_lambda_environment_uses_domain_for_cors() -> None:
     assert manage_env["PROCESSED_PREFIX"] == "processed/"
 
 
+def _index_event_pattern(template: Template) -> Dict[str, Any]:
+    rules = template.find_resources("AWS::Events::Rule")
+    assert len(rules) == 1
+    return next(iter(rules.values()))["Properties"]["EventPattern"]
+
+
+def test_uploads_index_is_sorted_by_time_and_fed_by_bucket_events() -> None:
+    _, template = synthesize_stack()
+
+    template.has_resource_properties(
+        "AWS::DynamoDB::Table",
+        {
+            "GlobalSecondaryIndexes": [
+                {
+                    "IndexName": "ByUploadedAt",
+                    "KeySchema": [
+                        {"AttributeName": "listing", "KeyType": "HASH"},
+                        {"AttributeName": "sortKey", "KeyType": "RANGE"},
+                    ],
+                }
+            ]
+        },
+    )
+    notifications = template.find_resources("Custom::S3BucketNotifications")
+    config = next(iter(notifications.values()))["Properties"]["NotificationConfiguration"]
+    # No direct notifications: those would collide with format_image on a shared bucket
+    assert config == {"EventBridgeConfiguration": {}}
+    pattern = _index_event_pattern(template)
+    assert sorted(pattern["detail-type"]) == ["Object Created", "Object Deleted"]
+    assert pattern["detail"]["object"]["key"] == [{"prefix": "uploads/"}, {"prefix": "processed/"}]
+
+    functions = template.find_resources("AWS::Lambda::Function")
+    manage_env = next(
+        props["Properties"]["Environment"]["Variables"]
+        for props in functions.values()
+        if "UPLOAD_PREFIX" in props["Properties"].get("Environment", {}).get("Variables", {})
+        and "GOOGLE_CLIENT_ID" in props["Properties"]["Environment"]["Variables"]
+    )
+    assert "INDEX_TABLE" in manage_env
+
+
+def _manage_env(template: Template) -> Dict[str, Any]:
+    return next(
+        props["Properties"]["Environment"]["Variables"]
+        for props in template.find_resources("AWS::Lambda::Function").values()
+        if "FRAMES_PREFIX" in props["Properties"].get("Environment", {}).get("Variables", {})
+    )
+
+
+def test_list_uploads_from_bucket_switches_the_listing_to_a_scan() -> None:
+    _, template = synthesize_stack({"listUploadsFromBucket": "true"})
+
+    manage_env = _manage_env(template)
+    assert "INDEX_TABLE" not in manage_env
+    assert manage_env["UPLOAD_PREFIX"] == "uploads/"
+    # index_uploads still maintains the table and the dedupe markers
+    template.resource_count_is("AWS::DynamoDB::Table", 1)
+    template.resource_count_is("AWS::Events::Rule", 1)
+
+
+def test_uploads_index_leaves_imported_bucket_notifications_alone() -> None:
+    _, template = synthesize_stack(
+        {"useExistingUploadsBucket": True},
+        uploads_bucket_name="display-pipeline-uploads",
+    )
+
+    # The display pipeline owns this bucket and its notification configuration
+    assert template.find_resources("Custom::S3BucketNotifications") == {}
+    pattern = _index_event_pattern(template)
+    assert pattern["detail"]["bucket"]["name"] == ["display-pipeline-uploads"]
+    assert sorted(pattern["detail-type"]) == ["Object Created", "Object Deleted"]
+
+
+def test_api_functions_share_id_token_layer() -> None:
+    _, template = synthesize_stack()
+
+    layers = [
+        logical_id
+        for logical_id, props in template.find_resources("AWS::Lambda::LayerVersion").items()
+        if "Google ID token" in props["Properties"].get("Description", "")
+    ]
+    assert len(layers) == 1
+    functions = template.find_resources("AWS::Lambda::Function")
+    api_functions = [
+        props["Properties"]
+        for props in functions.values()
+        if "GOOGLE_CLIENT_ID" in props["Properties"].get("Environment", {}).get("Variables", {})
+    ]
+    assert len(api_functions) == 2
+    for props in api_functions:
+        assert props.get("Layers") == [{"Ref": layers[0]}]
+
+
+def test_uploads_bucket_aborts_incomplete_multipart_uploads() -> None:
+    _, template = synthesize_stack()
+
+    template.has_resource_properties(
+        "AWS::S3::Bucket",
+        {
+            "LifecycleConfiguration": {
+                "Rules": [
+                    {
+                        "Id": "AbortIncompleteMultipartUploads",
+                        "AbortIncompleteMultipartUpload": {"DaysAfterInitiation": 1},
+                        "Status": "Enabled",
+                    }
+                ]
+            }
+        },
+    )
+
+
+def test_api_compresses_responses_and_allows_revalidation() -> None:
+    _, template = synthesize_stack()
+
+    template.has_resource_properties("AWS::ApiGateway::RestApi", {"MinimumCompressionSize": 1024})
+    options = template.find_resources("AWS::ApiGateway::Method", {"Properties": {"HttpMethod": "OPTIONS"}})
+    assert options
+    for method in options.values():
+        responses = method["Properties"]["Integration"]["IntegrationResponses"]
+        allowed = responses[0]["ResponseParameters"]["method.response.header.Access-Control-Allow-Headers"]
+        assert "if-none-match" in allowed
+
+
+def test_preview_endpoint_invokes_format_image_function() -> None:
+    _, template = synthesize_stack({"previewFunctionName": "DisplayPipeline-FormatImage"})
+
+    template.has_resource_properties("AWS::ApiGateway::Resource", {"PathPart": "preview"})
+    template.has_resource_properties("AWS::ApiGateway::RestApi", {"BinaryMediaTypes": ["image/png"]})
+    functions = template.find_resources("AWS::Lambda::Function")
+    envs = [props["Properties"].get("Environment", {}).get("Variables", {}) for props in functions.values()]
+    assert any(env.get("PREVIEW_FUNCTION_NAME") == "DisplayPipeline-FormatImage" for env in envs)
+    policies = template.find_resources("AWS::IAM::Policy")
+    assert "lambda:InvokeFunction" in str(policies)
+    assert "PreviewEndpointForConfig" in template.to_json().get("Outputs", {})
+
+
+def test_preview_endpoint_absent_by_default() -> None:
+    _, template = synthesize_stack()
+
+    resources = template.find_resources("AWS::ApiGateway::Resource", {"Properties": {"PathPart": "preview"}})
+    assert not resources
+
+
+def test_site_assets_are_immutable_and_pages_short_lived() -> None:
+    _, template = synthesize_stack()
+
+    deployments = {
+        props["Properties"].get("DestinationBucketKeyPrefix", ""): props["Properties"]
+        for props in template.find_resources("Custom::CDKBucketDeployment").values()
+    }
+    immutable = "public, max-age=31536000, immutable"
+    assert deployments["assets/"]["SystemMetadata"] == {"cache-control": immutable}
+    assert deployments["assets/gz/"]["SystemMetadata"] == {"cache-control": immutable, "content-encoding": "gzip"}
+    if "assets/br/" in deployments:
+        assert deployments["assets/br/"]["SystemMetadata"]["content-encoding"] == "br"
+    pages = deployments[""]
+    assert pages["SystemMetadata"] == {"cache-control": "public, max-age=60, must-revalidate"}
+    assert "/index.html" in pages["DistributionPaths"]
+    assert not any(path.startswith("/assets/") for path in pages["DistributionPaths"])
+    # Old fingerprinted assets stay for pages still open on a previous build; pages are pruned
+    assert all(deployments[prefix]["Prune"] is False for prefix in deployments if prefix.startswith("assets/"))
+    assert pages["Prune"] is True
+    template.has_resource_properties(
+        "AWS::CloudFront::ResponseHeadersPolicy",
+        {
+            "ResponseHeadersPolicyConfig": Match.object_like(
+                {
+                    "CustomHeadersConfig": {
+                        "Items": [{"Header": "vary", "Value": "Accept-Encoding", "Override": True}]
+                    }
+                }
+            )
+        },
+    )
+
+    template.has_resource_properties(
+        "AWS::CloudFront::Distribution",
+        {
+            "DistributionConfig": Match.object_like(
+                {
+                    "CacheBehaviors": Match.array_with(
+                        [
+                            Match.object_like(
+                                {
+                                    "PathPattern": "/assets/*",
+                                    "FunctionAssociations": [Match.object_like({"EventType": "viewer-request"})],
+                                    "ResponseHeadersPolicyId": Match.any_value(),
+                                }
+                            )
+                        ]
+                    )
+                }
+            )
+        },
+    )
+
+
+def test_site_build_stays_inside_the_cloud_assembly(tmp_path: Path) -> None:
+    app = cdk.App(outdir=str(tmp_path))
+    PhotoPickerAppStack(app, "SiteBuildDirStack")
+    PhotoPickerAppStack(cdk.App(outdir=str(tmp_path)), "SiteBuildDirStack")
+
+    builds = [path for path in tmp_path.iterdir() if path.name.startswith("site-build.")]
+    assert len(builds) == 1
+    assert (builds[0] / "index.html").exists()
+
+
 def test_outputs_include_api_endpoints() -> None:
     _, template = synthesize_stack()
     outputs = template.to_json().get("Outputs", {})
@@ -142,3 +352,82 @@ def test_domain_configuration_sets_alias_without_dns() -> None:
         },
     )
     template.resource_count_is("AWS::Route53::RecordSet", 0)
+
+
+def test_media_cdn_serves_prefixes_with_signed_cookies() -> None:
+    _, template = synthesize_stack(
+        {
+            "mediaCdnPublicKeyPem": "-----BEGIN PUBLIC KEY-----\nMIIBIjANBgkq\n-----END PUBLIC KEY-----",
+            "mediaCdnPrivateKeySecretArn": (
+                "arn:aws:secretsmanager:ap-northeast-1:123456789012:secret:media-cdn-key-AbCdEf"
+            ),
+        }
+    )
+
+    template.resource_count_is("AWS::CloudFront::KeyGroup", 1)
+    distribution = next(iter(template.find_resources("AWS::CloudFront::Distribution").values()))
+    behaviors = {
+        behavior["PathPattern"]: behavior
+        for behavior in distribution["Properties"]["DistributionConfig"]["CacheBehaviors"]
+    }
+    for pattern in ("/uploads/*", "/processed/*", "/thumbnails/*"):
+        assert behaviors[pattern]["TrustedKeyGroups"]
+    assert "/media-session" in behaviors
+
+    headers = template.find_resources("AWS::CloudFront::ResponseHeadersPolicy")
+
+    def cache_control(pattern: str) -> str:
+        policy = headers[behaviors[pattern]["ResponseHeadersPolicyId"]["Ref"]]
+        return policy["Properties"]["ResponseHeadersPolicyConfig"]["CustomHeadersConfig"]["Items"][0]["Value"]
+
+    # Uploads never change under a key; re-rendered derivatives must revalidate
+    assert cache_control("/uploads/*") == "private, max-age=604800"
+    assert cache_control("/processed/*") == cache_control("/thumbnails/*") == "private, no-cache"
+    derived_cache = next(iter(template.find_resources("AWS::CloudFront::CachePolicy").values()))
+    assert derived_cache["Properties"]["CachePolicyConfig"]["DefaultTTL"] == 0
+
+    functions = template.find_resources("AWS::Lambda::Function")
+    manage_env = next(
+        props["Properties"]["Environment"]["Variables"]
+        for props in functions.values()
+        if "INDEX_NAME" in props["Properties"].get("Environment", {}).get("Variables", {})
+    )
+    assert "MEDIA_KEY_PAIR_ID" in manage_env
+    assert manage_env["MEDIA_PRIVATE_KEY_SECRET_ARN"].endswith("media-cdn-key-AbCdEf")
+
+
+def test_media_cdn_reads_uploads_through_origin_access_control() -> None:
+    _, template = synthesize_stack(
+        {
+            "mediaCdnPublicKeyPem": "-----BEGIN PUBLIC KEY-----\nMIIBIjANBgkq\n-----END PUBLIC KEY-----",
+            "mediaCdnPrivateKeySecretArn": (
+                "arn:aws:secretsmanager:ap-northeast-1:123456789012:secret:media-cdn-key-AbCdEf"
+            ),
+        }
+    )
+
+    distribution = next(iter(template.find_resources("AWS::CloudFront::Distribution").values()))
+    config = distribution["Properties"]["DistributionConfig"]
+    origin_ids = {behavior["TargetOriginId"] for behavior in config["CacheBehaviors"]
+                  if behavior["PathPattern"] in ("/uploads/*", "/processed/*", "/thumbnails/*")}
+    assert len(origin_ids) == 1
+    media_origin = next(origin for origin in config["Origins"] if origin["Id"] in origin_ids)
+    assert media_origin["OriginAccessControlId"]
+
+
+def test_media_cdn_rejects_imported_uploads_bucket() -> None:
+    app = cdk.App(
+        context={
+            "useExistingUploadsBucket": True,
+            "mediaCdnPublicKeyPem": "-----BEGIN PUBLIC KEY-----",
+            "mediaCdnPrivateKeySecretArn": "arn:aws:secretsmanager:ap-northeast-1:123456789012:secret:k-AbCdEf",
+        }
+    )
+    with pytest.raises(ValueError, match="useExistingUploadsBucket"):
+        PhotoPickerAppStack(app, "MediaCdnImportedBucketStack", uploads_bucket_name="existing-uploads")
+
+
+def test_media_cdn_requires_both_keys() -> None:
+    app = cdk.App(context={"mediaCdnPublicKeyPem": "-----BEGIN PUBLIC KEY-----"})
+    with pytest.raises(ValueError, match="mediaCdnPrivateKeySecretArn"):
+        PhotoPickerAppStack(app, "MediaCdnValidationStack")
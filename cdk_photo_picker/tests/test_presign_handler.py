@@ -0,0 +1,169 @@
+import base64
+import hashlib
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+TESTS_DIR = Path(__file__).resolve().parent
+if str(TESTS_DIR) not in sys.path:
+    sys.path.insert(0, str(TESTS_DIR))
+
+pytest.importorskip("boto3")
+
+from fake_aws import FakeS3, load_handler
+
+SHA_A = hashlib.sha256(b"photo a").hexdigest()
+SHA_B = hashlib.sha256(b"photo b").hexdigest()
+
+
+@pytest.fixture
+def s3() -> FakeS3:
+    return FakeS3()
+
+
+@pytest.fixture
+def presign(s3: FakeS3):
+    module = load_handler("presign", s3=s3)
+    module._verify_google_id_token = lambda _token: (True, {"email": "owner@example.com"})
+    return module
+
+
+def _call(module, body: dict) -> tuple:
+    resp = module.handler({"headers": {"Authorization": "Bearer token"}, "body": json.dumps(body)}, None)
+    return resp["statusCode"], json.loads(resp["body"])
+
+
+def test_batch_presign_returns_one_url_per_item(presign, s3: FakeS3) -> None:
+    status, body = _call(
+        presign,
+        {"items": [
+            {"key": "uploads/a.jpg", "contentType": "image/jpeg"},
+            {"key": "uploads/b.png", "contentType": "image/png"},
+        ]},
+    )
+
+    assert status == 200
+    assert body["expiresIn"] == presign.URL_EXPIRES_IN
+    assert [item["key"] for item in body["items"]] == ["uploads/a.jpg", "uploads/b.png"]
+    signed = [call[2] for call in s3.calls_named("generate_presigned_url")]
+    assert [(p["Key"], p["ContentType"]) for p in signed] == [("uploads/a.jpg", "image/jpeg"), ("uploads/b.png", "image/png")]
+
+
+def test_batch_presign_rejects_repeated_keys(presign, s3: FakeS3) -> None:
+    status, body = _call(presign, {"items": [{"key": "uploads/a.jpg"}, {"key": "uploads/a.jpg"}]})
+
+    assert status == 400
+    assert body["keys"] == ["uploads/a.jpg"]
+    assert not s3.calls
+
+
+def test_batch_presign_limits_the_batch_size(presign, s3: FakeS3) -> None:
+    items = [{"key": f"uploads/{n}.jpg"} for n in range(presign.MAX_BATCH_ITEMS + 1)]
+
+    status, body = _call(presign, {"items": items})
+
+    assert status == 400
+    assert body["maxItems"] == presign.MAX_BATCH_ITEMS
+    assert not s3.calls
+
+
+def test_multipart_upload_is_created_signed_per_part_and_completed_in_order(presign, s3: FakeS3) -> None:
+    status, created = _call(presign, {"action": "createMultipart", "key": "uploads/a.mov", "contentType": "video/quicktime"})
+    assert status == 200
+    upload_id = created["uploadId"]
+
+    status, body = _call(presign, {"action": "presignParts", "key": "uploads/a.mov", "uploadId": upload_id, "partNumbers": [1, 2, 3]})
+    assert status == 200
+    assert [part["partNumber"] for part in body["parts"]] == [1, 2, 3]
+    signed = [call[2] for call in s3.calls_named("generate_presigned_url") if call[1] == "upload_part"]
+    assert {(p["UploadId"], p["PartNumber"]) for p in signed} == {(upload_id, n) for n in (1, 2, 3)}
+
+    # Parts finish out of order when uploaded in parallel
+    parts = [{"partNumber": n, "etag": f'"e{n}"'} for n in (3, 1, 2)]
+    status, body = _call(presign, {"action": "completeMultipart", "key": "uploads/a.mov", "uploadId": upload_id, "parts": parts})
+    assert status == 200
+    (completed,) = s3.calls_named("complete_multipart_upload")
+    assert [p["PartNumber"] for p in completed[1]["MultipartUpload"]["Parts"]] == [1, 2, 3]
+
+
+@pytest.mark.parametrize("numbers", [[], [0], [10001], "1"])
+def test_presign_parts_rejects_invalid_part_numbers(presign, s3: FakeS3, numbers) -> None:
+    status, _body = _call(presign, {"action": "presignParts", "key": "uploads/a.mov", "uploadId": "u", "partNumbers": numbers})
+
+    assert status == 400
+    assert not s3.calls
+
+
+def test_batch_presign_has_s3_verify_content_and_claims_no_hash(presign, s3: FakeS3) -> None:
+    status, body = _call(
+        presign,
+        {"items": [
+            {"key": "uploads/a.jpg", "contentType": "image/jpeg", "sha256": SHA_A},
+            {"key": "uploads/b.jpg", "contentType": "image/jpeg"},
+        ]},
+    )
+
+    assert status == 200
+    first, second = body["items"]
+    checksum = base64.b64encode(bytes.fromhex(SHA_A)).decode("ascii")
+    assert first["headers"] == {"x-amz-meta-sha256": SHA_A, "x-amz-checksum-sha256": checksum}
+    signed = {call[2]["Key"]: call[2] for call in s3.calls_named("generate_presigned_url")}
+    assert signed["uploads/a.jpg"]["ChecksumSHA256"] == checksum
+    assert "ChecksumSHA256" not in signed["uploads/b.jpg"]
+    assert second == {"key": "uploads/b.jpg", "url": second["url"]}
+    # The hash index is written by index_uploads once the object exists
+    assert not s3.calls_named("put_object")
+
+
+def test_batch_presign_reports_content_already_uploaded(presign, s3: FakeS3) -> None:
+    s3.seed("uploads/original.jpg", b"photo a", {"sha256": SHA_A})
+    s3.seed(f"hashes/{SHA_A}", json.dumps({"key": "uploads/original.jpg"}).encode())
+    # Marker left behind by an upload that no longer exists
+    s3.seed(f"hashes/{SHA_B}", json.dumps({"key": "uploads/gone.jpg"}).encode())
+
+    status, body = _call(
+        presign,
+        {"items": [
+            {"key": "uploads/copy.jpg", "sha256": SHA_A},
+            {"key": "uploads/new.jpg", "sha256": SHA_B},
+        ]},
+    )
+
+    assert status == 200
+    copy, new = body["items"]
+    assert copy == {"key": "uploads/copy.jpg", "duplicate": True, "existingKey": "uploads/original.jpg"}
+    assert new["key"] == "uploads/new.jpg" and new["url"]
+
+
+def test_create_multipart_skips_duplicates_and_carries_claimed_hash(presign, s3: FakeS3) -> None:
+    s3.seed("uploads/original.mov", b"photo a", {"sha256": SHA_A})
+    s3.seed(f"hashes/{SHA_A}", json.dumps({"key": "uploads/original.mov"}).encode())
+
+    status, body = _call(presign, {"action": "createMultipart", "key": "uploads/copy.mov", "sha256": SHA_A})
+    assert status == 200
+    assert body == {"key": "uploads/copy.mov", "duplicate": True, "existingKey": "uploads/original.mov"}
+
+    status, body = _call(presign, {"action": "createMultipart", "key": "uploads/other.mov", "sha256": SHA_B})
+    assert status == 200
+    assert body["uploadId"]
+    (created,) = s3.calls_named("create_multipart_upload")
+    assert created[1]["Metadata"] == {"sha256": SHA_B}
+    assert not s3.calls_named("put_object")
+
+
+def test_resized_body_is_checksummed_apart_from_the_dedupe_hash(presign, s3: FakeS3) -> None:
+    status, body = _call(presign, {"key": "uploads/a.jpg", "sha256": SHA_A, "uploadSha256": SHA_B})
+
+    assert status == 200
+    checksum = base64.b64encode(bytes.fromhex(SHA_B)).decode("ascii")
+    assert body["headers"] == {"x-amz-meta-sha256": SHA_A, "x-amz-meta-upload-sha256": SHA_B, "x-amz-checksum-sha256": checksum}
+    (signed,) = s3.calls_named("generate_presigned_url")
+    assert signed[2]["ChecksumSHA256"] == checksum
+    # Sending the original's bytes to that URL is exactly what S3 should refuse
+    with pytest.raises(Exception, match="BadDigest"):
+        s3.upload_presigned(signed[2], b"photo a")
+
+    status, _body = _call(presign, {"key": "uploads/b.jpg", "uploadSha256": SHA_B})
+    assert status == 400
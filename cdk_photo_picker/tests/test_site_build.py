@@ -0,0 +1,39 @@
+import gzip
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from photo_picker import site_build
+
+SITE_DIR = ROOT / "site"
+
+
+def test_build_fingerprints_assets_and_rewrites_references(tmp_path: Path) -> None:
+    renamed = site_build.build_site(SITE_DIR, tmp_path / "site")
+
+    assert set(renamed) == set(site_build.HASHED_FILES)
+    index = (tmp_path / "site" / "index.html").read_text(encoding="utf-8")
+    assert f'src="./assets/{renamed["main.js"]}"' in index
+    assert f'href="./assets/{renamed["styles.css"]}"' in index
+    assert 'src="./config.js"' in index
+    main = (tmp_path / "site" / "assets" / renamed["main.js"]).read_text(encoding="utf-8")
+    assert f"'assets/{renamed['resize-worker.js']}'" in main
+    assert f"'assets/{renamed['hash-worker.js']}'" in main
+    assert not (tmp_path / "site" / "main.js").exists()
+
+
+def test_precompressed_copies_match_identity_and_builds_are_stable(tmp_path: Path) -> None:
+    first = site_build.build_site(SITE_DIR, tmp_path / "a")
+    second = site_build.build_site(SITE_DIR, tmp_path / "b")
+    assert first == second
+
+    assets = tmp_path / "a" / "assets"
+    for hashed in first.values():
+        assert gzip.decompress((assets / "gz" / hashed).read_bytes()) == (assets / hashed).read_bytes()
+    assert (tmp_path / "a" / "assets" / "gz" / first["main.js"]).read_bytes() == (
+        tmp_path / "b" / "assets" / "gz" / first["main.js"]
+    ).read_bytes()
+    assert site_build.short_ttl_paths(tmp_path / "a") == ["/", "/config.js", "/index.html"]
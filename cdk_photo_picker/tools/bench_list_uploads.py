@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""Offline benchmark for the bucket-scan listing in manage_uploads.
+
+The handler is imported in-process and its module-level ``s3`` client is
+replaced with an in-memory fake that sleeps ``--latency-ms`` per call and
+counts ListObjectsV2 pages and presigned URLs. The first listing runs on a
+cold container (page by page); later ones use the shard bounds it learned.
+``--shards 1`` disables sharding for comparison.
+
+Usage:
+  python tools/bench_list_uploads.py --objects 10000 --latency-ms 20 --shards 1,8
+"""
+
+from __future__ import annotations
+
+import argparse
+import bisect
+import importlib.util
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+from unittest import mock
+
+PACKAGE_ROOT = Path(__file__).resolve().parents[1]
+HANDLER_PATH = PACKAGE_ROOT / "lambda" / "manage_uploads" / "handler.py"
+LAYER_DIR = PACKAGE_ROOT / "lambda" / "common" / "python"
+BUCKET = "bench-uploads"
+PAGE_SIZE = 1000
+
+
+class InMemoryS3:
+    """Thread-safe subset of the boto3 S3 client used by the listing path."""
+
+    def __init__(self, latency_ms: float = 0.0) -> None:
+        self._objects: Dict[str, dict] = {}
+        self._sorted_keys: List[str] = []
+        self._lock = threading.Lock()
+        self._latency = latency_ms / 1000.0
+        self.calls: Counter = Counter()
+
+    def seed(self, key: str, size: int, last_modified: datetime) -> None:
+        if key not in self._objects:
+            bisect.insort(self._sorted_keys, key)
+        self._objects[key] = {"Key": key, "Size": size, "LastModified": last_modified, "ETag": '"bench"'}
+
+    def reset_counters(self) -> None:
+        with self._lock:
+            self.calls.clear()
+
+    def list_objects_v2(self, Bucket: str, Prefix: str = "", StartAfter: str = "", ContinuationToken: Optional[str] = None, **_kwargs):
+        if self._latency:
+            time.sleep(self._latency)
+        start_after = ContinuationToken or StartAfter
+        with self._lock:
+            self.calls["ListObjectsV2"] += 1
+            if start_after:
+                start = bisect.bisect_right(self._sorted_keys, start_after)
+            else:
+                start = bisect.bisect_left(self._sorted_keys, Prefix)
+            window = self._sorted_keys[start : start + PAGE_SIZE + 1]
+            keys = [k for k in window if k.startswith(Prefix)]
+            page = [dict(self._objects[k]) for k in keys[:PAGE_SIZE]]
+        truncated = len(keys) > PAGE_SIZE
+        response = {"Contents": page, "IsTruncated": truncated}
+        if truncated:
+            response["NextContinuationToken"] = page[-1]["Key"]
+        return response
+
+    def get_paginator(self, operation: str):
+        if operation != "list_objects_v2":
+            raise NotImplementedError(operation)
+        return _ListPaginator(self)
+
+    def generate_presigned_url(self, ClientMethod: str, Params: dict, ExpiresIn: int) -> str:
+        with self._lock:
+            self.calls["Presign"] += 1
+        return f"https://{Params['Bucket']}.s3.local/{Params['Key']}?X-Amz-Expires={ExpiresIn}"
+
+
+class _ListPaginator:
+    def __init__(self, client: InMemoryS3) -> None:
+        self._client = client
+
+    def paginate(self, **kwargs):
+        token = None
+        while True:
+            page = self._client.list_objects_v2(ContinuationToken=token, **kwargs)
+            yield page
+            if not page["IsTruncated"]:
+                return
+            token = page["NextContinuationToken"]
+
+
+def seed_library(fake: InMemoryS3, objects: int) -> None:
+    """Timestamped upload keys as main.js writes them, plus their renders and thumbnails."""
+    started = datetime(2023, 1, 1, tzinfo=timezone.utc)
+    for index in range(objects):
+        uploaded = started + timedelta(minutes=97 * index)
+        stem = f"{uploaded.strftime('%Y-%m-%dT%H-%M-%S-000Z')}_IMG_{index:05d}"
+        fake.seed(f"uploads/{stem}.jpg", 2_500_000, uploaded)
+        fake.seed(f"processed/{stem}.bmp", 384_054, uploaded)
+        fake.seed(f"thumbnails/{stem}.webp", 12_000, uploaded)
+        fake.seed(f"thumbnails/{stem}.epaper.webp", 9_000, uploaded)
+
+
+def load_handler(fake: InMemoryS3, shards: int):
+    """Import a fresh copy of the handler module wired to ``fake``.
+
+    Configuration is read at import time, so the environment is patched only
+    for the import.
+    """
+    env = {
+        "AWS_DEFAULT_REGION": os.environ.get("AWS_DEFAULT_REGION", "us-east-1"),
+        "UPLOAD_BUCKET": BUCKET,
+        "LIST_SHARDS": str(shards),
+    }
+    if str(LAYER_DIR) not in sys.path:
+        sys.path.insert(0, str(LAYER_DIR))
+    spec = importlib.util.spec_from_file_location(f"manage_uploads_bench_{id(fake)}_{shards}", HANDLER_PATH)
+    module = importlib.util.module_from_spec(spec)
+    assert spec.loader is not None
+    with mock.patch.dict(os.environ, env):
+        # The bucket-scan path is the one being measured
+        os.environ.pop("INDEX_TABLE", None)
+        spec.loader.exec_module(module)
+    module.s3 = fake
+    return module
+
+
+def run_benchmark(objects: int, shards: int, limit: int = 10, repeat: int = 3, latency_ms: float = 0.0) -> dict:
+    fake = InMemoryS3(latency_ms=latency_ms)
+    seed_library(fake, objects)
+    module = load_handler(fake, shards)
+
+    started = time.perf_counter()
+    module._list_uploads(limit, 0)
+    cold_ms = (time.perf_counter() - started) * 1000.0
+
+    timings: List[float] = []
+    fake.reset_counters()
+    for _ in range(repeat):
+        started = time.perf_counter()
+        entries, total = module._list_uploads(limit, 0)
+        timings.append((time.perf_counter() - started) * 1000.0)
+    assert total == objects and len(entries) == min(limit, objects)
+    return {
+        "objects": objects,
+        "shards": shards,
+        "limit": limit,
+        "cold_ms": round(cold_ms, 2),
+        "warm_ms": round(sum(timings) / len(timings), 2),
+        "list_calls_per_request": round(fake.calls["ListObjectsV2"] / repeat, 2),
+        "presigns_per_request": round(fake.calls["Presign"] / repeat, 2),
+        "newest_key": entries[0]["key"] if entries else None,
+    }
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--objects", type=int, default=10000, help="uploads in the library")
+    parser.add_argument("--shards", default="1,8", help="comma separated LIST_SHARDS values to compare")
+    parser.add_argument("--limit", type=int, default=10, help="page size requested from the listing")
+    parser.add_argument("--repeat", type=int, default=3, help="listings per configuration")
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="simulated latency per S3 call")
+    parser.add_argument("--json", action="store_true", help="print results as JSON lines")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    if not args.json:
+        print(f"{'objects':>8} {'shards':>6} {'cold ms':>9} {'warm ms':>9} {'lists':>6} {'presigns':>8}")
+    for shards in [int(value) for value in args.shards.split(",") if value.strip()]:
+        result = run_benchmark(args.objects, shards, args.limit, args.repeat, args.latency_ms)
+        if args.json:
+            print(json.dumps(result), flush=True)
+        else:
+            print(
+                f"{result['objects']:>8} {result['shards']:>6} {result['cold_ms']:>9.2f} {result['warm_ms']:>9.2f} "
+                f"{result['list_calls_per_request']:>6} {result['presigns_per_request']:>8}",
+                flush=True,
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -15,16 +15,24 @@
 from __future__ import annotations
 
 import argparse
+import hashlib
+import json
 import logging
 import os
+import random
+import signal
+import ssl
 import sys
 import tempfile
+import threading
 import time
+import urllib.parse
 from pathlib import Path
-from typing import Optional
+from typing import Iterable, Optional
 
 try:
     import requests
+    from requests.adapters import HTTPAdapter
 except ImportError as exc:  # pragma: no cover - requests should be installed on the Pi
     raise SystemExit("The requests package is required: pip install requests") from exc
 
@@ -40,6 +48,95 @@ except ImportError:  # pragma: no cover - Pillow should be installed on the Pi
 
 LOGGER = logging.getLogger(__name__)
 DEFAULT_TIMEOUT = 30
+INLINE_MEDIA_TYPE = "image/bmp"
+CURRENT_FRAME_FILE = "current.json"
+CACHE_INDEX_FILE = "index.json"
+TEMP_PREFIX = "epaper_"
+DEFAULT_CACHE_MAX_MB = 100
+DEFAULT_INTERVAL = 1800
+DEFAULT_JITTER = 120
+MIN_SLEEP_SECONDS = 60
+PREFETCH_QUEUE_FILE = "queue.json"
+PREFETCH_RETRY_SECONDS = 300
+
+
+class DownloadError(RuntimeError):
+    """BMP の取得に失敗したことを表す"""
+
+
+class _SessionKeepingSocket(ssl.SSLSocket):
+    """閉じる前に TLS セッションを SSLContext に預ける"""
+
+    def close(self) -> None:
+        try:
+            session = self.session
+        except (OSError, ValueError):
+            session = None
+        if session is not None:
+            self.context.last_session = session  # type: ignore[attr-defined]
+        super().close()
+
+
+class ResumingSSLContext(ssl.SSLContext):
+    """新しい接続で直前の TLS セッションを提示し、ハンドシェイクを再開 (resumption) させる。
+
+    更新間隔の間に keep-alive 接続はサーバー側で切られるため、次の接続では
+    証明書の交換と mTLS の署名 (Pi Zero では最も重い処理) を省略できる再開が効く。
+    接続先ホストごとに 1 つ使う。
+    """
+
+    sslsocket_class = _SessionKeepingSocket
+
+    def __init__(self, protocol: int = ssl.PROTOCOL_TLS_CLIENT) -> None:
+        super().__init__()
+        self.last_session: Optional[ssl.SSLSession] = None
+
+    def wrap_socket(self, sock, *args, **kwargs):  # type: ignore[override]
+        if self.last_session is not None and kwargs.get("session") is None:
+            kwargs["session"] = self.last_session
+        wrapped = super().wrap_socket(sock, *args, **kwargs)
+        LOGGER.debug("TLS %s (session reused: %s)", wrapped.version(), wrapped.session_reused)
+        return wrapped
+
+
+class _ContextAdapter(HTTPAdapter):
+    def __init__(self, ssl_context: ssl.SSLContext, **kwargs) -> None:
+        self._ssl_context = ssl_context
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs["ssl_context"] = self._ssl_context
+        return super().init_poolmanager(*args, **kwargs)
+
+
+def _tls_context(ca_path: Optional[Path], cert_path: Optional[Path] = None, key_path: Optional[Path] = None) -> ResumingSSLContext:
+    context = ResumingSSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    if ca_path:
+        context.load_verify_locations(str(ca_path))
+    else:
+        context.load_default_certs()
+    if cert_path and key_path:
+        context.load_cert_chain(str(cert_path), str(key_path))
+    return context
+
+
+def create_session(
+    api_url: str,
+    cert_path: Path,
+    key_path: Path,
+    ca_path: Optional[Path],
+) -> requests.Session:
+    """API 用 (mTLS) とダウンロード用の接続を持ち回る Session を作る。
+
+    証明書と CA は起動時に一度だけ読み込み、接続は keep-alive で再利用する。
+    """
+    session = requests.Session()
+    # API のホストだけにクライアント証明書を使う。S3/CloudFront へのダウンロードは別の接続プール
+    parsed = urllib.parse.urlsplit(api_url)
+    api_origin = f"{parsed.scheme}://{parsed.netloc}/"
+    session.mount(api_origin, _ContextAdapter(_tls_context(ca_path, cert_path, key_path), pool_maxsize=1))
+    session.mount("https://", _ContextAdapter(_tls_context(ca_path), pool_maxsize=2))
+    return session
 
 
 def parse_args() -> argparse.Namespace:
@@ -61,6 +158,41 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument(
         "--timeout", type=int, default=DEFAULT_TIMEOUT, help="待ち時間 (秒)"
     )
+    parser.add_argument(
+        "--loop",
+        action="store_true",
+        help="終了せずに API の next_refresh_after に従って繰り返し更新",
+    )
+    parser.add_argument(
+        "--interval",
+        type=int,
+        default=DEFAULT_INTERVAL,
+        help="API からヒントが得られない場合の更新間隔 (秒, --loop 用)",
+    )
+    parser.add_argument(
+        "--jitter",
+        type=int,
+        default=DEFAULT_JITTER,
+        help="待機時間に加えるランダムな揺らぎの最大値 (秒, --loop 用)",
+    )
+    parser.add_argument(
+        "--inline",
+        action="store_true",
+        help="API 応答に BMP を直接含めてもらい、S3 への 2 回目の接続を省略",
+    )
+    parser.add_argument(
+        "--prefetch",
+        type=int,
+        default=0,
+        metavar="K",
+        help="次の K 枚を裏で先読みし、表示はキャッシュから行う (--loop 用, 0 で無効)",
+    )
+    parser.add_argument(
+        "--cache-max-mb",
+        type=int,
+        default=DEFAULT_CACHE_MAX_MB,
+        help="キャッシュする BMP の合計サイズの上限 (MB, 0 で無制限)",
+    )
     return parser.parse_args()
 
 
@@ -77,23 +209,54 @@ def validate_args(args: argparse.Namespace) -> None:
     ]
     if missing:
         raise SystemExit("mTLS API 呼び出しには " + ", ".join(missing) + " が必要です")
+    if args.prefetch < 0:
+        raise SystemExit("--prefetch は 0 以上を指定してください")
+    if args.cache_max_mb < 0:
+        raise SystemExit("--cache-max-mb は 0 以上を指定してください")
+    if args.prefetch and not args.loop:
+        raise SystemExit("--prefetch は --loop と一緒に指定してください")
 
 
 def fetch_metadata(
+    session: requests.Session,
     api_url: str,
-    cert_path: Path,
-    key_path: Path,
-    ca_path: Optional[Path],
     timeout: int,
+    inline: bool = False,
+    etag: Optional[str] = None,
 ) -> dict:
+    """Return the next frame metadata; ``not_modified`` is set on a 304 answer."""
     LOGGER.info("API %s へ次の画像をリクエスト", api_url)
-    response = requests.get(
-        api_url,
-        cert=(str(cert_path), str(key_path)),
-        verify=str(ca_path) if ca_path else True,
-        timeout=timeout,
-    )
+    headers = {}
+    params = {}
+    if etag:
+        headers["If-None-Match"] = f'"{etag}"'
+    if inline:
+        # API Gateway は Accept の先頭が binaryMediaTypes に一致した場合のみバイナリで返す
+        headers["Accept"] = f"{INLINE_MEDIA_TYPE}, application/json;q=0.9"
+        params["inline"] = "1"
+    response = session.get(api_url, params=params, headers=headers, timeout=timeout)
     response.raise_for_status()
+    if response.status_code == 304:
+        LOGGER.info("表示中の画像から変更はありません (ETag %s)", etag)
+        return {
+            "not_modified": True,
+            "etag": etag,
+            "next_refresh_after": response.headers.get("x-next-refresh-after"),
+        }
+    content_type = response.headers.get("content-type", "").split(";")[0].strip()
+    if content_type == INLINE_MEDIA_TYPE:
+        object_key = response.headers.get("x-object-key")
+        if not object_key:
+            raise ValueError("API 応答に x-object-key ヘッダーが含まれていません")
+        LOGGER.info("BMP を API 応答から直接受信しました (%d bytes)", len(response.content))
+        return {
+            "object_key": object_key,
+            "frame_key": response.headers.get("x-frame-key") or object_key,
+            "etag": response.headers.get("etag", "").strip('"'),
+            "displayed_at": response.headers.get("x-displayed-at"),
+            "next_refresh_after": response.headers.get("x-next-refresh-after"),
+            "bmp_bytes": response.content,
+        }
     data = response.json()
     LOGGER.debug("API response: %s", data)
     if "bmp_url" not in data:
@@ -101,46 +264,365 @@ def fetch_metadata(
     return data
 
 
+def fetch_batch(
+    session: requests.Session, api_url: str, timeout: int, count: int
+) -> dict:
+    """Reserve the next ``count`` frames; each entry of ``images`` has its own URL."""
+    LOGGER.info("API %s へ次の %d 枚をリクエスト", api_url, count)
+    response = session.get(api_url, params={"count": str(count)}, timeout=timeout)
+    response.raise_for_status()
+    data = response.json()
+    LOGGER.debug("API response: %s", data)
+    if not isinstance(data.get("images"), list):
+        raise ValueError("API 応答に images が含まれていません")
+    return data
+
+
+def _write_atomic(dest_path: Path, chunks: Iterable[bytes]) -> None:
+    tmp_fd, tmp_name = tempfile.mkstemp(
+        prefix=TEMP_PREFIX, suffix=".bmp", dir=str(dest_path.parent)
+    )
+    try:
+        with os.fdopen(tmp_fd, "wb") as tmp_file:
+            for chunk in chunks:
+                if chunk:
+                    tmp_file.write(chunk)
+        Path(tmp_name).replace(dest_path)
+    except Exception:
+        Path(tmp_name).unlink(missing_ok=True)
+        raise
+
+
 def download_bmp(
+    session: requests.Session,
     url: str,
-    dest_dir: Path,
-    object_key: str,
+    cache: FrameCache,
+    frame_key: str,
+    etag: Optional[str],
     timeout: int,
-    verify: object,
 ) -> Path:
-    dest_dir.mkdir(parents=True, exist_ok=True)
-    filename = Path(object_key).name
-    dest_path = dest_dir / filename
-    LOGGER.info("BMP をダウンロード %s", filename)
-    with requests.get(url, stream=True, timeout=timeout, verify=verify) as response:
+    LOGGER.info("BMP をダウンロード %s", Path(frame_key).name)
+    with session.get(url, stream=True, timeout=timeout) as response:
         response.raise_for_status()
-        tmp_fd, tmp_name = tempfile.mkstemp(
-            prefix="epaper_", suffix=".bmp", dir=str(dest_dir)
+        return cache.store(frame_key, etag, response.iter_content(chunk_size=8192))
+
+
+def load_current_frame(cache_dir: Path) -> dict:
+    try:
+        return json.loads((cache_dir / CURRENT_FRAME_FILE).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+
+def save_current_frame(cache_dir: Path, object_key: str, etag: Optional[str]) -> None:
+    payload = json.dumps({"object_key": object_key, "etag": etag or ""}).encode("utf-8")
+    _write_atomic(cache_dir / CURRENT_FRAME_FILE, [payload])
+
+
+def _etag_digest(etag: str):
+    """ETag が SHA-256 (frames/) か MD5 (単一パートの S3 ETag) なら照合用の hash を返す"""
+    algorithm = {64: "sha256", 32: "md5"}.get(len(etag))
+    return hashlib.new(algorithm) if algorithm else None
+
+
+class FrameCache:
+    """`.cache` の BMP を `index.json` で管理し、容量の上限を超えたら使われていない順に消す。
+
+    索引には ファイル名 -> (frame_key, ETag, サイズ, 保存時刻, 最終表示時刻) を持つ。
+    キャッシュの判定は索引と 1 回の stat だけで行い、ETag が変わったフレームは取り直す。
+    """
+
+    def __init__(self, directory: Path, max_bytes: int) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        # 先読みスレッドの保存と描画後の更新が同じ索引を書き換える
+        self._lock = threading.Lock()
+        directory.mkdir(parents=True, exist_ok=True)
+        try:
+            index = json.loads((directory / CACHE_INDEX_FILE).read_text(encoding="utf-8"))
+            self._frames: dict = dict(index["frames"])
+        except (OSError, ValueError, KeyError, TypeError):
+            self._frames = self._rebuild()
+
+    def _rebuild(self) -> dict:
+        """索引が無い (旧版からの更新や破損) ときだけディレクトリを走査する"""
+        frames = {}
+        for path in self.directory.glob("*.bmp"):
+            if path.name.startswith(TEMP_PREFIX):
+                # 書き込み途中で止まった一時ファイル
+                path.unlink(missing_ok=True)
+                continue
+            stat = path.stat()
+            frames[path.name] = {
+                "key": path.name,
+                "etag": "",
+                "size": stat.st_size,
+                "stored_at": stat.st_mtime,
+                "last_displayed": 0,
+            }
+        LOGGER.info("キャッシュの索引を作り直しました (%d 件)", len(frames))
+        self._frames = frames
+        self._save()
+        return frames
+
+    def _save(self) -> None:
+        payload = json.dumps({"frames": self._frames}).encode("utf-8")
+        _write_atomic(self.directory / CACHE_INDEX_FILE, [payload])
+
+    def _hash_matches(self, path: Path, etag: str) -> bool:
+        digest = _etag_digest(etag)
+        if digest is None:
+            return False
+        with path.open("rb") as handle:
+            for chunk in iter(lambda: handle.read(65536), b""):
+                digest.update(chunk)
+        return digest.hexdigest() == etag
+
+    def path(self, frame_key: str) -> Path:
+        return self.directory / Path(frame_key).name
+
+    def lookup(self, frame_key: str, etag: Optional[str]) -> Optional[Path]:
+        """ETag の一致するキャッシュ済みファイル。無い・古い・壊れている場合は None"""
+        path = self.path(frame_key)
+        etag = (etag or "").strip('"').lower()
+        with self._lock:
+            entry = self._frames.get(path.name)
+            if entry is None:
+                return None
+            try:
+                size = path.stat().st_size
+            except OSError:
+                size = -1
+            if size == entry["size"] and (not etag or entry["etag"] == etag):
+                return path
+            # 索引を作り直したファイルは ETag を持たないため、一度だけ内容で照合する
+            if size == entry["size"] and not entry["etag"] and self._hash_matches(path, etag):
+                entry["etag"] = etag
+                self._save()
+                return path
+            LOGGER.info("キャッシュの BMP が古いため取り直します: %s", path.name)
+            del self._frames[path.name]
+            path.unlink(missing_ok=True)
+            self._save()
+        return None
+
+    def store(self, frame_key: str, etag: Optional[str], chunks: Iterable[bytes]) -> Path:
+        """一時ファイルに書きながら ETag と照合し、一致した場合だけ置き換える"""
+        path = self.path(frame_key)
+        etag = (etag or "").strip('"').lower()
+        digest = _etag_digest(etag)
+        size = 0
+
+        def checked() -> Iterable[bytes]:
+            nonlocal size
+            for chunk in chunks:
+                size += len(chunk)
+                if digest is not None:
+                    digest.update(chunk)
+                yield chunk
+            if not size:
+                raise DownloadError(f"BMP が空です: {path.name}")
+            if digest is not None and digest.hexdigest() != etag:
+                raise DownloadError(f"BMP の内容が ETag と一致しません: {path.name}")
+
+        _write_atomic(path, checked())
+        with self._lock:
+            self._frames[path.name] = {
+                "key": frame_key,
+                "etag": etag,
+                "size": size,
+                "stored_at": time.time(),
+                "last_displayed": 0,
+            }
+            self._save()
+        LOGGER.info("BMP を保存しました: %s", path)
+        return path
+
+    def mark_displayed(self, path: Path) -> None:
+        with self._lock:
+            entry = self._frames.get(path.name)
+            if entry is not None:
+                entry["last_displayed"] = time.time()
+                self._save()
+
+    def evict(self, keep: Iterable[str] = ()) -> None:
+        """合計が max_bytes 以下になるまで、最後に使われてから最も長いフレームを消す"""
+        if self.max_bytes <= 0:
+            return
+        keep = set(keep)
+        with self._lock:
+            total = sum(entry["size"] for entry in self._frames.values())
+            if total <= self.max_bytes:
+                return
+            candidates = sorted(
+                (name for name in self._frames if name not in keep),
+                key=lambda name: max(
+                    self._frames[name]["last_displayed"], self._frames[name]["stored_at"]
+                ),
+            )
+            removed = 0
+            for name in candidates:
+                if total <= self.max_bytes:
+                    break
+                total -= self._frames.pop(name)["size"]
+                (self.directory / name).unlink(missing_ok=True)
+                removed += 1
+            self._save()
+        LOGGER.info("キャッシュから %d 件を削除しました (残り %d bytes)", removed, total)
+
+
+class PrefetchQueue:
+    """先読み済みで表示待ちのフレーム。`.cache/queue.json` に保存し、再起動後も引き継ぐ。
+
+    表示したフレームは直近 ``size`` 枚を ``recent`` に残し、ネットワークが
+    使えず待ち行列が空になったときはそれを順に表示し直す。
+    """
+
+    def __init__(self, cache_dir: Path, size: int) -> None:
+        self.cache_dir = cache_dir
+        self.size = size
+        self.refill = threading.Event()
+        self._ready = threading.Condition()
+        try:
+            state = json.loads((cache_dir / PREFETCH_QUEUE_FILE).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            state = {}
+        # 再起動直後のオフラインでも更新間隔と quiet_windows を守る
+        self.hints: dict = state.get("hints") or {}
+        self._pending = [e for e in state.get("pending", []) if self._available(e)]
+        self._recent = [e for e in state.get("recent", []) if self._available(e)][-size:]
+
+    def _available(self, entry: dict) -> bool:
+        return isinstance(entry, dict) and (self.cache_dir / str(entry.get("file", ""))).is_file()
+
+    def _save(self) -> None:
+        state = {"pending": self._pending, "recent": self._recent, "hints": self.hints}
+        payload = json.dumps(state).encode("utf-8")
+        _write_atomic(self.cache_dir / PREFETCH_QUEUE_FILE, [payload])
+
+    def missing(self) -> int:
+        with self._ready:
+            return max(0, self.size - len(self._pending))
+
+    def files(self) -> list:
+        """まだ表示していないファイル名 (キャッシュの削除対象から外す)"""
+        with self._ready:
+            return [entry["file"] for entry in self._pending]
+
+    def push(self, entry: dict) -> None:
+        with self._ready:
+            self._pending.append(entry)
+            self._save()
+            self._ready.notify_all()
+
+    def wait_for_frame(self, timeout: float) -> bool:
+        with self._ready:
+            return self._ready.wait_for(lambda: bool(self._pending), timeout=timeout)
+
+    def pop(self) -> Optional[dict]:
+        """次に表示するフレーム。待ち行列が空なら最も古く表示したものを再表示する。"""
+        with self._ready:
+            self._pending = [e for e in self._pending if self._available(e)]
+            self._recent = [e for e in self._recent if self._available(e)]
+            if self._pending:
+                entry = self._pending.pop(0)
+            elif self._recent:
+                entry = self._recent.pop(0)
+                LOGGER.warning("先読み済みのフレームがないため %s を再表示します", entry["file"])
+            else:
+                entry = None
+            if entry is not None:
+                self._recent = self._recent[-(self.size - 1):] + [entry] if self.size > 1 else [entry]
+                self._save()
+        # 空のときも先読みスレッドを起こし、すぐにやり直させる
+        self.refill.set()
+        return entry
+
+
+def prefetch_frames(
+    args: argparse.Namespace,
+    session: requests.Session,
+    cache: FrameCache,
+    queue: PrefetchQueue,
+) -> int:
+    """待ち行列の空きを埋める。ダウンロードと照合に成功したフレームだけを積み、その枚数を返す。"""
+    missing = queue.missing()
+    if not missing:
+        return 0
+    batch = fetch_batch(session, args.api_url, args.timeout, missing)
+    queue.hints = {
+        "next_refresh_after": batch.get("next_refresh_after"),
+        "refresh_interval": batch.get("refresh_interval"),
+        "quiet_windows": batch.get("quiet_windows") or queue.hints.get("quiet_windows"),
+    }
+    pushed = 0
+    for item in batch["images"]:
+        frame_key = item.get("frame_key") or item["object_key"]
+        path = cache.lookup(frame_key, item.get("etag"))
+        if path is not None:
+            LOGGER.info("キャッシュ済みの BMP を使用します: %s", path)
+        else:
+            try:
+                path = download_bmp(
+                    session, item["bmp_url"], cache, frame_key, item.get("etag"), args.timeout
+                )
+            except DownloadError as err:
+                # 壊れたフレームだけを飛ばし、残りの先読みは続ける
+                LOGGER.error("%s", err)
+                continue
+        pushed += 1
+        queue.push(
+            {
+                "object_key": item["object_key"],
+                "frame_key": frame_key,
+                "etag": item.get("etag") or "",
+                "file": path.name,
+            }
         )
+        cache.evict(queue.files())
+    return pushed
+
+
+def prefetch_worker(
+    args: argparse.Namespace,
+    session: requests.Session,
+    cache: FrameCache,
+    queue: PrefetchQueue,
+    stop: threading.Event,
+) -> None:
+    """表示とは別スレッドで API と S3 に接続する。Session はこのスレッドだけが使う。"""
+    while not stop.is_set():
+        queue.refill.clear()
         try:
-            with os.fdopen(tmp_fd, "wb") as tmp_file:
-                for chunk in response.iter_content(chunk_size=8192):
-                    if chunk:
-                        tmp_file.write(chunk)
-            Path(tmp_name).replace(dest_path)
-        except Exception:
-            Path(tmp_name).unlink(missing_ok=True)
-            raise
-    LOGGER.info("BMP を保存しました: %s", dest_path)
-    return dest_path
-
-
-def display_bmp(path: Path) -> None:
+            pushed = prefetch_frames(args, session, cache, queue)
+        except Exception as err:
+            LOGGER.error("先読みに失敗しました: %s", err)
+            pushed = 0
+        if queue.missing():
+            # 1 枚も積めなかった (全件失敗を含む)、または足りないときは一定時間後にやり直す
+            LOGGER.warning("先読みが不足しています (今回 %d 枚)。%d 秒後に再試行します", pushed, PREFETCH_RETRY_SECONDS)
+            wait = PREFETCH_RETRY_SECONDS
+        else:
+            # 満杯でも API の更新予定を過ぎたら見直す (表示で空きができればすぐ起きる)
+            try:
+                interval = int(queue.hints.get("refresh_interval") or args.interval)
+            except (TypeError, ValueError):
+                interval = args.interval
+            wait = seconds_until_next_refresh(queue.hints, interval, 0)
+        queue.refill.wait(wait)
+
+
+def display_bmp(path: Path) -> bool:
     if Image is None:
         LOGGER.error("Pillow がインストールされていないため表示できません")
-        return
+        return False
     try:
         from waveshare_epd import epd7in3f
     except ImportError:
         LOGGER.error(
             "waveshare_epd ライブラリが見つかりません。ドライバをインストールしてください。"
         )
-        return
+        return False
 
     LOGGER.info("e-paper に描画: %s", path.name)
     epd = epd7in3f.EPD()
@@ -152,6 +634,152 @@ def display_bmp(path: Path) -> None:
     with Image.open(path) as image:
         epd.display(epd.getbuffer(image))
     epd.sleep()
+    return True
+
+
+def skip_quiet_windows(ts: float, quiet_windows: Optional[list]) -> float:
+    """API の quiet_windows ([開始, 終了) の UNIX 時刻) に入る時刻を終了時刻まで後ろにずらす。
+
+    時刻帯やタイムゾーンの解釈はサーバー側だけで行う。
+    """
+    for window in quiet_windows or []:
+        try:
+            start, end = float(window[0]), float(window[1])
+        except (IndexError, TypeError, ValueError):
+            continue
+        if start <= ts < end:
+            return end
+    return ts
+
+
+def seconds_until_next_refresh(
+    hints: dict, fallback_interval: int, jitter: int, now: Optional[float] = None
+) -> float:
+    now = time.time() if now is None else now
+    try:
+        target = float(hints["next_refresh_after"])
+    except (KeyError, TypeError, ValueError):
+        target = skip_quiet_windows(now + fallback_interval, hints.get("quiet_windows"))
+    # 複数台が同時に API を叩かないよう揺らぎを加える
+    return max(MIN_SLEEP_SECONDS, target - now) + random.uniform(0, max(0, jitter))
+
+
+def run_once(
+    args: argparse.Namespace,
+    session: requests.Session,
+    cache: FrameCache,
+) -> dict:
+    current = load_current_frame(cache.directory)
+    metadata = fetch_metadata(
+        session,
+        args.api_url,
+        args.timeout,
+        inline=args.inline,
+        etag=current.get("etag"),
+    )
+    if metadata.get("not_modified"):
+        return metadata
+
+    object_key = metadata.get("object_key", f"image-{int(time.time())}.bmp")
+    # frames/<sha256>.bmp のキーは内容が変わらないため、キャッシュのキーとして安全に使える
+    frame_key = metadata.get("frame_key") or object_key
+    etag = metadata.get("etag")
+
+    bmp_path = cache.lookup(frame_key, etag)
+    if bmp_path is not None:
+        LOGGER.info("キャッシュ済みの BMP を使用します: %s", bmp_path)
+    elif "bmp_bytes" in metadata:
+        bmp_path = cache.store(frame_key, etag, [metadata["bmp_bytes"]])
+    else:
+        try:
+            bmp_path = download_bmp(
+                session, metadata["bmp_url"], cache, frame_key, etag, args.timeout
+            )
+        except Exception as err:
+            LOGGER.error("BMP ダウンロードに失敗しました: %s", err, exc_info=True)
+            raise DownloadError(str(err)) from err
+
+    if args.display:
+        if display_bmp(bmp_path):
+            cache.mark_displayed(bmp_path)
+            save_current_frame(cache.directory, object_key, etag)
+    else:
+        LOGGER.info("BMP を %s に保存しました (display オプション無し)", bmp_path)
+    cache.evict([bmp_path.name])
+    return metadata
+
+
+def run_loop(
+    args: argparse.Namespace,
+    session: requests.Session,
+    cache: FrameCache,
+    stop: threading.Event,
+) -> None:
+    """常駐モード: import・証明書の読み込み・Session は起動時の 1 回だけ"""
+    hints: dict = {}
+    while not stop.is_set():
+        try:
+            metadata = run_once(args, session, cache)
+            hints = {
+                "next_refresh_after": metadata.get("next_refresh_after"),
+                "quiet_windows": metadata.get("quiet_windows") or hints.get("quiet_windows"),
+            }
+        except Exception as err:
+            LOGGER.error("画像の更新に失敗しました: %s", err)
+            # 前回の next_refresh_after は使わず、既知の quiet_windows だけを引き継ぐ
+            hints = {"quiet_windows": hints.get("quiet_windows")}
+        delay = seconds_until_next_refresh(hints, args.interval, args.jitter)
+        LOGGER.info("次の更新まで %d 秒待機します", delay)
+        # SIGTERM (systemctl stop) で描画の途中ではなく待機中に抜ける
+        stop.wait(delay)
+    LOGGER.info("停止要求を受けたため終了します")
+
+
+def run_prefetch_loop(
+    args: argparse.Namespace,
+    session: requests.Session,
+    cache: FrameCache,
+    stop: threading.Event,
+) -> None:
+    """先読み付きの常駐モード: 更新時刻に行うのはキャッシュからの読み込みと描画だけ"""
+    queue = PrefetchQueue(cache.directory, args.prefetch)
+    worker = threading.Thread(
+        target=prefetch_worker,
+        args=(args, session, cache, queue, stop),
+        name="prefetch",
+        daemon=True,
+    )
+    worker.start()
+    # 初回だけは先読みの完了を待つ (キャッシュに残っていれば待たない)
+    queue.wait_for_frame(timeout=args.timeout * 2)
+    while not stop.is_set():
+        entry = queue.pop()
+        if entry is None:
+            LOGGER.warning("表示できるフレームがまだありません")
+            stop.wait(MIN_SLEEP_SECONDS)
+            continue
+        bmp_path = cache.directory / entry["file"]
+        if args.display:
+            if display_bmp(bmp_path):
+                cache.mark_displayed(bmp_path)
+                save_current_frame(cache.directory, entry["object_key"], entry.get("etag"))
+        else:
+            LOGGER.info("次のフレーム: %s (display オプション無し)", entry["file"])
+        cache.evict(queue.files() + [entry["file"]])
+        # 先読み時の next_refresh_after は過去になり得るため、表示時刻から間隔を数える
+        interval = queue.hints.get("refresh_interval") or args.interval
+        try:
+            interval = int(interval)
+        except (TypeError, ValueError):
+            interval = args.interval
+        delay = seconds_until_next_refresh(
+            {"quiet_windows": queue.hints.get("quiet_windows")}, interval, args.jitter
+        )
+        LOGGER.info("次の更新まで %d 秒待機します", delay)
+        stop.wait(delay)
+    queue.refill.set()
+    worker.join(timeout=args.timeout)
+    LOGGER.info("停止要求を受けたため終了します")
 
 
 def main() -> None:
@@ -169,33 +797,24 @@ def main() -> None:
             raise SystemExit(f"{label} ファイルが存在しません: {path}")
     if ca_path is not None and not ca_path.exists():
         raise SystemExit(f"root-ca ファイルが存在しません: {ca_path}")
-    metadata = fetch_metadata(args.api_url, cert_path, key_path, ca_path, args.timeout)
-
-    bmp_url = metadata["bmp_url"]
-    object_key = metadata.get("object_key", f"image-{int(time.time())}.bmp")
     base_dir = Path(args.save_dir).expanduser().resolve()
-    cache_dir = (base_dir / ".cache").resolve()
-    cache_dir.mkdir(parents=True, exist_ok=True)
-    cache_path = cache_dir / Path(object_key).name
+    cache = FrameCache((base_dir / ".cache").resolve(), args.cache_max_mb * 1024 * 1024)
 
-    if cache_path.exists():
-        LOGGER.info("キャッシュ済みの BMP を使用します: %s", cache_path)
-        bmp_path = cache_path
-    else:
+    with create_session(args.api_url, cert_path, key_path, ca_path) as session:
+        if args.loop:
+            stop = threading.Event()
+            for signum in (signal.SIGTERM, signal.SIGINT):
+                signal.signal(signum, lambda *_: stop.set())
+            if args.prefetch:
+                run_prefetch_loop(args, session, cache, stop)
+            else:
+                run_loop(args, session, cache, stop)
+            return
         try:
-            verify_arg: object = str(ca_path) if ca_path else True
-            bmp_path = download_bmp(
-                bmp_url, cache_dir, object_key, args.timeout, verify_arg
-            )
-        except Exception as err:
-            LOGGER.error("BMP ダウンロードに失敗しました: %s", err, exc_info=True)
+            run_once(args, session, cache)
+        except DownloadError as err:
             raise SystemExit(2) from err
 
-    if args.display:
-        display_bmp(bmp_path)
-    else:
-        LOGGER.info("BMP を %s に保存しました (display オプション無し)", bmp_path)
-
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,136 @@
+import argparse
+import hashlib
+import json
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+pytest.importorskip("requests")
+
+import fetch_next_image
+from fetch_next_image import DownloadError, FrameCache, PrefetchQueue
+
+FRAME = b"BM" + b"\x00" * 62
+FRAME_ETAG = hashlib.sha256(FRAME).hexdigest()
+
+
+def _args() -> argparse.Namespace:
+    return argparse.Namespace(api_url="https://api.example/next", timeout=5, interval=1800)
+
+
+def _entry(name: str) -> dict:
+    return {"object_key": f"uploads/{name}.jpg", "frame_key": f"frames/{name}.bmp", "etag": "", "file": f"{name}.bmp"}
+
+
+def test_frame_cache_verifies_content_against_the_etag(tmp_path: Path) -> None:
+    cache = FrameCache(tmp_path, max_bytes=0)
+
+    path = cache.store("frames/a.bmp", f'"{FRAME_ETAG}"', [FRAME[:10], FRAME[10:]])
+    assert path.read_bytes() == FRAME
+    assert cache.lookup("frames/a.bmp", FRAME_ETAG) == path
+    # The index survives a restart
+    assert FrameCache(tmp_path, max_bytes=0).lookup("frames/a.bmp", FRAME_ETAG) == path
+
+    with pytest.raises(DownloadError):
+        cache.store("frames/b.bmp", FRAME_ETAG, [b"truncated"])
+    with pytest.raises(DownloadError):
+        cache.store("frames/c.bmp", None, [])
+    assert sorted(p.name for p in tmp_path.glob("*.bmp")) == ["a.bmp"]
+
+
+def test_frame_cache_refetches_a_changed_frame(tmp_path: Path) -> None:
+    cache = FrameCache(tmp_path, max_bytes=0)
+    cache.store("frames/a.bmp", FRAME_ETAG, [FRAME])
+
+    assert cache.lookup("frames/a.bmp", "0" * 64) is None
+    assert not (tmp_path / "a.bmp").exists()
+
+
+def test_frame_cache_evicts_least_recently_used_outside_keep(tmp_path: Path) -> None:
+    cache = FrameCache(tmp_path, max_bytes=2 * len(FRAME))
+    paths = [cache.store(f"frames/{name}.bmp", None, [FRAME]) for name in "abcd"]
+    cache.mark_displayed(paths[0])
+
+    cache.evict(keep=["b.bmp"])
+
+    assert sorted(p.name for p in tmp_path.glob("*.bmp")) == ["a.bmp", "b.bmp"]
+    assert cache.lookup("frames/c.bmp", None) is None
+
+
+def test_prefetch_queue_persists_and_falls_back_to_recent_frames(tmp_path: Path) -> None:
+    for name in "ab":
+        (tmp_path / f"{name}.bmp").write_bytes(FRAME)
+    queue = PrefetchQueue(tmp_path, size=2)
+    queue.push(_entry("a"))
+    queue.push(_entry("b"))
+    assert queue.missing() == 0
+
+    restarted = PrefetchQueue(tmp_path, size=2)
+    assert restarted.files() == ["a.bmp", "b.bmp"]
+    assert [restarted.pop()["file"] for _ in range(2)] == ["a.bmp", "b.bmp"]
+
+    # Offline with nothing pending: show the oldest recent frame again
+    restarted.refill.clear()
+    assert restarted.pop()["file"] == "a.bmp"
+    assert restarted.refill.is_set()
+    (tmp_path / "a.bmp").unlink()
+    (tmp_path / "b.bmp").unlink()
+    restarted.refill.clear()
+    assert restarted.pop() is None
+    # Even an empty pop wakes the prefetch thread
+    assert restarted.refill.is_set()
+
+
+def _run_worker_once(monkeypatch, tmp_path: Path, batch: dict, download) -> tuple:
+    cache = FrameCache(tmp_path, max_bytes=0)
+    queue = PrefetchQueue(tmp_path, size=2)
+    stop = threading.Event()
+    waits = []
+
+    def record_wait(timeout=None) -> bool:
+        waits.append(timeout)
+        stop.set()
+        return False
+
+    monkeypatch.setattr(fetch_next_image, "fetch_batch", lambda *_args: batch)
+    monkeypatch.setattr(fetch_next_image, "download_bmp", download)
+    monkeypatch.setattr(queue.refill, "wait", record_wait)
+    fetch_next_image.prefetch_worker(_args(), object(), cache, queue, stop)
+    return queue, waits
+
+
+def test_prefetch_worker_retries_when_every_download_fails(monkeypatch, tmp_path: Path) -> None:
+    def broken(*_args, **_kwargs):
+        raise DownloadError("BMP の内容が ETag と一致しません")
+
+    batch = {
+        "images": [{"object_key": f"uploads/{n}.jpg", "bmp_url": f"https://s3/{n}", "etag": FRAME_ETAG} for n in "ab"],
+        # The next refresh is hours away; waiting for it would leave the display with nothing
+        "next_refresh_after": 4102444800,
+    }
+    queue, waits = _run_worker_once(monkeypatch, tmp_path, batch, broken)
+
+    assert queue.missing() == 2
+    assert waits == [fetch_next_image.PREFETCH_RETRY_SECONDS]
+
+
+def test_prefetch_worker_idles_until_the_next_refresh_when_full(monkeypatch, tmp_path: Path) -> None:
+    def download(_session, _url, cache, frame_key, etag, _timeout):
+        return cache.store(frame_key, etag, [FRAME])
+
+    batch = {
+        "images": [{"object_key": f"uploads/{n}.jpg", "frame_key": f"frames/{n}.bmp", "bmp_url": f"https://s3/{n}", "etag": FRAME_ETAG} for n in "ab"],
+        "refresh_interval": 600,
+    }
+    monkeypatch.setattr(fetch_next_image.random, "uniform", lambda _a, _b: 0)
+    queue, waits = _run_worker_once(monkeypatch, tmp_path, batch, download)
+
+    assert queue.files() == ["a.bmp", "b.bmp"]
+    assert json.loads((tmp_path / fetch_next_image.PREFETCH_QUEUE_FILE).read_text())["hints"]["refresh_interval"] == 600
+    assert waits == [pytest.approx(600, abs=5)]